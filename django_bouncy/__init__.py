@@ -1 +1,2 @@
 """Django Bouncy App"""
+default_app_config = 'django_bouncy.apps.DjangoBouncyConfig'
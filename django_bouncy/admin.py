@@ -1,35 +1,115 @@
 """Admin code for django_bouncy app"""
 
 from django.contrib import admin
+from django.template.response import TemplateResponse
 
-from django_bouncy.models import Bounce, Complaint, Delivery
+from django_bouncy.models import (
+    Bounce, Complaint, Delivery, DeadLetter, FeedbackStat, Suppression
+)
+from django_bouncy.routers import read_database
+from django_bouncy.stats import GROUPS, RESOLUTIONS, cached_series
 
 
-class BounceAdmin(admin.ModelAdmin):
+class FeedbackAdmin(admin.ModelAdmin):
+    """Admin model that browses feedback on a read replica"""
+    def get_queryset(self, request):
+        """Read from the replica, unless the request is saving changes"""
+        queryset = super(FeedbackAdmin, self).get_queryset(request)
+        if request.method in ('GET', 'HEAD'):
+            queryset = queryset.using(read_database(self.model))
+        return queryset
+
+
+class BounceAdmin(FeedbackAdmin):
     """Admin model for 'Bounce' objects"""
     list_display = (
-        'address', 'mail_from', 'bounce_type', 'bounce_subtype', 'status')
+        'address', 'mail_from', 'bounce_type', 'bounce_subtype', 'category',
+        'status')
     list_filter = (
-        'hard', 'action', 'bounce_type', 'bounce_subtype',
+        'hard', 'action', 'bounce_type', 'bounce_subtype', 'category',
         'feedback_timestamp'
     )
     search_fields = ('address',)
 
 
-class ComplaintAdmin(admin.ModelAdmin):
+class ComplaintAdmin(FeedbackAdmin):
     """Admin model for 'Complaint' objects"""
     list_display = ('address', 'mail_from', 'feedback_type')
     list_filter = ('feedback_type', 'feedback_timestamp')
     search_fields = ('address',)
 
 
-class DeliveryAdmin(admin.ModelAdmin):
+class DeliveryAdmin(FeedbackAdmin):
     """Admin model for 'Delivery' objects"""
     list_display = ('address', 'mail_from')
     list_filter = ('feedback_timestamp',)
     search_fields = ('address',)
 
 
+class DeadLetterAdmin(admin.ModelAdmin):
+    """Admin model for 'DeadLetter' objects"""
+    list_display = ('kind', 'queued_at', 'attempts', 'error')
+    list_filter = ('kind',)
+
+
+class SuppressionAdmin(admin.ModelAdmin):
+    """Admin model for 'Suppression' objects"""
+    list_display = ('address', 'rule', 'created_at', 'expires_at')
+    list_filter = ('rule', 'expires_at')
+    search_fields = ('address',)
+
+
+class FeedbackStatAdmin(admin.ModelAdmin):
+    """Admin dashboard charting the pre-aggregated feedback stats"""
+    def has_add_permission(self, request):
+        """Stats are only written by Django Bouncy"""
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        """Chart the feedback counts instead of listing the stats"""
+        if not self.has_change_permission(request):
+            return super(FeedbackStatAdmin, self).changelist_view(
+                request, extra_context)
+
+        resolution = request.GET.get('resolution', 'hour')
+        if resolution not in RESOLUTIONS:
+            resolution = 'hour'
+        group_by = request.GET.get('group_by', 'kind')
+        if group_by not in GROUPS:
+            group_by = 'kind'
+        result = cached_series(resolution, group_by=group_by)
+
+        # Scale each group's bars to its own busiest period
+        charts = []
+        for group, counts in sorted(result['series'].items()):
+            peak = max(counts) or 1
+            charts.append({
+                'group': group or '(none)',
+                'total': sum(counts),
+                'bars': [
+                    {'period': period, 'count': count,
+                     'height': int(round(100.0 * count / peak))}
+                    for period, count in zip(result['periods'], counts)],
+            })
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title='Feedback Dashboard',
+            resolution=resolution,
+            resolutions=RESOLUTIONS,
+            group_by=group_by,
+            groups=sorted(GROUPS),
+            charts=charts)
+        context.update(extra_context or {})
+        return TemplateResponse(
+            request, 'admin/django_bouncy/feedbackstat/dashboard.html',
+            context)
+
+
 admin.site.register(Bounce, BounceAdmin)
 admin.site.register(Complaint, ComplaintAdmin)
 admin.site.register(Delivery, DeliveryAdmin)
+admin.site.register(DeadLetter, DeadLetterAdmin)
+admin.site.register(Suppression, SuppressionAdmin)
+admin.site.register(FeedbackStat, FeedbackStatAdmin)
@@ -0,0 +1,129 @@
+"""Load shedding for the django_bouncy endpoint"""
+import contextlib
+import functools
+import logging
+import threading
+
+from django.http import HttpResponse
+
+from django_bouncy.conf import get_config
+from django_bouncy.metrics import clock, get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Held while a controller is created, so every thread shares one
+_controller_lock = threading.Lock()
+
+
+class AdmissionController(object):
+    """
+    Decide whether this process should accept another notification
+
+    Tracks the notifications being processed by this process and a moving
+    average of recent database latency. Once either passes its limit, new
+    notifications are turned away so SNS retries them later. While the
+    database is slow, one notification at a time is still admitted so the
+    average keeps being updated and the controller can recover.
+    """
+    def __init__(self, max_in_flight=None, max_db_latency=None,
+                 smoothing=0.2):
+        self.max_in_flight = max_in_flight
+        self.max_db_latency = max_db_latency
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.db_latency = 0.0
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """
+        Try to admit a notification
+
+        Returns None if admitted, in which case release() must be called
+        once it has been processed. Otherwise returns the reason it was shed.
+        """
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                return 'in_flight'
+            if (self.max_db_latency and self.in_flight and
+                    self.db_latency > self.max_db_latency):
+                return 'db_latency'
+            self.in_flight += 1
+        return None
+
+    def release(self):
+        """Mark an admitted notification as finished"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_db_latency(self, seconds):
+        """Add a database latency sample to the moving average"""
+        with self._lock:
+            self.db_latency += self.smoothing * (seconds - self.db_latency)
+
+
+def get_admission_controller():
+    """
+    Return the AdmissionController for this process
+
+    Returns None unless BOUNCY_MAX_IN_FLIGHT or BOUNCY_MAX_DB_LATENCY is set.
+    """
+    config = get_config()
+    if not config.max_in_flight and not config.max_db_latency:
+        return None
+    if config.admission_controller is None:
+        with _controller_lock:
+            if config.admission_controller is None:
+                config.admission_controller = AdmissionController(
+                    config.max_in_flight, config.max_db_latency)
+    return config.admission_controller
+
+
+@contextlib.contextmanager
+def measure_db_latency():
+    """
+    Context manager that feeds the time taken to the controller
+
+    The time is recorded even when the block raises, as a database that
+    times out is the one most in need of shedding load.
+    """
+    controller = get_admission_controller()
+    start = clock()
+    try:
+        yield
+    finally:
+        if controller is not None:
+            controller.record_db_latency(clock() - start)
+
+
+def admission_controlled(view):
+    """
+    Decorator that sheds SNS notifications when this process is overloaded
+
+    Only requests that SNS marks as a ``Notification`` with the
+    x-amz-sns-message-type header are shed, so subscription confirmations
+    are always handled. Shed requests get a retryable status straight away,
+    without reading the body.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        """Run the view if the notification is admitted"""
+        controller = get_admission_controller()
+        if (controller is None or request.META.get(
+                'HTTP_X_AMZ_SNS_MESSAGE_TYPE') != 'Notification'):
+            return view(request, *args, **kwargs)
+
+        reason = controller.admit()
+        if reason is not None:
+            get_metrics().increment('bouncy_shed_total', reason=reason)
+            logger.warning('Notification Shed: %s', reason)
+            config = get_config()
+            response = HttpResponse(
+                'Service Unavailable', status=config.shed_status)
+            response['Retry-After'] = config.shed_retry_after
+            return response
+
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            controller.release()
+    return wrapper
@@ -0,0 +1,59 @@
+"""App configuration for the django_bouncy app"""
+import logging
+import threading
+
+from django.apps import AppConfig
+from django.conf import settings
+
+from django_bouncy.archive import recent_cert_urls
+from django_bouncy.conf import get_config
+
+logger = logging.getLogger(__name__)
+
+
+def known_cert_urls():
+    """
+    Return the signing certificate URLs this site is known to receive
+
+    These are the URLs in BOUNCY_CERT_URLS and, when notifications are
+    archived, those used by the most recently archived notifications.
+    """
+    cert_urls = set(get_config().cert_urls)
+    directory = getattr(settings, 'BOUNCY_ARCHIVE_DIR', None)
+    if directory:
+        try:
+            cert_urls.update(recent_cert_urls(directory))
+        except (EnvironmentError, ValueError):
+            logger.exception('Unable To Read Archived Certificate URLs')
+    return cert_urls
+
+
+def warm_known_certificates():
+    """Fetch and cache every known signing certificate"""
+    # Imported here so that loading the app doesn't load OpenSSL
+    from django_bouncy.utils import warm_certificates
+
+    cert_urls = known_cert_urls()
+    failures = warm_certificates(cert_urls)
+    logger.info(
+        'Warmed %s Of %s Signing Certificate(s)',
+        len(cert_urls) - len(failures), len(cert_urls))
+
+
+class DjangoBouncyConfig(AppConfig):
+    """AppConfig for django_bouncy"""
+    name = 'django_bouncy'
+    verbose_name = 'Django Bouncy'
+
+    def ready(self):
+        """Compile the classifier and warm the signing certificates"""
+        # Imported here because it needs the models to be loaded
+        from django_bouncy.classifier import get_classifier
+        get_classifier()
+
+        if get_config().warm_certs_on_startup:
+            thread = threading.Thread(
+                target=warm_known_certificates,
+                name='bouncy-warm-certs')
+            thread.daemon = True
+            thread.start()
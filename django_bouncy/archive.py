@@ -0,0 +1,210 @@
+"""Compressed archive of raw SNS notifications for the django_bouncy app"""
+import atexit
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from django_bouncy.conf import get_config
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx'
+
+logger = logging.getLogger(__name__)
+
+# The archive last built, flushed on exit and when the settings change
+_archive = None
+_archive_lock = threading.Lock()
+
+
+class NotificationArchive(object):
+    """
+    Buffered writer that appends notifications to gzip-compressed segments
+
+    Every notification is stored as one line of JSON. Buffered lines are
+    written as a single gzip member appended to the current segment file, so
+    each member can be decompressed on its own. The index file next to each
+    segment maps every MessageId to the byte offset of the member holding it.
+
+    Segment names include the process id, so several worker processes can
+    share one archive directory without interleaving their writes.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, directory, segment_size=64 * 1024 * 1024,
+                 flush_bytes=1024 * 1024, flush_interval=5.0):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_flush = time.time()
+        self._segment = None
+        self._segment_count = 0
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def append(self, notification):
+        """Buffer a verified notification, flushing if the buffer is full"""
+        line = json.dumps(notification, separators=(',', ':'))
+        line = (line + '\n').encode('utf-8')
+
+        with self._lock:
+            self._buffer.append((notification.get('MessageId', ''), line))
+            self._buffered_bytes += len(line)
+            if (self._buffered_bytes >= self.flush_bytes or
+                    time.time() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+        if self._flusher is None:
+            self._start_flusher()
+
+    def flush(self):
+        """Write any buffered notifications to disk"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffer as one gzip member. The lock must be held."""
+        self._last_flush = time.time()
+        if not self._buffer:
+            return
+
+        member = io.BytesIO()
+        with gzip.GzipFile(fileobj=member, mode='wb') as compressed:
+            compressed.write(b''.join(line for _, line in self._buffer))
+
+        path = self._current_segment()
+        with open(path, 'ab') as segment:
+            segment.seek(0, os.SEEK_END)
+            offset = segment.tell()
+            segment.write(member.getvalue())
+
+        with open(path + INDEX_SUFFIX, 'a') as index:
+            for message_id, _ in self._buffer:
+                index.write('{0}\t{1}\n'.format(message_id, offset))
+
+        logger.debug('Archived %s Notification(s)', len(self._buffer))
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    def _current_segment(self):
+        """Return the path of the segment to write, rotating if it's full"""
+        if (self._segment is None or
+                os.path.getsize(self._segment) >= self.segment_size):
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self._segment_count += 1
+            name = 'bouncy-{0}-{1}-{2:06d}{3}'.format(
+                time.strftime('%Y%m%dT%H%M%S'), os.getpid(),
+                self._segment_count, SEGMENT_SUFFIX)
+            self._segment = os.path.join(self.directory, name)
+            # Create the file so the size check above is always valid
+            open(self._segment, 'ab').close()
+        return self._segment
+
+    def _start_flusher(self):
+        """Start a daemon thread that flushes the buffer on an interval"""
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name='bouncy-archive')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        """Flush loop run by the background thread"""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except (IOError, OSError):
+                logger.exception('Unable To Flush Notification Archive')
+
+
+def get_archive():
+    """
+    Return the configured NotificationArchive
+
+    Returns None if BOUNCY_ARCHIVE_DIR is not set.
+    """
+    # pylint: disable=global-statement
+    global _archive
+    config = get_config()
+    if not config.archive_dir:
+        return None
+    if config.archive is None:
+        with _archive_lock:
+            if config.archive is None:
+                if _archive is not None:
+                    _archive.flush()
+                _archive = config.archive = NotificationArchive(
+                    config.archive_dir, config.archive_segment_size,
+                    config.archive_flush_bytes, config.archive_flush_interval)
+    return config.archive
+
+
+@atexit.register
+def _flush_on_exit():
+    """Make sure buffered notifications are not lost on shutdown"""
+    if _archive is not None:
+        _archive.flush()
+
+
+def segment_paths(path):
+    """Return the archive segments found at path, oldest first"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*' + SEGMENT_SUFFIX)))
+    return [path]
+
+
+def iter_archive(paths):
+    """Yield every archived notification stored in the given segments"""
+    for path in paths:
+        with gzip.open(path, 'rb') as segment:
+            for line in segment:
+                yield json.loads(line.decode('utf-8'))
+
+
+def recent_cert_urls(directory, segments=5):
+    """Return the SigningCertURLs used in the newest archive segments"""
+    return set(
+        notification['SigningCertURL']
+        for notification in iter_archive(segment_paths(directory)[-segments:])
+        if 'SigningCertURL' in notification)
+
+
+def find_notification(directory, message_id):
+    """
+    Return the archived notification with the given MessageId
+
+    Uses the segment indexes to decompress only the member that holds the
+    notification. Returns None if the notification is not in the archive.
+    """
+    for path in segment_paths(directory):
+        offset = None
+        if not os.path.exists(path + INDEX_SUFFIX):
+            continue
+        with open(path + INDEX_SUFFIX) as index:
+            for entry in index:
+                indexed_id, _, indexed_offset = entry.rstrip('\n').rpartition(
+                    '\t')
+                if indexed_id == message_id:
+                    offset = int(indexed_offset)
+                    break
+        if offset is None:
+            continue
+
+        with open(path, 'rb') as segment:
+            segment.seek(offset)
+            for line in gzip.GzipFile(fileobj=segment, mode='rb'):
+                notification = json.loads(line.decode('utf-8'))
+                if notification.get('MessageId') == message_id:
+                    return notification
+    return None
@@ -0,0 +1,94 @@
+"""Fill in columns of large tables a small chunk at a time"""
+import time
+
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import Min
+
+from django_bouncy.classifier import classify_bounces
+from django_bouncy.histograms import record_latencies
+from django_bouncy.models import (
+    Bounce, Complaint, CounterStart, Delivery, DeliveryLatency, FeedbackStat)
+from django_bouncy.routers import model_databases
+from django_bouncy.stats import record_stats
+
+
+def backfill(queryset, func, chunk_size=1000, pause=0, start=None,
+             progress=None):
+    """
+    Call func with each chunk of a queryset, one transaction per chunk
+
+    Chunks are primary key ranges of up to chunk_size rows, found by seeking
+    past the last key rather than with OFFSET, so every chunk is equally
+    quick to find. Each chunk is committed before the next starts, which
+    keeps row locks short, and pause seconds are slept in between to leave
+    room for other writes and replication. start resumes after a key, and
+    progress is called with the rows done and the last key after each
+    chunk. Returns the number of rows and the last key.
+    """
+    # pylint: disable=too-many-arguments
+    alias = queryset.db
+    last = start
+    total = 0
+    while True:
+        keys = queryset.order_by('pk')
+        if last is not None:
+            keys = keys.filter(pk__gt=last)
+        pks = list(keys.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return total, last
+
+        with transaction.atomic(using=alias):
+            func(queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]))
+        total += len(pks)
+        last = pks[-1]
+        if progress is not None:
+            progress(total, last)
+        if pause:
+            time.sleep(pause)
+
+
+# The backfills bouncy_backfill can run, as (model, func) pairs
+BACKFILLS = {
+    'bounce-category': [(Bounce, classify_bounces)],
+    'delivery-latency': [
+        (Delivery, lambda chunk: record_latencies(list(chunk)))],
+    'feedback-stats': [
+        (model, lambda chunk: record_stats(list(chunk)))
+        for model in (Bounce, Complaint, Delivery)],
+}
+
+# The backfills that add to counters which are also incremented as feedback
+# is stored, with the model holding the counters
+COUNTERS = {
+    'delivery-latency': DeliveryLatency,
+    'feedback-stats': FeedbackStat,
+}
+
+
+def counted_since(name):
+    """
+    Return when feedback started being counted into a backfill's counters
+
+    Rows created from then on were counted as they were stored, so the
+    backfill must leave them out. The time is recorded by migration 0014.
+    Without it, the start of the earliest hourly bucket is used, which moves
+    later once hours are deleted after BOUNCY_STATS_HOURLY_RETENTION days.
+    Returns None if nothing has been counted.
+    """
+    start = CounterStart.objects.filter(counters=name).values_list(
+        'started_at', flat=True).first()
+    if start is not None:
+        return start
+
+    model = COUNTERS[name]
+    queryset = model.objects.using(router.db_for_write(model))
+    if model is FeedbackStat:
+        # Days rolled up from the hours start at midnight, before the first
+        # row that was counted
+        queryset = queryset.filter(resolution='hour')
+    return queryset.aggregate(first=Min('bucket'))['first']
+
+
+def databases_for(model):
+    """Return every database alias a model is stored in"""
+    return model_databases(model) or (DEFAULT_DB_ALIAS,)
@@ -0,0 +1,222 @@
+"""
+Fast bulk inserts of feedback for imports and queue drains
+
+On PostgreSQL rows are streamed into a temporary staging table with
+``COPY FROM STDIN`` and moved into the feedback table with one
+``INSERT ... ON CONFLICT DO NOTHING``. Other databases fall back to
+``bulk_create``.
+"""
+import collections
+import itertools
+
+from django.db import connections, router, transaction
+
+from django_bouncy.routers import model_databases
+
+BUFFER_SIZE = 64 * 1024
+
+
+def can_copy(using):
+    """Return True if the database supports the COPY path"""
+    return connections[using].vendor == 'postgresql'
+
+
+def copy_fields(model):
+    """Return the fields stored by a bulk insert, leaving out the key"""
+    return [field for field in model._meta.concrete_fields
+            if not field.primary_key]
+
+
+def copy_value(value):
+    """Format a value for the COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return u'{0}'.format(value).replace('\\', '\\\\').replace(
+        '\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class RowStream(object):
+    """
+    A file-like object reading COPY rows from an iterable of instances
+
+    Rows are formatted only as the database reads them, so at most one
+    read's worth of rows is held in memory however many are copied.
+    """
+    def __init__(self, instances, fields, connection):
+        self.instances = iter(instances)
+        self.fields = fields
+        self.connection = connection
+        self.pending = bytearray()
+        self.rows = 0
+
+    def row(self, instance):
+        """Return the COPY line of an unsaved instance"""
+        # pre_save sets auto_now fields, just as bulk_create does
+        return (u'\t'.join(
+            copy_value(field.get_db_prep_save(
+                field.pre_save(instance, True), connection=self.connection))
+            for field in self.fields) + u'\n').encode('utf-8')
+
+    def read(self, size=-1):
+        """Return up to size bytes of rows, or every row left"""
+        while size < 0 or len(self.pending) < size:
+            instance = next(self.instances, None)
+            if instance is None:
+                break
+            self.pending += self.row(instance)
+            self.rows += 1
+        if size < 0:
+            size = len(self.pending)
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        return data
+
+
+def copy_insert(model, instances, using, skip_duplicates=False,
+                buffer_size=BUFFER_SIZE):
+    """
+    Insert instances with COPY on PostgreSQL and return the number inserted
+
+    The rows are copied into a temporary staging table without constraints,
+    then inserted into the model's table in one statement that skips rows
+    conflicting with any unique constraint. With skip_duplicates, rows whose
+    sns_messageid and address are already stored, or repeated in instances,
+    are skipped too. Primary keys are not set on the instances.
+    """
+    # pylint: disable=too-many-locals
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = copy_fields(model)
+    table = quote(model._meta.db_table)
+    staging = quote('bouncy_staging_{0}'.format(model._meta.model_name))
+    columns = ', '.join(quote(field.column) for field in fields)
+    selected = ', '.join(
+        'staging.{0}'.format(quote(field.column)) for field in fields)
+
+    if skip_duplicates:
+        source = (
+            'SELECT DISTINCT ON (staging.sns_messageid, staging.address) '
+            '{selected} FROM {staging} AS staging WHERE NOT EXISTS ('
+            'SELECT 1 FROM {table} AS stored '
+            'WHERE stored.address = staging.address '
+            'AND stored.sns_messageid = staging.sns_messageid)')
+    else:
+        source = 'SELECT {selected} FROM {staging} AS staging'
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+            'SELECT {columns} FROM {table} WITH NO DATA'.format(
+                staging=staging, columns=columns, table=table))
+        cursor.copy_expert(
+            'COPY {0} ({1}) FROM STDIN'.format(staging, columns),
+            RowStream(instances, fields, connection), size=buffer_size)
+        cursor.execute(
+            'INSERT INTO {table} ({columns}) {source} '
+            'ON CONFLICT DO NOTHING'.format(
+                table=table, columns=columns, source=source.format(
+                    selected=selected, staging=staging, table=table)))
+        inserted = cursor.rowcount
+        # Let a later insert in the same transaction stage again
+        cursor.execute('DROP TABLE {0}'.format(staging))
+    return inserted
+
+
+def orm_insert(model, instances, using, skip_duplicates=False,
+               batch_size=500):
+    """
+    Insert instances with bulk_create and return the number inserted
+
+    instances are read batch_size at a time. With skip_duplicates, rows
+    whose sns_messageid and address are already stored, or repeated in
+    instances, are skipped.
+    """
+    instances = iter(instances)
+    queryset = model.objects.using(using)
+    inserted = 0
+    seen = set()
+    with transaction.atomic(using=using):
+        while True:
+            batch = list(itertools.islice(instances, batch_size))
+            if not batch:
+                return inserted
+            if skip_duplicates:
+                stored = set(queryset.filter(sns_messageid__in=set(
+                    instance.sns_messageid for instance in batch
+                )).values_list('sns_messageid', 'address'))
+                unique = []
+                for instance in batch:
+                    key = (instance.sns_messageid, instance.address)
+                    if key not in stored and key not in seen:
+                        seen.add(key)
+                        unique.append(instance)
+                batch = unique
+            queryset.bulk_create(batch, batch_size=batch_size)
+            inserted += len(batch)
+
+
+def _route(model, instances):
+    """Return a list of (alias, instances) to insert each instance on"""
+    if len(model_databases(model)) < 2:
+        return [(router.db_for_write(model), instances)]
+
+    # A sharded model's rows go to the shard the router picks for each one
+    by_alias = collections.OrderedDict()
+    for instance in instances:
+        by_alias.setdefault(
+            router.db_for_write(model, instance=instance), []).append(instance)
+    return list(by_alias.items())
+
+
+def bulk_insert(model, instances, using=None, skip_duplicates=False,
+                batch_size=500, copy=True):
+    """
+    Insert many unsaved Bounce, Complaint or Delivery instances at once
+
+    instances may be a generator, which is read as the rows are sent, in one
+    transaction per database. The rows go to using, or else each row goes to
+    the database the router picks for it, in which case the instances of a
+    sharded model are read into memory to be grouped by shard. On
+    PostgreSQL they are sent with COPY unless copy is False, and batch_size
+    is only used by bulk_create elsewhere. Returns the number of rows
+    inserted.
+
+    COPY, and bulk_create outside of PostgreSQL, leave the primary keys of
+    the instances unset. Call fetch_pks before using the instances where
+    their ids are needed, such as in signals or outbox events.
+    """
+    # pylint: disable=too-many-arguments
+    routes = [(using, instances)] if using else _route(model, instances)
+    inserted = 0
+    for alias, rows in routes:
+        if copy and can_copy(alias):
+            inserted += copy_insert(model, rows, alias, skip_duplicates)
+        else:
+            inserted += orm_insert(
+                model, rows, alias, skip_duplicates, batch_size)
+    return inserted
+
+
+def fetch_pks(model, instances, using, chunk_size=500):
+    """
+    Set the primary keys of instances just inserted by bulk_insert
+
+    Rows are read back by their sns_messageid and address, so call this in
+    the transaction that inserted them. Where a notification was stored more
+    than once, the newest row is used. Instances that already have a key are
+    left alone.
+    """
+    missing = [instance for instance in instances if instance.pk is None]
+    queryset = model.objects.using(using)
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        found = dict(
+            ((sns_messageid, address), pk)
+            for pk, sns_messageid, address in queryset.filter(
+                sns_messageid__in=set(
+                    instance.sns_messageid for instance in chunk)).order_by(
+                        'pk').values_list('pk', 'sns_messageid', 'address'))
+        for instance in chunk:
+            instance.pk = found.get((instance.sns_messageid, instance.address))
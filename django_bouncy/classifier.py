@@ -0,0 +1,204 @@
+"""Classify the SMTP responses of bounces into categories"""
+import collections
+import multiprocessing
+import re
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from django_bouncy.conf import get_config
+from django_bouncy.models import Bounce
+from django_bouncy.routers import model_databases
+
+UNCLASSIFIED = ''
+
+# The default (category, pattern) table. Patterns are case insensitive.
+DEFAULT_RULES = (
+    ('mailbox_unknown',
+     r'\b5\.1\.1\b|user unknown|unknown user|no such (user|mailbox|recipient)'
+     r'|(user|mailbox|recipient|address) (does not exist|not found)'
+     r'|invalid recipient|recipient (address )?rejected'),
+    ('domain_unknown',
+     r'\b5\.1\.2\b|\b5\.4\.4\b|host (or domain name )?not found'
+     r'|domain (not found|does not exist)|unroute?able|no mx'),
+    ('mailbox_full',
+     r'\b[45]\.2\.2\b|mailbox (is )?full|over ?quota|quota exceeded'
+     r'|insufficient (storage|space)'),
+    ('mailbox_disabled',
+     r'\b5\.2\.1\b|(mailbox|account|user) (is |has been )?'
+     r'(disabled|inactive|suspended|closed|deactivated)'),
+    ('message_too_large',
+     r'\b5\.3\.4\b|\b5\.2\.3\b|message (size )?(is )?too (large|big)'
+     r'|exceeds (the )?(maximum )?(message )?size'),
+    ('spam_block',
+     r'\b5\.7\.1\b|spam|blocked|black ?list|block ?list|blacklisted'
+     r'|reputation|\brbl\b|spamhaus|policy'),
+    ('throttled',
+     r'\b4\.7\.\d+\b|rate limit|too many (connections|messages|recipients)'
+     r'|try again later|throttl'),
+    ('connection',
+     r'\b4\.4\.\d+\b|timed? ?out|connection (refused|reset|dropped|lost)'),
+)
+
+
+class Classifier(object):
+    """
+    Classify SMTP responses with a table of (category, pattern) rules
+
+    The rules are compiled into one regular expression with a named group
+    for each rule, so a response is scanned once however many rules there
+    are. The leftmost match wins, and at the same position the earlier rule
+    wins, so a status code such as 5.1.1 decides before the text after it.
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = tuple((category, pattern) for category, pattern in rules)
+        self.categories = dict(
+            ('rule{0}'.format(index), category)
+            for index, (category, _) in enumerate(self.rules))
+        # A pattern that never matches when there are no rules
+        pattern = '|'.join(
+            '(?P<rule{0}>{1})'.format(index, pattern)
+            for index, (_, pattern) in enumerate(self.rules)) or '(?!)'
+        self.regex = re.compile(pattern, re.IGNORECASE)
+
+    def classify(self, *texts):
+        """Return the category of the given texts, or UNCLASSIFIED"""
+        match = self.regex.search(' '.join(text for text in texts if text))
+        if match is None:
+            return UNCLASSIFIED
+        return self.categories[match.lastgroup]
+
+
+_classifier = None
+_classifier_config = None
+
+
+def get_classifier():
+    """
+    Return the Classifier for this process
+
+    The classifier is compiled from BOUNCY_CLASSIFIER_RULES, or the default
+    rules, and recompiled when the settings change.
+    """
+    # pylint: disable=global-statement
+    global _classifier, _classifier_config
+    config = get_config()
+    if config is not _classifier_config:
+        _classifier = Classifier(config.classifier_rules or DEFAULT_RULES)
+        _classifier_config = config
+    return _classifier
+
+
+def classify(status, diagnostic_code):
+    """Return the category of a bounce's status and diagnostic code"""
+    return get_classifier().classify(status, diagnostic_code)
+
+
+# The classifier in each worker process of reclassify
+_worker_classifier = None
+
+
+def _start_worker(rules):
+    """Compile the rules in a new worker process"""
+    # pylint: disable=global-statement
+    global _worker_classifier
+    _worker_classifier = Classifier(rules)
+
+
+def _classify_rows(rows):
+    """Return the (pk, category) of rows whose category has changed"""
+    classifier = _worker_classifier or get_classifier()
+    changed = []
+    for pk, category, status, diagnostic_code in rows:
+        new_category = classifier.classify(status, diagnostic_code)
+        if new_category != category:
+            changed.append((pk, new_category))
+    return len(rows), changed
+
+
+def classify_bounces(queryset):
+    """
+    Classify the bounces in a queryset and store the changed categories
+
+    Returns the number of bounces whose category changed.
+    """
+    _, rows = _classify_rows(list(queryset.values_list(
+        'pk', 'category', 'status', 'diagnostic_code')))
+    _write_categories(queryset.db, rows)
+    return len(rows)
+
+
+def _read_chunks(queryset, chunk_size):
+    """Yield lists of bounce rows, chunk_size at a time, in pk order"""
+    last = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        rows = list(chunk.values_list(
+            'pk', 'category', 'status', 'diagnostic_code')[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+
+
+def reclassify(databases=None, chunk_size=500, processes=None):
+    """
+    Classify every stored bounce again with the current rules
+
+    Bounces are read in chunks of chunk_size in primary key order and
+    classified by a pool of processes, while this process reads the next
+    chunks and writes the results with one UPDATE per category and chunk.
+    Only bounces whose category changed are written. With processes set to
+    0 or 1 the bounces are classified in this process. Returns the number
+    of bounces checked and the number changed.
+    """
+    if databases is None:
+        databases = model_databases(Bounce) or (DEFAULT_DB_ALIAS,)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(
+            processes, _start_worker, (get_classifier().rules,))
+    totals = [0, 0]
+
+    def finish(alias, result):
+        """Write the categories of one classified chunk"""
+        count, rows = result
+        totals[0] += count
+        totals[1] += len(rows)
+        _write_categories(alias, rows)
+
+    try:
+        for alias in databases:
+            # The database is only used from this thread, and no more than
+            # two chunks per worker are held in memory at once
+            pending = collections.deque()
+            for rows in _read_chunks(Bounce.objects.using(alias), chunk_size):
+                if pool is None:
+                    finish(alias, _classify_rows(rows))
+                    continue
+                pending.append(pool.apply_async(_classify_rows, (rows,)))
+                if len(pending) >= processes * 2:
+                    finish(alias, pending.popleft().get())
+            while pending:
+                finish(alias, pending.popleft().get())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return totals[0], totals[1]
+
+
+def _write_categories(alias, rows):
+    """Store the new categories of a chunk of bounces"""
+    by_category = {}
+    for pk, category in rows:
+        by_category.setdefault(category, []).append(pk)
+    with transaction.atomic(using=alias):
+        for category, pks in by_category.items():
+            Bounce.objects.using(alias).filter(pk__in=pks).update(
+                category=category)
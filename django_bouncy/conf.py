@@ -0,0 +1,180 @@
+"""Compiled settings for the django_bouncy app"""
+import collections
+import datetime
+import re
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+import six
+
+DEFAULT_DOMAIN_REGEX = r"sns.[a-z0-9\-]+.amazonaws.com$"
+
+_config = None
+
+# A compiled entry from BOUNCY_SOFT_BOUNCE_RULES
+SoftBounceRule = collections.namedtuple(
+    'SoftBounceRule', ['name', 'count', 'window', 'subtypes', 'duration'])
+
+
+def compile_soft_bounce_rule(index, rule):
+    """Return the SoftBounceRule for a dict in BOUNCY_SOFT_BOUNCE_RULES"""
+    subtypes = rule.get('subtypes')
+    duration = rule.get('duration')
+    return SoftBounceRule(
+        name=rule.get('name') or 'soft-bounce-{0}'.format(index + 1),
+        count=rule['count'],
+        window=datetime.timedelta(seconds=rule['window']),
+        subtypes=None if subtypes is None else frozenset(subtypes),
+        duration=None if duration is None else datetime.timedelta(
+            seconds=duration))
+
+
+class BouncyConfig(object):
+    """
+    Snapshot of the BOUNCY_* settings, prepared for use on every request
+
+    Topics are held in a frozenset and domain patterns are compiled, so
+    checking a request doesn't need to look up or parse any settings. The
+    metrics backend, admission controller and archive built from these
+    settings are kept here too, so they are rebuilt when the settings change.
+    """
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    def __init__(self):
+        topics = getattr(settings, 'BOUNCY_TOPIC_ARN', None)
+        self.topic_arns = None if topics is None else frozenset(topics)
+        self.cert_domain_regex = re.compile(getattr(
+            settings, 'BOUNCY_CERT_DOMAIN_REGEX', DEFAULT_DOMAIN_REGEX))
+        self.subscribe_domain_regex = re.compile(getattr(
+            settings, 'BOUNCY_SUBSCRIBE_DOMAIN_REGEX', DEFAULT_DOMAIN_REGEX))
+        self.verify_certificate = getattr(
+            settings, 'BOUNCY_VERIFY_CERTIFICATE', True)
+        self.auto_subscribe = getattr(settings, 'BOUNCY_AUTO_SUBSCRIBE', True)
+        self.key_cache = getattr(settings, 'BOUNCY_KEY_CACHE', 'default')
+        self.http_timeout = getattr(settings, 'BOUNCY_HTTP_TIMEOUT', 10)
+        self.http_max_connections = getattr(
+            settings, 'BOUNCY_HTTP_MAX_CONNECTIONS', 4)
+        self.http_max_concurrency = getattr(
+            settings, 'BOUNCY_HTTP_MAX_CONCURRENCY', 10)
+        self.http_retries = getattr(settings, 'BOUNCY_HTTP_RETRIES', 2)
+        self.http_backoff = getattr(settings, 'BOUNCY_HTTP_BACKOFF', 0.5)
+        self.http_transport = getattr(settings, 'BOUNCY_HTTP_TRANSPORT', None)
+        self.cert_urls = tuple(getattr(settings, 'BOUNCY_CERT_URLS', ()))
+        self.warm_certs_on_startup = getattr(
+            settings, 'BOUNCY_WARM_CERTS_ON_STARTUP', False)
+        self.dedupe_cache = getattr(settings, 'BOUNCY_DEDUPE_CACHE', None)
+        self.dedupe_ttl = getattr(settings, 'BOUNCY_DEDUPE_TTL', 300)
+        self.exclude_fields = frozenset(
+            getattr(settings, 'BOUNCY_EXCLUDE_FIELDS', ()))
+        self.field_max_lengths = dict(
+            getattr(settings, 'BOUNCY_FIELD_MAX_LENGTHS', {}))
+        self.databases = dict(
+            (name.lower(), (aliases,) if isinstance(
+                aliases, six.string_types) else tuple(aliases))
+            for name, aliases in getattr(
+                settings, 'BOUNCY_DATABASES', {}).items())
+        self.read_databases = dict(
+            getattr(settings, 'BOUNCY_READ_DATABASES', {}))
+        self.read_your_writes = getattr(
+            settings, 'BOUNCY_READ_YOUR_WRITES', 10)
+        self.recent_writes_cache = getattr(
+            settings, 'BOUNCY_RECENT_WRITES_CACHE', 'default')
+        self.query_chunk_size = getattr(
+            settings, 'BOUNCY_QUERY_CHUNK_SIZE', 2000)
+        self.scatter_threads = getattr(settings, 'BOUNCY_SCATTER_THREADS', 8)
+        self.feed_secret = getattr(settings, 'BOUNCY_FEED_SECRET', None)
+        self.feed_delay = getattr(settings, 'BOUNCY_FEED_DELAY', 2)
+        self.feed_max_limit = getattr(settings, 'BOUNCY_FEED_MAX_LIMIT', 1000)
+        self.feed_max_wait = getattr(settings, 'BOUNCY_FEED_MAX_WAIT', 30)
+        self.feed_poll_interval = getattr(
+            settings, 'BOUNCY_FEED_POLL_INTERVAL', 1.0)
+        self.outbox = getattr(settings, 'BOUNCY_OUTBOX', False)
+        self.outbox_sink = getattr(
+            settings, 'BOUNCY_OUTBOX_SINK', 'django_bouncy.sinks.WebhookSink')
+        self.outbox_sink_options = dict(
+            getattr(settings, 'BOUNCY_OUTBOX_SINK_OPTIONS', {}))
+        self.outbox_batch_size = getattr(
+            settings, 'BOUNCY_OUTBOX_BATCH_SIZE', 100)
+        self.outbox_max_attempts = getattr(
+            settings, 'BOUNCY_OUTBOX_MAX_ATTEMPTS', 10)
+        self.outbox_backoff = getattr(settings, 'BOUNCY_OUTBOX_BACKOFF', 5)
+        self.outbox_max_backoff = getattr(
+            settings, 'BOUNCY_OUTBOX_MAX_BACKOFF', 3600)
+        self.outbox_claim_timeout = getattr(
+            settings, 'BOUNCY_OUTBOX_CLAIM_TIMEOUT', 300)
+        self.batch_secret = getattr(settings, 'BOUNCY_BATCH_SECRET', None)
+        self.batch_max_items = getattr(
+            settings, 'BOUNCY_BATCH_MAX_ITEMS', 1000)
+        self.batch_max_bytes = getattr(
+            settings, 'BOUNCY_BATCH_MAX_BYTES', 10 * 1024 * 1024)
+        self.batch_copy = getattr(settings, 'BOUNCY_BATCH_COPY', False)
+        self.soft_bounce_rules = tuple(
+            compile_soft_bounce_rule(index, rule) for index, rule in
+            enumerate(getattr(settings, 'BOUNCY_SOFT_BOUNCE_RULES', ())))
+        rules = getattr(settings, 'BOUNCY_CLASSIFIER_RULES', None)
+        self.classifier_rules = None if rules is None else tuple(
+            (category, pattern) for category, pattern in rules)
+        self.stats_secret = getattr(settings, 'BOUNCY_STATS_SECRET', None)
+        self.metrics_secret = getattr(settings, 'BOUNCY_METRICS_SECRET', None)
+        self.stats_cache = getattr(settings, 'BOUNCY_STATS_CACHE', 'default')
+        self.stats_cache_ttl = getattr(settings, 'BOUNCY_STATS_CACHE_TTL', 60)
+        self.stats_hourly_retention = getattr(
+            settings, 'BOUNCY_STATS_HOURLY_RETENTION', 14)
+        self.soft_bounce_bucket = datetime.timedelta(seconds=getattr(
+            settings, 'BOUNCY_SOFT_BOUNCE_BUCKET', 3600))
+        self.metrics_backend = getattr(
+            settings, 'BOUNCY_METRICS_BACKEND',
+            'django_bouncy.metrics.MetricsBackend')
+        self.profile_sample_rate = getattr(
+            settings, 'BOUNCY_PROFILE_SAMPLE_RATE', 0)
+        self.profile_dir = getattr(settings, 'BOUNCY_PROFILE_DIR', None)
+        self.profile_max_bytes = getattr(
+            settings, 'BOUNCY_PROFILE_MAX_BYTES', 50 * 1024 * 1024)
+        self.max_in_flight = getattr(settings, 'BOUNCY_MAX_IN_FLIGHT', None)
+        self.max_db_latency = getattr(settings, 'BOUNCY_MAX_DB_LATENCY', None)
+        self.shed_status = getattr(settings, 'BOUNCY_SHED_STATUS', 503)
+        self.shed_retry_after = str(
+            getattr(settings, 'BOUNCY_SHED_RETRY_AFTER', 5))
+        self.archive_dir = getattr(settings, 'BOUNCY_ARCHIVE_DIR', None)
+        self.archive_segment_size = getattr(
+            settings, 'BOUNCY_ARCHIVE_SEGMENT_SIZE', 64 * 1024 * 1024)
+        self.archive_flush_bytes = getattr(
+            settings, 'BOUNCY_ARCHIVE_FLUSH_BYTES', 1024 * 1024)
+        self.archive_flush_interval = getattr(
+            settings, 'BOUNCY_ARCHIVE_FLUSH_INTERVAL', 5.0)
+
+        # Built on first use by get_metrics, get_admission_controller and
+        # get_archive
+        self.metrics = None
+        self.admission_controller = None
+        self.archive = None
+
+
+def get_config():
+    """Return the BouncyConfig for the current settings"""
+    # pylint: disable=global-statement
+    global _config
+    if _config is None:
+        _config = BouncyConfig()
+    return _config
+
+
+def reset_config():
+    """
+    Forget the current BouncyConfig
+
+    This happens automatically when settings are changed with
+    override_settings, but must be called after assigning to a BOUNCY_*
+    setting directly.
+    """
+    # pylint: disable=global-statement
+    global _config
+    _config = None
+
+
+@receiver(setting_changed)
+def setting_changed_handler(setting, **kwargs):
+    """Rebuild the BouncyConfig once a BOUNCY_* setting has changed"""
+    # pylint: disable=unused-argument
+    if setting.startswith('BOUNCY_'):
+        reset_config()
@@ -0,0 +1,325 @@
+"""Escalate repeated soft bounces to suppressions"""
+import collections
+import datetime
+import logging
+
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.utils import timezone
+
+from django_bouncy import signals
+from django_bouncy.conf import get_config
+from django_bouncy.models import (
+    Bounce, SoftBounceCounter, Suppression, increment
+)
+from django_bouncy.queries import for_each_shard
+from django_bouncy.routers import model_databases, normalize_address, shard_for
+
+logger = logging.getLogger(__name__)
+
+SOFT_BOUNCE_TYPE = 'Transient'
+
+
+def is_soft(bounce):
+    """Return True if a bounce is a soft (transient) bounce"""
+    return not bounce.hard and bounce.bounce_type == SOFT_BOUNCE_TYPE
+
+
+def bucket_for(time, width):
+    """Return the start of the bucket, width wide, that time falls in"""
+    if timezone.is_aware(time):
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+        time = time.astimezone(timezone.utc)
+    else:
+        epoch = datetime.datetime(1970, 1, 1)
+    width = int(width.total_seconds())
+    seconds = int((time - epoch).total_seconds())
+    return epoch + datetime.timedelta(seconds=seconds - seconds % width)
+
+
+def count_soft_bounces(bounces, width):
+    """
+    Return a Counter of the soft bounces by (address, subtype, bucket)
+
+    Bounces are bucketed by when they were stored, which is the clock
+    suppressions expire by whether or not USE_TZ is set.
+    """
+    counts = collections.Counter()
+    for bounce in bounces:
+        if is_soft(bounce):
+            counts[(
+                normalize_address(bounce.address), bounce.bounce_subtype,
+                bucket_for(bounce.created_at, width))] += 1
+    return counts
+
+
+def increment_counters(counts):
+    """Add a Counter from count_soft_bounces to the stored counters"""
+    for (address, subtype, bucket), count in counts.items():
+        increment(
+            SoftBounceCounter, router.db_for_write(
+                SoftBounceCounter, instance=SoftBounceCounter(
+                    address=address)),
+            count, address=address, subtype=subtype, bucket=bucket)
+
+
+def matching_rules(counters, now, rules, width):
+    """
+    Return the rules an address's counters meet at a point in time
+
+    counters is a list of (subtype, bucket, count). Windows are measured in
+    whole buckets, so a window can include up to one bucket more than its
+    length.
+    """
+    matched = []
+    for rule in rules:
+        start = bucket_for(now - rule.window, width)
+        total = sum(
+            count for subtype, bucket, count in counters
+            if start <= bucket <= now and (
+                rule.subtypes is None or subtype in rule.subtypes))
+        if total >= rule.count:
+            matched.append(rule)
+    return matched
+
+
+def longest_suppression(rules, now):
+    """Return the (rule, expires_at) of the rule that suppresses longest"""
+    rule = max(rules, key=lambda rule: (
+        rule.duration is None, rule.duration or datetime.timedelta(0)))
+    if rule.duration is None:
+        return rule, None
+    return rule, now + rule.duration
+
+
+def suppress(address, rule_name, expires_at):
+    """
+    Suppress an address until expires_at, or for good if it is None
+
+    Existing suppressions are only ever extended. Sends the suppression
+    signal and returns True if the address was not already suppressed.
+    """
+    now = timezone.now()
+    if expires_at is not None and expires_at <= now:
+        return False
+
+    address = normalize_address(address)
+    instance = Suppression(
+        address=address, rule=rule_name, expires_at=expires_at)
+    alias = router.db_for_write(Suppression, instance=instance)
+    with transaction.atomic(using=alias):
+        existing = Suppression.objects.using(alias).select_for_update(
+            ).filter(address=address).first()
+        if existing is None:
+            instance.save(force_insert=True, using=alias)
+            changed = True
+        else:
+            changed = not existing.is_active(now)
+            if not changed and (existing.expires_at is None or (
+                    expires_at is not None and
+                    expires_at <= existing.expires_at)):
+                return False
+            existing.rule = rule_name
+            existing.expires_at = expires_at
+            existing.save(using=alias)
+            instance = existing
+
+    if changed:
+        logger.info('Address Suppressed: %s (%s)', address, rule_name)
+        signals.suppression.send(
+            sender=Suppression, address=address, suppressed=True,
+            instance=instance)
+    return changed
+
+
+def release(suppression):
+    """Lift an active suppression and send the suppression signal"""
+    suppression.expires_at = timezone.now()
+    suppression.save(update_fields=['expires_at', 'modified_at'])
+    logger.info('Address Released: %s', suppression.address)
+    signals.suppression.send(
+        sender=Suppression, address=suppression.address, suppressed=False,
+        instance=suppression)
+
+
+def record_soft_bounces(bounces):
+    """
+    Count newly stored soft bounces and apply BOUNCY_SOFT_BOUNCE_RULES
+
+    Only the counters of the addresses that just bounced are read, from the
+    oldest bucket the longest rule needs. Returns the number of addresses
+    that became suppressed.
+    """
+    config = get_config()
+    if not config.soft_bounce_rules:
+        return 0
+    width = config.soft_bounce_bucket
+    counts = count_soft_bounces(bounces, width)
+    if not counts:
+        return 0
+    increment_counters(counts)
+
+    latest = {}
+    for bounce in bounces:
+        if is_soft(bounce):
+            address = normalize_address(bounce.address)
+            latest[address] = max(
+                latest.get(address, bounce.created_at), bounce.created_at)
+
+    longest = max(rule.window for rule in config.soft_bounce_rules)
+    start = bucket_for(min(latest.values()) - longest, width)
+    by_alias = {}
+    for address in latest:
+        by_alias.setdefault(
+            shard_for(SoftBounceCounter, address), []).append(address)
+
+    counters = collections.defaultdict(list)
+    for alias, addresses in by_alias.items():
+        for address, subtype, bucket, count in (
+                SoftBounceCounter.objects.using(alias).filter(
+                    address__in=addresses, bucket__gte=start).values_list(
+                        'address', 'subtype', 'bucket', 'count')):
+            counters[address].append((subtype, bucket, count))
+
+    suppressed = 0
+    for address, now in latest.items():
+        rules = matching_rules(
+            counters[address], now, config.soft_bounce_rules, width)
+        if rules:
+            rule, expires_at = longest_suppression(rules, now)
+            suppressed += suppress(address, rule.name, expires_at)
+    return suppressed
+
+
+def earned_suppression(counters, rules, width):
+    """
+    Return the (rule, expires_at) an address's whole history earns
+
+    Each bucket is treated as a moment the rules were checked, and the
+    suppression that lasts longest wins. Returns None if no rule was met.
+    """
+    best = None
+    for now in sorted(set(bucket for _, bucket, _ in counters)):
+        matched = matching_rules(counters, now, rules, width)
+        if not matched:
+            continue
+        found = longest_suppression(matched, now)
+        if best is None or best[1] is not None and (
+                found[1] is None or found[1] > best[1]):
+            best = found
+    return best
+
+
+def rebuild_counters(counts, rules, width):
+    """
+    Bring the stored counters in line with a Counter from count_soft_bounces
+
+    Counters are updated in place rather than deleted and created again, so
+    increments made while bounces are stored are never thrown away. Buckets
+    before the current one no longer change, so their counts are set from
+    counts. Counters in the current bucket are still being incremented, so
+    only the missing ones are added. Counters older than the longest rule
+    needs are deleted, and every counter is deleted when there are no rules.
+    """
+    if not rules:
+        for alias in _databases(SoftBounceCounter):
+            SoftBounceCounter.objects.using(alias).all().delete()
+        return
+
+    now = timezone.now()
+    keep_from = bucket_for(now - max(rule.window for rule in rules), width)
+    current = bucket_for(now, width)
+    wanted = collections.defaultdict(dict)
+    for (address, subtype, bucket), count in counts.items():
+        if bucket >= keep_from:
+            wanted[shard_for(SoftBounceCounter, address)][
+                (address, subtype, bucket)] = count
+
+    for alias in _databases(SoftBounceCounter):
+        queryset = SoftBounceCounter.objects.using(alias)
+        with transaction.atomic(using=alias):
+            queryset.filter(bucket__lt=keep_from).delete()
+            stored = dict(
+                ((address, subtype, bucket), (pk, count))
+                for pk, address, subtype, bucket, count in
+                queryset.select_for_update().filter(
+                    bucket__lt=current).values_list(
+                        'pk', 'address', 'subtype', 'bucket', 'count'))
+
+            stale = []
+            for key, (pk, count) in stored.items():
+                if key not in wanted[alias]:
+                    stale.append(pk)
+                elif wanted[alias][key] != count:
+                    queryset.filter(pk=pk).update(count=wanted[alias][key])
+            queryset.filter(pk__in=stale).delete()
+            queryset.bulk_create([
+                SoftBounceCounter(
+                    address=address, subtype=subtype, bucket=bucket,
+                    count=count)
+                for (address, subtype, bucket), count in wanted[alias].items()
+                if bucket < current and
+                (address, subtype, bucket) not in stored], batch_size=500)
+
+        existing = set(queryset.filter(bucket__gte=current).values_list(
+            'address', 'subtype', 'bucket'))
+        for key, count in wanted[alias].items():
+            address, subtype, bucket = key
+            if bucket >= current and key not in existing:
+                increment(
+                    SoftBounceCounter, alias, count, address=address,
+                    subtype=subtype, bucket=bucket)
+
+
+def _databases(model):
+    """Return every database a model is stored in"""
+    return model_databases(model) or (DEFAULT_DB_ALIAS,)
+
+
+def reevaluate():
+    """
+    Apply BOUNCY_SOFT_BOUNCE_RULES to every stored soft bounce
+
+    Addresses the rules now suppress are suppressed, and active suppressions
+    made by a rule that the history no longer earns are lifted. The counters
+    are rebuilt from the Bounce table, keeping only the buckets the longest
+    rule needs. Returns a dict of the number of addresses evaluated,
+    suppressed and released.
+    """
+    config = get_config()
+    rules = config.soft_bounce_rules
+    width = config.soft_bounce_bucket
+
+    counts = collections.Counter()
+    for shard_counts in for_each_shard(Bounce, lambda queryset: (
+            count_soft_bounces(queryset.filter(
+                hard=False, bounce_type=SOFT_BOUNCE_TYPE).only(
+                    'address', 'hard', 'bounce_type', 'bounce_subtype',
+                    'created_at').iterator(), width))):
+        counts.update(shard_counts)
+
+    counters = collections.defaultdict(list)
+    for (address, subtype, bucket), count in counts.items():
+        counters[address].append((subtype, bucket, count))
+
+    earned = {}
+    if rules:
+        for address, history in counters.items():
+            found = earned_suppression(history, rules, width)
+            if found is not None and (
+                    found[1] is None or found[1] > timezone.now()):
+                earned[address] = found
+
+    results = {'evaluated': len(counters), 'suppressed': 0, 'released': 0}
+    for address, (rule, expires_at) in earned.items():
+        results['suppressed'] += suppress(address, rule.name, expires_at)
+
+    for alias in _databases(Suppression):
+        for suppression in Suppression.objects.using(alias).active().exclude(
+                rule=''):
+            if suppression.address in earned:
+                continue
+            release(suppression)
+            results['released'] += 1
+
+    rebuild_counters(counts, rules, width)
+    return results
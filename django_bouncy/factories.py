@@ -0,0 +1,272 @@
+"""
+Realistic synthetic feedback for the django_bouncy tables
+
+Used to fill a database with millions of bounces, complaints and deliveries
+so the admin, queries and migrations can be measured against realistic
+volumes. The same seed always generates the same rows.
+"""
+import bisect
+import contextlib
+import datetime
+import itertools
+import math
+import random
+import uuid
+
+from django.db import router
+from django.utils import timezone
+
+from django_bouncy.bulk import bulk_insert
+from django_bouncy.classifier import classify
+from django_bouncy.models import Bounce, Complaint, Delivery
+
+# A few large mailbox providers receive most mail. The rest goes to a long
+# tail of company domains.
+DOMAINS = [
+    ('gmail.com', 40), ('yahoo.com', 14), ('hotmail.com', 10),
+    ('outlook.com', 8), ('icloud.com', 6), ('aol.com', 4),
+    ('comcast.net', 3), ('example.com', 2), ('example.org', 1),
+]
+TAIL_DOMAINS = 5000
+TAIL_WEIGHT = 12
+
+SENDERS = [
+    ('newsletter@mail.example.com', 60), ('receipts@example.com', 25),
+    ('alerts@example.com', 10), ('support@example.com', 5),
+]
+
+TOPICS = [
+    ('arn:aws:sns:us-east-1:123456789012:Bouncy_Seed', 80),
+    ('arn:aws:sns:eu-west-1:123456789012:Bouncy_Seed', 20),
+]
+
+BOUNCES = [
+    # (bounceType, bounceSubType, status, diagnosticCode, weight)
+    ('Permanent', 'General', '5.1.1',
+     'smtp; 550 5.1.1 The email account that you tried to reach does not '
+     'exist', 40),
+    ('Permanent', 'NoEmail', '5.1.2',
+     'smtp; 550 5.1.2 Host or domain name not found', 8),
+    ('Permanent', 'Suppressed', '5.1.1',
+     'Amazon SES has suppressed sending to this address because it has a '
+     'recent history of bouncing as an invalid address', 10),
+    ('Permanent', 'General', '5.2.1',
+     'smtp; 550 5.2.1 The email account that you tried to reach is '
+     'disabled', 4),
+    ('Transient', 'MailboxFull', '5.2.2',
+     'smtp; 552 5.2.2 The email account that you tried to reach is over '
+     'quota', 14),
+    ('Transient', 'MessageTooLarge', '5.3.4',
+     'smtp; 552 5.3.4 Message size exceeds fixed limit', 2),
+    ('Transient', 'ContentRejected', '5.7.1',
+     'smtp; 554 5.7.1 Message rejected due to spam content', 6),
+    ('Transient', 'General', '4.7.0',
+     'smtp; 421 4.7.0 Try again later, closing connection', 12),
+    ('Undetermined', 'Undetermined', None, None, 4),
+]
+
+COMPLAINTS = [
+    ('abuse', 80), (None, 10), ('other', 5), ('fraud', 3), ('not-spam', 1),
+    ('virus', 1),
+]
+
+KINDS = ('bounce', 'complaint', 'delivery')
+MODELS = {'bounce': Bounce, 'complaint': Complaint, 'delivery': Delivery}
+
+# The rate of feedback grows steadily so the last day of the period gets
+# GROWTH times as much feedback as the first
+GROWTH = 4.0
+
+
+class Weighted(object):
+    """Choose from a list of (choice, weight) pairs"""
+    def __init__(self, pairs):
+        self.choices = [choice for choice, _ in pairs]
+        self.totals = []
+        total = 0
+        for _, weight in pairs:
+            total += weight
+            self.totals.append(total)
+
+    def pick(self, fraction):
+        """Return the choice at a fraction in [0, 1) of the total weight"""
+        return self.choices[bisect.bisect_right(
+            self.totals, fraction * self.totals[-1])]
+
+    def choose(self, rng):
+        """Return a random choice"""
+        return self.pick(rng.random())
+
+
+@contextlib.contextmanager
+def keep_timestamps(model):
+    """
+    Stop created_at and modified_at being set to now while saving a model
+
+    Not thread safe, as the fields are shared by every instance of the model.
+    """
+    fields = [model._meta.get_field(name)
+              for name in ('created_at', 'modified_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class FeedbackFactory(object):
+    """
+    Generate unsaved Bounce, Complaint and Delivery instances
+
+    Rows are spread over the days before end, with their created_at times
+    in order and the rate of feedback growing over the period. Recipients
+    are drawn from a pool of addresses, skewed so that a small share of the
+    addresses receive most of the feedback, and each address keeps the same
+    domain wherever it appears. The same seed, end and pool always give the
+    same rows.
+    """
+    def __init__(self, seed=0, end=None, days=30, addresses=100000):
+        self.seed = seed
+        self.end = end or timezone.now()
+        self.span = datetime.timedelta(days=days).total_seconds()
+        self.addresses = addresses
+        self.domains = Weighted(DOMAINS + [(None, TAIL_WEIGHT)])
+        self.senders = Weighted(SENDERS)
+        self.topics = Weighted(TOPICS)
+        # Each kind of bounce is only classified once
+        self.bounces = Weighted([
+            (bounce[:-1] + (classify(*bounce[2:4]),), bounce[-1])
+            for bounce in BOUNCES])
+        self.complaints = Weighted(COMPLAINTS)
+
+    def rng(self, kind):
+        """Return the random number generator for a kind of feedback"""
+        return random.Random(self.seed * len(KINDS) + KINDS.index(kind))
+
+    def address(self, rng):
+        """Return a recipient address"""
+        # Squaring favours the low numbers, which receive most feedback
+        number = int(self.addresses * rng.random() ** 2)
+        # Hashing the number always gives the same address the same domain
+        fraction = (number * 2654435761 % 2 ** 32) / float(2 ** 32)
+        domain = self.domains.pick(fraction)
+        if domain is None:
+            domain = 'company{0}.com'.format(number % TAIL_DOMAINS)
+        return 'user{0}@{1}'.format(number, domain)
+
+    def created_at(self, index, count, rng):
+        """Return the time the index-th of count rows was stored"""
+        # The inverse of the distribution whose rate grows linearly by GROWTH
+        # times, sampled once within each of count equal slices so the times
+        # are in order
+        share = (index + rng.random()) / count
+        growth = GROWTH - 1
+        if growth:
+            share = (math.sqrt(1 + growth * (growth + 2) * share) - 1) / growth
+        return self.end - datetime.timedelta(seconds=self.span * (1 - share))
+
+    def common(self, kind, index, count, rng):
+        """Return the fields every kind of feedback shares"""
+        created_at = self.created_at(index, count, rng)
+        if kind == 'delivery':
+            delay = rng.lognormvariate(0, 1)
+        elif kind == 'bounce':
+            delay = rng.lognormvariate(2, 2)
+        else:
+            # Complaints arrive once the recipient has read the mail
+            delay = rng.lognormvariate(9, 1.5)
+        mail_timestamp = created_at - datetime.timedelta(seconds=delay)
+        return {
+            'created_at': created_at,
+            'modified_at': created_at,
+            'sns_topic': self.topics.choose(rng),
+            'sns_messageid': str(uuid.UUID(int=rng.getrandbits(128))),
+            'mail_timestamp': mail_timestamp,
+            'mail_id': '{0:032x}-000000'.format(rng.getrandbits(128)),
+            'mail_from': self.senders.choose(rng),
+            'address': self.address(rng),
+        }
+
+    def bounce(self, index, count, rng):
+        """Return an unsaved Bounce"""
+        fields = self.common('bounce', index, count, rng)
+        (bounce_type, subtype, status, diagnostic,
+         category) = self.bounces.choose(rng)
+        return Bounce(
+            feedback_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            feedback_timestamp=fields['created_at'],
+            hard=bounce_type == 'Permanent',
+            bounce_type=bounce_type,
+            bounce_subtype=subtype,
+            reporting_mta='dns; a8-70.smtp-out.amazonses.com',
+            action='failed',
+            status=status,
+            diagnostic_code=diagnostic,
+            category=category,
+            **fields)
+
+    def complaint(self, index, count, rng):
+        """Return an unsaved Complaint"""
+        fields = self.common('complaint', index, count, rng)
+        return Complaint(
+            feedback_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            feedback_timestamp=fields['created_at'],
+            useragent='Bouncy Seed Feedback Loop (V0.01)',
+            feedback_type=self.complaints.choose(rng),
+            arrival_date=fields['created_at'],
+            **fields)
+
+    def delivery(self, index, count, rng):
+        """Return an unsaved Delivery"""
+        fields = self.common('delivery', index, count, rng)
+        # Most deliveries take under a second, with a long tail of retries
+        processing_time = min(
+            int(rng.lognormvariate(6.5, 1.2)), 24 * 60 * 60 * 1000)
+        return Delivery(
+            delivered_time=fields['mail_timestamp'] + datetime.timedelta(
+                milliseconds=processing_time),
+            processing_time=processing_time,
+            smtp_response='250 2.0.0 OK {0}'.format(rng.getrandbits(32)),
+            **fields)
+
+    def build(self, kind, count):
+        """Yield count unsaved instances of a kind of feedback, oldest first"""
+        make = getattr(self, kind)
+        rng = self.rng(kind)
+        for index in range(count):
+            yield make(index, count, rng)
+
+    def create(self, kind, count, batch_size=5000, using=None,
+               progress=None):
+        """
+        Store count rows of a kind of feedback and return the number stored
+
+        Rows are saved with bulk_insert, which uses COPY on PostgreSQL, one
+        transaction per batch of batch_size rows. Each row goes to the
+        database the router chooses for it unless using is given. progress
+        is called with the number of rows stored after each batch.
+        """
+        # pylint: disable=too-many-arguments
+        model = MODELS[kind]
+        rows = self.build(kind, count)
+        total = 0
+        with keep_timestamps(model):
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    return total
+
+                databases = {}
+                for instance in batch:
+                    alias = using or router.db_for_write(
+                        model, instance=instance)
+                    databases.setdefault(alias, []).append(instance)
+                for alias, instances in databases.items():
+                    bulk_insert(
+                        model, instances, using=alias, batch_size=batch_size)
+                total += len(batch)
+                if progress is not None:
+                    progress(total)
@@ -0,0 +1,134 @@
+"""Change feed of stored feedback for downstream consumers"""
+import base64
+import binascii
+import datetime
+import json
+import time
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from django_bouncy.conf import get_config
+from django_bouncy.models import Bounce, Complaint, Delivery
+from django_bouncy.queries import scatter
+from django_bouncy.routers import model_databases, replica_for
+
+FEED_TYPES = ['bounce', 'complaint', 'delivery']
+
+FEED_MODELS = {
+    'bounce': Bounce,
+    'complaint': Complaint,
+    'delivery': Delivery,
+}
+
+
+def encode_cursor(position):
+    """Return the opaque cursor for a feed position"""
+    return base64.urlsafe_b64encode(
+        json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Return the feed position for a cursor
+
+    A position is [created_at, type, shard, id], the order records are read
+    in. Raises ValueError if the cursor is not one returned by the feed.
+    """
+    try:
+        created_at, kind, shard, pk = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        created_at = parse_datetime(created_at)
+        if created_at is None or kind not in FEED_MODELS:
+            raise ValueError
+        return created_at, kind, int(shard), int(pk)
+    except (binascii.Error, TypeError, ValueError, UnicodeError):
+        raise ValueError('Bad Cursor')
+
+
+def _after(queryset, key, position):
+    """Filter a queryset of one type and shard to records after position"""
+    created_at, kind, shard, pk = position
+    cursor_key = (FEED_TYPES.index(kind), shard)
+    if key > cursor_key:
+        return queryset.filter(created_at__gte=created_at)
+    if key == cursor_key:
+        return queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+    return queryset.filter(created_at__gt=created_at)
+
+
+def serialize(kind, record):
+    """Return a JSON-ready dict of a feedback record"""
+    # pylint: disable=protected-access
+    data = dict(
+        (field.attname, getattr(record, field.attname))
+        for field in record._meta.concrete_fields)
+    data['type'] = kind
+    return data
+
+
+def read_feed(cursor=None, types=None, topics=None, limit=100):
+    """
+    Return up to limit feedback records stored after cursor, and a new cursor
+
+    Records are read in (created_at, id) order over an index, without
+    OFFSET, so reading is equally fast however far along the feed a consumer
+    is. types and topics optionally narrow the feed to some feedback types
+    and SNS topics. Records newer than BOUNCY_FEED_DELAY seconds are held
+    back so rows still being committed are not skipped. When there are no
+    new records, the cursor passed in is returned.
+    """
+    # pylint: disable=too-many-locals
+    position = decode_cursor(cursor) if cursor else None
+    config = get_config()
+    settled = timezone.now() - datetime.timedelta(seconds=config.feed_delay)
+
+    calls = []
+    for kind in types or FEED_TYPES:
+        if kind not in FEED_MODELS:
+            raise ValueError('Unknown Type')
+        model = FEED_MODELS[kind]
+        aliases = model_databases(model) or (DEFAULT_DB_ALIAS,)
+        for shard, alias in enumerate(aliases):
+            queryset = model.objects.using(replica_for(alias)).filter(
+                created_at__lt=settled)
+            if topics:
+                queryset = queryset.filter(sns_topic__in=topics)
+            if position is not None:
+                queryset = _after(
+                    queryset, (FEED_TYPES.index(kind), shard), position)
+            queryset = queryset.order_by('created_at', 'pk')[:limit]
+            calls.append((alias, lambda queryset=queryset, kind=kind,
+                          shard=shard: [
+                              (record.created_at, FEED_TYPES.index(kind),
+                               shard, record.pk, kind, record)
+                              for record in queryset]))
+
+    rows = sorted(
+        (row for rows in scatter(calls) for row in rows),
+        key=lambda row: row[:4])[:limit]
+    if not rows:
+        return [], cursor
+
+    created_at, _, shard, pk, kind, _ = rows[-1]
+    next_cursor = encode_cursor([created_at.isoformat(), kind, shard, pk])
+    return [serialize(row[4], row[5]) for row in rows], next_cursor
+
+
+def wait_for_feed(wait, cursor=None, types=None, topics=None, limit=100):
+    """
+    Read the feed, waiting up to wait seconds for new records to arrive
+
+    Returns as soon as there are records, like read_feed.
+    """
+    # pylint: disable=too-many-arguments
+    deadline = time.time() + wait
+    while True:
+        records, next_cursor = read_feed(cursor, types, topics, limit)
+        remaining = deadline - time.time()
+        if records or not remaining > 0:
+            return records, next_cursor
+        time.sleep(min(get_config().feed_poll_interval, remaining))
@@ -0,0 +1,121 @@
+"""Mergeable histograms of delivery latency"""
+import collections
+import hashlib
+import math
+
+from django.db import router
+from django.db.models import Sum
+
+from django_bouncy.models import DeliveryLatency, increment
+from django_bouncy.routers import read_database
+from django_bouncy.stats import period_start
+
+# Each bin is this much wider than the last, so any latency is reported
+# within 5% of its true value
+GROWTH = 1.1
+PERCENTILES = (50, 95, 99)
+
+
+def bin_for(value):
+    """Return the bin a latency in milliseconds falls in"""
+    if value < 1:
+        return 0
+    return 1 + int(math.floor(math.log(value) / math.log(GROWTH)))
+
+
+def bin_value(index):
+    """Return the latency in milliseconds that represents a bin"""
+    if index <= 0:
+        return 0.0
+    # The geometric middle of the bin
+    return GROWTH ** (index - 0.5)
+
+
+class Histogram(object):
+    """
+    A latency histogram with a fixed set of logarithmic bins
+
+    Histograms from any number of hours, senders or topics are merged by
+    adding the counts of each bin, and percentiles are read from the bins, so
+    the cost of a percentile depends on the number of bins rather than the
+    number of deliveries.
+    """
+    def __init__(self, bins=None):
+        self.bins = collections.Counter(bins or {})
+
+    @property
+    def count(self):
+        """The number of latencies in the histogram"""
+        return sum(self.bins.values())
+
+    def add(self, value, count=1):
+        """Add a latency in milliseconds"""
+        self.bins[bin_for(value)] += count
+
+    def merge(self, other):
+        """Add the counts of another histogram to this one"""
+        self.bins.update(other.bins)
+
+    def percentile(self, percent):
+        """Return the latency below which percent of the latencies fall"""
+        total = self.count
+        if not total:
+            return None
+        rank = max(1, int(math.ceil(total * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= rank:
+                return bin_value(index)
+        return bin_value(max(self.bins))
+
+
+def latency_key(sender, topic):
+    """Return the key identifying a sender and topic"""
+    return hashlib.md5(
+        u'\n'.join([sender, topic]).encode('utf-8')).hexdigest()
+
+
+def record_latencies(deliveries):
+    """Add the processing time of newly stored deliveries to the histograms"""
+    counts = collections.Counter(
+        (period_start(delivery.created_at, 'hour'), delivery.mail_from or '',
+         delivery.sns_topic or '', bin_for(delivery.processing_time or 0))
+        for delivery in deliveries)
+    alias = router.db_for_write(DeliveryLatency)
+    for (bucket, sender, topic, index), count in counts.items():
+        increment(
+            DeliveryLatency, alias, count, bucket=bucket,
+            key=latency_key(sender, topic), bin=index, sender=sender,
+            topic=topic)
+
+
+def latency_histogram(start=None, end=None, sender=None, topic=None):
+    """
+    Return the merged Histogram of the deliveries in a range of hours
+
+    The bins are summed by the database, so only one row per bin is read
+    however long the range is. sender and topic optionally narrow the
+    histogram to one sender or SNS topic.
+    """
+    queryset = DeliveryLatency.objects.using(read_database(DeliveryLatency))
+    if start is not None:
+        queryset = queryset.filter(bucket__gte=period_start(start, 'hour'))
+    if end is not None:
+        queryset = queryset.filter(bucket__lte=end)
+    if sender is not None:
+        queryset = queryset.filter(sender=sender)
+    if topic is not None:
+        queryset = queryset.filter(topic=topic)
+    return Histogram(dict(queryset.values_list('bin').annotate(
+        total=Sum('count')).order_by()))
+
+
+def latency_percentiles(start=None, end=None, sender=None, topic=None,
+                        percentiles=PERCENTILES):
+    """Return the count and chosen percentiles of delivery latency in ms"""
+    histogram = latency_histogram(start, end, sender, topic)
+    result = {'count': histogram.count}
+    for percent in percentiles:
+        result['p{0}'.format(percent)] = histogram.percentile(percent)
+    return result
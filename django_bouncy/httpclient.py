@@ -0,0 +1,207 @@
+"""Pooled, keep-alive HTTP client for the requests django_bouncy makes"""
+import logging
+import random
+import ssl
+import threading
+import time
+
+from django.utils.module_loading import import_string
+from six.moves import http_client
+from six.moves.urllib.parse import urlparse
+
+from django_bouncy.conf import get_config
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_config = None
+
+
+class HTTPClientError(Exception):
+    """Raised when a request could not be completed after every retry"""
+
+
+class Response(object):
+    """The status, headers and body of a completed request"""
+    # pylint: disable=too-few-public-methods
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = dict(headers or {})
+
+    def read(self):
+        """Return the body, like the response from urlopen"""
+        return self.body
+
+
+def default_transport(scheme, netloc, timeout, ssl_context=None):
+    """Return a new httplib connection to a host"""
+    if scheme == 'https':
+        return http_client.HTTPSConnection(
+            netloc, timeout=timeout, context=ssl_context)
+    return http_client.HTTPConnection(netloc, timeout=timeout)
+
+
+class HTTPClient(object):
+    """
+    Make HTTP requests over pooled, kept-alive connections
+
+    Up to max_connections idle connections are kept for each host, so
+    repeated requests to a host skip the TCP and TLS handshakes, and every
+    HTTPS connection shares one SSL context. At most max_concurrency
+    requests run at once across all threads. Connection errors and 5xx
+    responses are retried up to retries times, after a backoff that doubles
+    each time and is jittered so that many processes don't retry together.
+
+    transport is called as transport(scheme, netloc, timeout, ssl_context)
+    and must return an object with the httplib connection interface, which
+    lets tests substitute a stub.
+    """
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(self, timeout=10, max_connections=4, max_concurrency=10,
+                 retries=2, backoff=0.5, transport=None):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport or default_transport
+        self.ssl_context = ssl.create_default_context()
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _connect(self, scheme, netloc):
+        """Return a new connection to a host"""
+        return self.transport(scheme, netloc, self.timeout, self.ssl_context)
+
+    def _checkout(self, scheme, netloc):
+        """Return an idle connection to a host, or None if there is none"""
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        return None
+
+    def _checkin(self, scheme, netloc, connection):
+        """Return a connection to the pool, or close it if the pool is full"""
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _attempt(self, method, url, body, headers):
+        """
+        Make one attempt at a request
+
+        The server may have closed an idle connection since it was pooled,
+        so a request that fails on a reused connection is sent again at
+        once on a new connection, without counting as a retry.
+        """
+        connection = self._checkout(url.scheme, url.netloc)
+        if connection is not None:
+            try:
+                return self._send(connection, method, url, body, headers)
+            except (http_client.HTTPException, EnvironmentError) as error:
+                logger.debug(
+                    'Reconnecting to %s after a stale connection failed: %s',
+                    url.netloc, error)
+        return self._send(
+            self._connect(url.scheme, url.netloc), method, url, body,
+            headers)
+
+    def _send(self, connection, method, url, body, headers):
+        """Send a request on a connection and pool it again afterwards"""
+        # pylint: disable=too-many-arguments
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            result = Response(
+                response.status, response.read(), response.getheaders())
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(url.scheme, url.netloc, connection)
+        return result
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Make a request and return its Response
+
+        Raises HTTPClientError if no response was received after retrying.
+        A 5xx response that is still failing after retrying is returned.
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise HTTPClientError('Unsupported URL {0}'.format(url))
+
+        attempt = 0
+        while True:
+            with self._slots:
+                try:
+                    response = self._attempt(
+                        method, parsed, body, dict(headers or {}))
+                    error = None
+                except (http_client.HTTPException, EnvironmentError) as exc:
+                    response, error = None, exc
+
+            if error is None and response.status < 500:
+                return response
+            if attempt >= self.retries:
+                if error is not None:
+                    raise HTTPClientError(str(error))
+                return response
+
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(
+                'Retrying %s %s in %.2fs: %s', method, url, delay,
+                error or response.status)
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, headers=None):
+        """Make a GET request"""
+        return self.request('GET', url, headers=headers)
+
+    def post(self, url, body, headers=None):
+        """Make a POST request"""
+        return self.request('POST', url, body, headers)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def get_client():
+    """
+    Return the HTTPClient for this process
+
+    The client is rebuilt from the BOUNCY_HTTP_* settings when they change.
+    """
+    # pylint: disable=global-statement
+    global _client, _client_config
+    config = get_config()
+    if config is not _client_config:
+        if _client is not None:
+            _client.close()
+        transport = config.http_transport
+        _client = HTTPClient(
+            timeout=config.http_timeout,
+            max_connections=config.http_max_connections,
+            max_concurrency=config.http_max_concurrency,
+            retries=config.http_retries,
+            backoff=config.http_backoff,
+            transport=import_string(transport) if transport else None)
+        _client_config = config
+    return _client
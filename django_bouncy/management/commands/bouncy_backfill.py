@@ -0,0 +1,73 @@
+"""Run a chunked backfill over the django_bouncy tables"""
+from django.core.management.base import BaseCommand, CommandError
+
+from django_bouncy.backfill import (
+    BACKFILLS, COUNTERS, backfill, counted_since, databases_for)
+from django_bouncy.utils import clean_time
+
+
+class Command(BaseCommand):
+    """Fill in data for existing rows a small chunk at a time"""
+    help = (
+        'Run a backfill over the existing rows of the Django Bouncy tables, '
+        'one short transaction per chunk, so it can run while feedback is '
+        'being stored. bounce-category can be run any number of times. '
+        'delivery-latency and feedback-stats add to the pre-aggregated '
+        'counts, so run them once. They only count rows created before '
+        '--end, which defaults to when migration 0014 started counting '
+        'feedback as it was stored.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'name', choices=sorted(BACKFILLS), help='Backfill to run')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000, dest='chunk_size',
+            help='Rows updated in each transaction')
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='Seconds to sleep between chunks')
+        parser.add_argument(
+            '--database', action='append', default=None, dest='databases',
+            help='Database to backfill. Default: every database in use')
+        parser.add_argument(
+            '--start', type=int, default=None,
+            help='Resume after this primary key')
+        parser.add_argument(
+            '--end', type=clean_time, default=None,
+            help='Only backfill rows created before this time. Default for '
+                 'delivery-latency and feedback-stats: when they started '
+                 'being counted live')
+
+    def handle(self, *args, **options):
+        steps = BACKFILLS[options['name']]
+        if options['start'] is not None and len(steps) > 1:
+            raise CommandError('--start Needs A Backfill Of One Table')
+
+        end = options['end']
+        if end is None and options['name'] in COUNTERS:
+            # Rows created since were counted as they were stored
+            end = counted_since(options['name'])
+        if end is not None:
+            self.stdout.write(
+                'Backfilling Rows Created Before {0}'.format(end))
+
+        for model, func in steps:
+            for alias in options['databases'] or databases_for(model):
+                queryset = model.objects.using(alias)
+                if end is not None:
+                    queryset = queryset.filter(created_at__lt=end)
+
+                def progress(total, last, model=model, alias=alias):
+                    """Report the progress of the backfill"""
+                    self.stdout.write(
+                        '{0} {1}: {2} Row(s), Last Key {3}'.format(
+                            model.__name__, alias, total, last))
+
+                total, last = backfill(
+                    queryset, func,
+                    chunk_size=options['chunk_size'], pause=options['pause'],
+                    start=options['start'], progress=progress)
+                self.stdout.write(
+                    'Backfilled {0} {1} Row(s) On {2} (Last Key {3})'.format(
+                        total, model.__name__, alias, last))
@@ -0,0 +1,171 @@
+"""Benchmark the django_bouncy ingestion pipeline"""
+import json
+import platform
+import random
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from django_bouncy import simulator, utils, views
+from django_bouncy.metrics import clock
+from django_bouncy.routers import APP_LABEL
+
+KINDS = ['bounce', 'complaint', 'delivery']
+
+ROUTER = 'django_bouncy.routers.BouncyRouter'
+
+PROCESSORS = {
+    'bounce': views.process_bounce,
+    'complaint': views.process_complaint,
+    'delivery': views.process_delivery,
+}
+
+
+class Command(BaseCommand):
+    """Benchmark the endpoint and its helpers with signed notifications"""
+    help = (
+        'Measure the throughput and latency of the endpoint, '
+        'verify_notification, clean_time and the process_* functions using '
+        'synthetic signed notifications. All rows written are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipients', default='1,10,100,1000',
+            help='Comma separated recipient counts to benchmark')
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Number of calls to time for each case')
+        parser.add_argument(
+            '--database', default='default',
+            help='Database alias to benchmark against')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed used to generate notifications')
+        parser.add_argument(
+            '--label', default='',
+            help='Label stored with the results, such as a version number')
+        parser.add_argument(
+            '--output', default=None,
+            help='File to write the JSON results to')
+
+    def handle(self, *args, **options):
+        recipient_counts = [
+            int(count) for count in options['recipients'].split(',')]
+        iterations = options['iterations']
+        rng = random.Random(options['seed'])
+        key, pemfile = simulator.generate_certificate()
+
+        alias = options['database']
+        results = []
+        with simulator.CertificateServer(pemfile) as server:
+            with override_settings(
+                    BOUNCY_CERT_DOMAIN_REGEX=server.domain_regex,
+                    BOUNCY_TOPIC_ARN=[simulator.DEFAULT_TOPIC_ARN],
+                    BOUNCY_VERIFY_CERTIFICATE=True,
+                    **routed_to(alias)):
+                with transaction.atomic(using=alias):
+                    results += self.run_cases(
+                        server, key, rng, recipient_counts, iterations)
+                    transaction.set_rollback(True, using=alias)
+
+        report = {
+            'label': options['label'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections[alias].vendor,
+            'iterations': iterations,
+            'results': results,
+        }
+        for result in results:
+            self.stdout.write(
+                '{name:<22} {kind:<10} {recipients:>5} recipients  '
+                '{rps:>10.1f}/s  p50 {p50_ms:>8.3f}ms  '
+                'p99 {p99_ms:>8.3f}ms'.format(**result))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+    def run_cases(self, server, key, rng, recipient_counts, iterations):
+        """Time every function for each kind and recipient count"""
+        # pylint: disable=too-many-arguments
+        factory = RequestFactory()
+        results = [_measure(
+            'clean_time', None, 1,
+            [simulator.timestamp()] * iterations, utils.clean_time)]
+
+        for kind in KINDS:
+            for recipients in recipient_counts:
+                notifications = [
+                    simulator.build_notification(
+                        simulator.build_message(kind, recipients, rng),
+                        key, server.url)
+                    for _ in range(iterations)]
+
+                results.append(_measure(
+                    'verify_notification', kind, recipients, notifications,
+                    utils.verify_notification))
+
+                results.append(_measure(
+                    'process_' + kind, kind, recipients, notifications,
+                    lambda item, kind=kind: PROCESSORS[kind](
+                        json.loads(item['Message']), item)))
+
+                requests = []
+                for notification in notifications:
+                    request = factory.post(
+                        '/', json.dumps(notification),
+                        content_type='text/plain',
+                        HTTP_X_AMZ_SNS_TOPIC_ARN=notification['TopicArn'])
+                    requests.append(request)
+                results.append(_measure(
+                    'endpoint', kind, recipients, requests, views.endpoint))
+        return results
+
+
+def routed_to(alias):
+    """
+    Return the settings that read and write every django_bouncy model on alias
+
+    The endpoint and process_* functions write through the router, so the
+    benchmark only measures, and rolls back, the chosen database when the
+    router sends everything there.
+    """
+    routers = list(settings.DATABASE_ROUTERS)
+    if ROUTER not in routers:
+        routers.insert(0, ROUTER)
+    return {
+        'DATABASE_ROUTERS': routers,
+        'BOUNCY_DATABASES': dict(
+            (model.__name__, alias)
+            for model in apps.get_app_config(APP_LABEL).get_models()),
+        'BOUNCY_READ_DATABASES': {},
+    }
+
+
+def _measure(name, kind, recipients, items, func):
+    """Call func once per item and summarize the latencies"""
+    # pylint: disable=too-many-arguments
+    latencies = []
+    for item in items:
+        start = clock()
+        func(item)
+        latencies.append(clock() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'name': name,
+        'kind': kind or '-',
+        'recipients': recipients,
+        'calls': len(latencies),
+        'rps': len(latencies) / total if total else 0.0,
+        'p50_ms': simulator.percentile(latencies, 50) * 1000,
+        'p99_ms': simulator.percentile(latencies, 99) * 1000,
+    }
@@ -0,0 +1,146 @@
+"""Generate signed SNS load against a running django_bouncy endpoint"""
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_bouncy import simulator
+from django_bouncy.archive import iter_archive, segment_paths
+
+
+def parse_mix(value):
+    """Parse a mix like 'bounce=2,delivery=8' into a list of (kind, weight)"""
+    mix = []
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        mix.append((kind.strip(), float(weight or 1)))
+    return mix
+
+
+def choose(rng, mix):
+    """Choose a kind from a weighted mix"""
+    point = rng.uniform(0, sum(weight for _, weight in mix))
+    for kind, weight in mix:
+        point -= weight
+        if point <= 0:
+            return kind
+    return mix[-1][0]
+
+
+class Command(BaseCommand):
+    """Fire signed notifications at an endpoint and report on the results"""
+    help = (
+        'Send signed SNS notifications to a Django Bouncy endpoint at a '
+        'configurable rate and report throughput, errors and latency. The '
+        'endpoint must set BOUNCY_CERT_DOMAIN_REGEX to the value printed at '
+        'startup and list the topic in BOUNCY_TOPIC_ARN.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL of the endpoint to test')
+        parser.add_argument(
+            '--count', type=int, default=1000,
+            help='Number of notifications to send')
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Notifications started per second. 0 for no limit')
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help='Number of concurrent connections')
+        parser.add_argument(
+            '--mix', default='bounce=1,complaint=1,delivery=8',
+            help='Weighted mix of notification kinds')
+        parser.add_argument(
+            '--recipients', default='1',
+            help='Comma separated recipient counts to choose from')
+        parser.add_argument(
+            '--archive', default=None,
+            help='Re-sign and send notifications from an archive instead')
+        parser.add_argument(
+            '--retries', type=int, default=3,
+            help='Retries after a non-2xx response, like SNS')
+        parser.add_argument(
+            '--retry-delay', type=float, default=20.0, dest='retry_delay',
+            help='Seconds between retries')
+        parser.add_argument(
+            '--timeout', type=float, default=15.0,
+            help='Seconds to wait for each response')
+        parser.add_argument(
+            '--topic-arn', default=simulator.DEFAULT_TOPIC_ARN,
+            dest='topic_arn', help='TopicArn to send notifications from')
+        parser.add_argument(
+            '--cert-host', default='127.0.0.1', dest='cert_host',
+            help='Address the certificate server listens on')
+        parser.add_argument(
+            '--cert-port', type=int, default=0, dest='cert_port',
+            help='Port the certificate server listens on')
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Random seed used to generate notifications')
+        parser.add_argument(
+            '--output', default=None,
+            help='File to write the JSON report to')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        key, pemfile = simulator.generate_certificate()
+
+        with simulator.CertificateServer(
+                pemfile, options['cert_host'],
+                options['cert_port']) as server:
+            self.stdout.write(
+                'Serving certificate at {0}\n'
+                'Endpoint must set BOUNCY_CERT_DOMAIN_REGEX = {1!r}'.format(
+                    server.url, server.domain_regex))
+
+            notifications = self.build_notifications(
+                options, rng, key, server.url)
+            report = simulator.LoadGenerator(
+                options['url'], notifications,
+                concurrency=options['concurrency'], rate=options['rate'],
+                retries=options['retries'],
+                retry_delay=options['retry_delay'],
+                timeout=options['timeout']).run()
+
+        self.stdout.write(
+            'Notifications: {notifications}  Attempts: {attempts}  '
+            'Delivered: {delivered}  Failed: {failed}\n'
+            'Throughput: {throughput:.1f}/s  '
+            'Amplification: {amplification:.2f}x\n'
+            'Statuses: {statuses}'.format(**report))
+        if report['p50_ms'] is not None:
+            self.stdout.write(
+                'Latency: p50 {p50_ms:.1f}ms  p90 {p90_ms:.1f}ms  '
+                'p99 {p99_ms:.1f}ms'.format(**report))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+    @staticmethod
+    def build_notifications(options, rng, key, cert_url):
+        """Return the signed notifications to send"""
+        if options['archive']:
+            notifications = []
+            for notification in iter_archive(
+                    segment_paths(options['archive'])):
+                if len(notifications) >= options['count']:
+                    break
+                notification['SigningCertURL'] = cert_url
+                notification['TopicArn'] = options['topic_arn']
+                notifications.append(
+                    simulator.sign_notification(notification, key))
+            return notifications
+
+        try:
+            mix = parse_mix(options['mix'])
+            recipients = [
+                int(count) for count in options['recipients'].split(',')]
+            return [
+                simulator.build_notification(
+                    simulator.build_message(
+                        choose(rng, mix), rng.choice(recipients), rng),
+                    key, cert_url, options['topic_arn'])
+                for _ in range(options['count'])]
+        except ValueError as error:
+            raise CommandError(str(error))
@@ -0,0 +1,57 @@
+"""Relay outbox events from django_bouncy to another system"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from django_bouncy.conf import get_config
+from django_bouncy.outbox import OutboxRelay, get_sink
+
+
+class Command(BaseCommand):
+    """Deliver the events in the outbox to the configured sink"""
+    help = (
+        'Deliver feedback events written to the outbox while BOUNCY_OUTBOX '
+        'is set to the sink named by BOUNCY_OUTBOX_SINK, retrying failures '
+        'with backoff and moving events that keep failing to DeadLetter'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sink', default=None,
+            help='Dotted path of the sink class. Default: BOUNCY_OUTBOX_SINK')
+        parser.add_argument(
+            '--batch-size', type=int, default=None, dest='batch_size',
+            help='Events sent to the sink at once')
+        parser.add_argument(
+            '--database', action='append', default=None, dest='databases',
+            help='Database to relay from. Default: every feedback database')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument(
+            '--once', action='store_true', default=False,
+            help='Relay until the outbox is empty, then exit')
+
+    def handle(self, *args, **options):
+        if options['sink']:
+            sink = import_string(options['sink'])(
+                **get_config().outbox_sink_options)
+        else:
+            sink = get_sink()
+        relay = OutboxRelay(sink, batch_size=options['batch_size'])
+
+        total = 0
+        try:
+            while True:
+                handled = relay.relay(options['databases'])
+                total += handled
+                if not handled:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.close()
+        self.stdout.write('Relayed {0} Outbox Event(s)'.format(total))
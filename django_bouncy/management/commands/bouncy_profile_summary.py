@@ -0,0 +1,46 @@
+"""Summarize the profiles sampled from the django_bouncy endpoint"""
+import pstats
+
+import six
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_bouncy.profiling import profile_paths
+
+
+class Command(BaseCommand):
+    """Merge sampled endpoint profiles and print the top functions"""
+    help = (
+        'Merge the profiles saved by BOUNCY_PROFILE_SAMPLE_RATE and print '
+        'the functions the endpoint spends the most time in'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', nargs='?', default=None,
+            help='Directory of .pstats files. Default: BOUNCY_PROFILE_DIR')
+        parser.add_argument(
+            '--limit', type=int, default=25,
+            help='Number of functions to print')
+        parser.add_argument(
+            '--sort', default='cumulative',
+            help='pstats sort key, such as cumulative, tottime or calls')
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or getattr(
+            settings, 'BOUNCY_PROFILE_DIR', None)
+        if not directory:
+            raise CommandError('No Profile Directory Given')
+
+        paths = profile_paths(directory)
+        if not paths:
+            raise CommandError('No Profiles Found In {0}'.format(directory))
+
+        output = six.StringIO()
+        stats = pstats.Stats(*paths, stream=output)
+        stats.strip_dirs()
+        stats.sort_stats(options['sort'])
+        stats.print_stats(options['limit'])
+
+        self.stdout.write('Merged {0} Profile(s)'.format(len(paths)))
+        self.stdout.write(output.getvalue())
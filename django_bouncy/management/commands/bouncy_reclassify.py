@@ -0,0 +1,31 @@
+"""Classify the stored bounces of django_bouncy again"""
+from django.core.management.base import BaseCommand
+
+from django_bouncy.classifier import reclassify
+
+
+class Command(BaseCommand):
+    """Update the category of every stored bounce"""
+    help = (
+        'Classify the status and diagnostic code of every stored bounce with '
+        'BOUNCY_CLASSIFIER_RULES and store the category of each bounce whose '
+        'category has changed. Run it after changing the rules.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500, dest='chunk_size',
+            help='Bounces read, classified and updated at once')
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Worker processes to classify with. Default: one per CPU')
+        parser.add_argument(
+            '--database', action='append', default=None, dest='databases',
+            help='Database to reclassify. Default: every bounce database')
+
+    def handle(self, *args, **options):
+        checked, changed = reclassify(
+            options['databases'], chunk_size=options['chunk_size'],
+            processes=options['processes'])
+        self.stdout.write(
+            'Reclassified {0} Of {1} Bounce(s)'.format(changed, checked))
@@ -0,0 +1,60 @@
+"""Replay archived SNS notifications through django_bouncy"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_bouncy.archive import (
+    find_notification, iter_archive, segment_paths
+)
+from django_bouncy.views import process_message
+
+
+class Command(BaseCommand):
+    """Replay notifications stored by the notification archive"""
+    help = (
+        'Process notifications stored in archive segments again, as if they '
+        'had just been delivered by SNS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help='Archive directories or segment files to replay')
+        parser.add_argument(
+            '--message-id', dest='message_id', default=None,
+            help='Only replay the notification with this MessageId')
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Count the notifications without processing them')
+
+    def handle(self, *args, **options):
+        if options['message_id']:
+            notifications = [
+                find_notification(path, options['message_id'])
+                for path in options['paths']
+            ]
+            notifications = [item for item in notifications if item]
+            if not notifications:
+                raise CommandError(
+                    'Notification {0} Not Found'.format(options['message_id']))
+        else:
+            paths = []
+            for path in options['paths']:
+                paths += segment_paths(path)
+            notifications = iter_archive(paths)
+
+        replayed = 0
+        for notification in notifications:
+            if notification.get('Type') != 'Notification':
+                continue
+            replayed += 1
+            if options['dry_run']:
+                continue
+
+            try:
+                message = json.loads(notification['Message'])
+            except ValueError:
+                continue
+            process_message(message, notification)
+
+        self.stdout.write('Replayed {0} Notification(s)'.format(replayed))
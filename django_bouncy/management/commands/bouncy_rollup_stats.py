@@ -0,0 +1,16 @@
+"""Downsample the hourly feedback stats of django_bouncy into daily stats"""
+from django.core.management.base import BaseCommand
+
+from django_bouncy.stats import rollup
+
+
+class Command(BaseCommand):
+    """Roll the hourly feedback stats of finished days up into daily stats"""
+    help = (
+        'Derive daily feedback stats from the hourly stats of every finished '
+        'day, then delete hourly stats older than '
+        'BOUNCY_STATS_HOURLY_RETENTION days. Run it at least daily.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rolled Up {0} Day(s)'.format(rollup()))
@@ -0,0 +1,59 @@
+"""Fill the django_bouncy tables with realistic synthetic feedback"""
+from django.core.management.base import BaseCommand
+
+from django_bouncy.factories import KINDS, FeedbackFactory
+from django_bouncy.metrics import clock
+
+FLAGS = {
+    'bounce': '--bounces', 'complaint': '--complaints',
+    'delivery': '--deliveries',
+}
+
+
+class Command(BaseCommand):
+    """Store generated bounces, complaints and deliveries in bulk"""
+    help = (
+        'Store large numbers of generated bounces, complaints and deliveries '
+        'for measuring the admin, queries and migrations. The same --seed '
+        'always generates the same rows, with times relative to now. The '
+        'pre-aggregated stats are not updated; run bouncy_backfill '
+        'feedback-stats and delivery-latency afterwards if they are needed.'
+    )
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(
+                FLAGS[kind], type=int, default=0, dest=kind,
+                help='Number of {0} rows to store'.format(kind))
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed for the random number generators')
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Spread the feedback over this many days before now')
+        parser.add_argument(
+            '--addresses', type=int, default=100000,
+            help='Number of distinct recipient addresses to draw from')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, dest='batch_size',
+            help='Rows stored in each transaction')
+        parser.add_argument(
+            '--database', default=None,
+            help='Database to store the rows in. Default: the router decides')
+
+    def handle(self, *args, **options):
+        factory = FeedbackFactory(
+            seed=options['seed'], days=options['days'],
+            addresses=options['addresses'])
+        for kind in KINDS:
+            if not options[kind]:
+                continue
+            start = clock()
+            total = factory.create(
+                kind, options[kind], batch_size=options['batch_size'],
+                using=options['database'])
+            elapsed = clock() - start
+            self.stdout.write(
+                'Stored {0} {1} Row(s) In {2:.1f}s ({3:.0f} Rows/s)'.format(
+                    total, kind.capitalize(), elapsed,
+                    total / elapsed if elapsed else 0))
@@ -0,0 +1,21 @@
+"""Apply the soft bounce rules of django_bouncy to stored bounces"""
+from django.core.management.base import BaseCommand
+
+from django_bouncy.escalation import reevaluate
+
+
+class Command(BaseCommand):
+    """Re-evaluate BOUNCY_SOFT_BOUNCE_RULES against every soft bounce"""
+    help = (
+        'Rebuild the soft bounce counters from the Bounce table and apply '
+        'BOUNCY_SOFT_BOUNCE_RULES to the whole history, suppressing the '
+        'addresses the rules now catch and lifting suppressions they no '
+        'longer earn. Run it after changing the rules, and regularly to '
+        'drop counters older than the longest rule window.'
+    )
+
+    def handle(self, *args, **options):
+        results = reevaluate()
+        self.stdout.write(
+            'Evaluated {evaluated} Address(es): {suppressed} Suppressed, '
+            '{released} Released'.format(**results))
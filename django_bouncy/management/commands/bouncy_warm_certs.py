@@ -0,0 +1,37 @@
+"""Fetch and cache the SNS signing certificates ahead of notifications"""
+from django.core.management.base import BaseCommand, CommandError
+
+from django_bouncy.apps import known_cert_urls
+from django_bouncy.utils import warm_certificates
+
+
+class Command(BaseCommand):
+    """Warm the signing certificate cache"""
+    help = (
+        'Fetch, validate and cache SNS signing certificates so the first '
+        'notification from each region does not wait for one. Warms the '
+        'URLs given, or those in BOUNCY_CERT_URLS and the notification '
+        'archive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*',
+            help='Certificate URLs to warm. Default: the known URLs')
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Number of certificates fetched at once')
+
+    def handle(self, *args, **options):
+        cert_urls = set(options['urls']) or known_cert_urls()
+        if not cert_urls:
+            raise CommandError('No Certificate URLs Known')
+
+        failures = warm_certificates(cert_urls, options['concurrency'])
+        for cert_url in sorted(cert_urls):
+            self.stdout.write('{0} {1}'.format(
+                failures.get(cert_url, 'OK'), cert_url))
+
+        if failures:
+            raise CommandError('{0} Of {1} Certificate(s) Failed'.format(
+                len(failures), len(cert_urls)))
@@ -0,0 +1,128 @@
+"""Metrics backends for the django_bouncy app"""
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+from django_bouncy.conf import get_config
+
+# time.monotonic is not available on Python 2
+clock = getattr(time, 'monotonic', time.time)
+
+
+class Timer(object):
+    """Context manager that reports the time spent in its block"""
+    def __init__(self, backend, name, labels):
+        self.backend = backend
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.backend.observe(self.name, clock() - self.start, **self.labels)
+
+
+class NullTimer(object):
+    """Context manager used when metrics are disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class MetricsBackend(object):
+    """
+    Base metrics backend, which discards everything it is sent
+
+    Subclasses should override ``increment`` and ``observe``. ``render``
+    should return the collected metrics in the Prometheus text format, or
+    None if the backend cannot be rendered.
+    """
+    enabled = False
+
+    def increment(self, name, value=1, **labels):
+        """Add value to the counter called name"""
+        pass
+
+    def observe(self, name, value, **labels):
+        """Record a single observation, such as a duration in seconds"""
+        pass
+
+    def timer(self, name, **labels):
+        """Return a context manager that observes the time taken"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        return None
+
+
+class InMemoryMetrics(MetricsBackend):
+    """
+    Metrics backend that keeps counters and summaries in process memory
+
+    Each process keeps its own metrics, so a scraper will see the metrics of
+    whichever worker answered the request.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.counters = {}
+        self.summaries = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total = self.summaries.get(key, (0, 0))
+            self.summaries[key] = (count + 1, total + value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append('{0}{1} {2}'.format(
+                    name, _format_labels(labels), value))
+            for (name, labels), summary in sorted(self.summaries.items()):
+                lines.append('{0}_count{1} {2}'.format(
+                    name, _format_labels(labels), summary[0]))
+                lines.append('{0}_sum{1} {2!r}'.format(
+                    name, _format_labels(labels), float(summary[1])))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    """Format a tuple of label pairs the way Prometheus expects"""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{0}="{1}"'.format(key, str(value).replace('"', '\\"'))
+        for key, value in labels) + '}'
+
+
+def get_metrics():
+    """
+    Return the metrics backend configured by BOUNCY_METRICS_BACKEND
+
+    The backend is created once per process, and again if the settings
+    change. By default all metrics are discarded.
+    """
+    config = get_config()
+    if config.metrics is None:
+        config.metrics = import_string(config.metrics_backend)()
+    return config.metrics
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-19 02:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from django_bouncy.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # The indexes are built without blocking writes on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('django_bouncy', '0006_index_address'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='bounce',
+            index=models.Index(
+                fields=['created_at', 'id'], name='bouncy_bounce_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='complaint',
+            index=models.Index(
+                fields=['created_at', 'id'], name='bouncy_complaint_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(
+                fields=['created_at', 'id'], name='bouncy_delivery_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-19 02:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_bouncy', '0009_soft_bounces'),
+    ]
+
+    operations = [
+        # Adding the column without a default doesn't fill in or lock the
+        # existing rows. The default is only used by Django, so it is only
+        # added to the state. The index is built by 0013.
+        migrations.AddField(
+            model_name='bounce',
+            name='category',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='bounce',
+                name='category',
+                field=models.CharField(blank=True, default='', max_length=50, null=True),
+            ),
+        ]),
+    ]
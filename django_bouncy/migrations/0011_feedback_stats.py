@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-19 02:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_bouncy', '0010_bounce_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('kind', models.CharField(max_length=20)),
+                ('feedback_type', models.CharField(blank=True, max_length=150)),
+                ('sender', models.CharField(blank=True, max_length=254)),
+                ('topic', models.CharField(blank=True, max_length=350)),
+                ('key', models.CharField(max_length=32)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'feedback stats',
+                'unique_together': {('resolution', 'bucket', 'key')},
+            },
+        ),
+    ]
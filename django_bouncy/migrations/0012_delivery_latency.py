@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-19 02:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_bouncy', '0011_feedback_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryLatency',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('sender', models.CharField(blank=True, max_length=254)),
+                ('topic', models.CharField(blank=True, max_length=350)),
+                ('key', models.CharField(max_length=32)),
+                ('bin', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'delivery latencies',
+                'unique_together': {('bucket', 'key', 'bin')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-19 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from django_bouncy.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # The index is built without blocking writes on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('django_bouncy', '0012_delivery_latency'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='bounce',
+            index=models.Index(
+                fields=['category'], name='bouncy_bounce_category_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-19 03:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models, router
+from django.utils import timezone
+
+# The backfills whose counters are incremented as feedback is stored, with
+# the model holding the counters
+COUNTERS = (
+    ('delivery-latency', 'DeliveryLatency'),
+    ('feedback-stats', 'FeedbackStat'),
+)
+
+
+def record_start(apps, schema_editor):
+    """
+    Record that the feedback stats and latency histograms count from now
+
+    Feedback stored from now on is counted as it arrives, so bouncy_backfill
+    only counts the rows created before this. Counters written before this
+    migration ran move the start back to their earliest bucket.
+    """
+    model = apps.get_model('django_bouncy', 'CounterStart')
+    alias = schema_editor.connection.alias
+    if not router.allow_migrate_model(alias, model):
+        return
+    now = timezone.now()
+    for counters, name in COUNTERS:
+        counter_model = apps.get_model('django_bouncy', name)
+        first = counter_model.objects.using(
+            router.db_for_write(counter_model)).aggregate(
+                first=models.Min('bucket'))['first']
+        model.objects.using(alias).get_or_create(
+            counters=counters, defaults={
+                'started_at': min(now, first) if first else now})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_bouncy', '0013_bounce_category_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterStart',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counters', models.CharField(max_length=50, unique=True)),
+                ('started_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(record_start, migrations.RunPython.noop),
+    ]
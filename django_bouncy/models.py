@@ -1,9 +1,142 @@
 """Models for the django_bouncy app"""
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 
+from django_bouncy.conf import get_config
+from django_bouncy.routers import (
+    model_databases, normalize_address, recently_written, replica_for,
+    shard_for)
+
+
+def _closing_connections(func):
+    """Wrap func to close the calling thread's connections afterwards"""
+    def run(*args):
+        """Call func, then close this thread's connections"""
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+    return run
+
+
+def increment(model, using, count, **lookup):
+    """
+    Add count to the count field of the row matching lookup
+
+    The row is created if it doesn't exist yet, so lookup must match a
+    unique constraint of the model.
+    """
+    queryset = model.objects.using(using).filter(**lookup)
+    if queryset.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic(using=using):
+            model(count=count, **lookup).save(force_insert=True, using=using)
+    except IntegrityError:
+        # Another process created the row first
+        queryset.update(count=F('count') + count)
+
+
+class FeedbackQuerySet(models.QuerySet):
+    """QuerySet for feedback with lookups for many addresses at once"""
+    def _chunks(self, addresses, chunk_size):
+        """Split addresses into chunks the database will accept"""
+        addresses = list(set(addresses))
+        if chunk_size is None:
+            chunk_size = get_config().query_chunk_size
+            # SQLite limits the number of parameters in a query
+            limit = connections[self.db].features.max_query_params
+            if limit:
+                chunk_size = min(chunk_size, limit - 99)
+        return [
+            addresses[start:start + chunk_size]
+            for start in range(0, len(addresses), chunk_size)]
+
+    def _shards(self, addresses):
+        """
+        Return a list of (queryset, addresses) to look up the addresses with
+
+        A sharded model's records for an address are all on the shard its
+        address hashes to, so unless a database was chosen with using(),
+        each address is looked up there. Reads go to the shard's replica
+        unless the address was written to recently, as in address_history.
+        """
+        addresses = set(addresses)
+        if self._db is not None or len(model_databases(self.model)) < 2:
+            return [(self, addresses)]
+
+        fresh = recently_written(addresses)
+        by_alias = {}
+        for address in addresses:
+            alias = shard_for(self.model, address)
+            if normalize_address(address) not in fresh:
+                alias = replica_for(alias)
+            by_alias.setdefault(alias, set()).add(address)
+        return [(self.using(alias), shard_addresses)
+                for alias, shard_addresses in by_alias.items()]
+
+    def _map_chunks(self, func, addresses, chunk_size, pool):
+        """Call func with each queryset and chunk and merge the dicts"""
+        calls = [
+            (queryset, chunk)
+            for queryset, shard_addresses in self._shards(addresses)
+            for chunk in queryset._chunks(shard_addresses, chunk_size)]
+        if pool is None or len(calls) < 2:
+            results = [func(*call) for call in calls]
+        else:
+            results = pool.map(
+                _closing_connections(lambda call: func(*call)), calls)
+
+        merged = {}
+        for result in results:
+            merged.update(result)
+        return merged
+
+    def latest_for(self, addresses, chunk_size=None, pool=None):
+        """
+        Return a dict of each address to its most recently stored record
+
+        Addresses with no records are left out. The addresses are looked up
+        on the shard that holds them, in chunks sized for the database, which
+        run on pool (such as a multiprocessing.pool.ThreadPool) if one is
+        given.
+        """
+        def latest(shard, chunk):
+            """Return the latest records for a chunk of addresses"""
+            queryset = shard.filter(address__in=chunk)
+            if connections[shard.db].features.can_distinct_on_fields:
+                records = queryset.order_by(
+                    'address', '-pk').distinct('address')
+            else:
+                records = shard.filter(pk__in=queryset.order_by().values(
+                    'address').annotate(
+                        latest=models.Max('pk')).values('latest'))
+            return dict((record.address, record) for record in records)
+
+        return self._map_chunks(latest, addresses, chunk_size, pool)
+
+    def counts_for(self, addresses, since=None, chunk_size=None, pool=None):
+        """
+        Return a dict of each address to its number of records
+
+        Only records created at or after since are counted, if it is given.
+        Addresses with no records are left out. Chunks are split and run as
+        in latest_for.
+        """
+        def counts(shard, chunk):
+            """Return the counts for a chunk of addresses"""
+            queryset = shard.filter(address__in=chunk)
+            if since is not None:
+                queryset = queryset.filter(created_at__gte=since)
+            return dict(queryset.order_by().values_list('address').annotate(
+                count=models.Count('pk')))
+
+        return self._map_chunks(counts, addresses, chunk_size, pool)
+
 
 class Feedback(models.Model):
     """An abstract model for all SES Feedback Reports"""
@@ -20,11 +153,28 @@ class Feedback(models.Model):
     feedback_timestamp = models.DateTimeField(
         verbose_name="Feedback Time", null=True, blank=True)
 
+    objects = FeedbackQuerySet.as_manager()
+
     class Meta(object):
         """Meta info for Feedback Abstract Model"""
         abstract = True
 
 
+def feedback_indexes(prefix):
+    """
+    Return the indexes of a Feedback model, named with a prefix
+
+    They are added with AddIndexConcurrently, and index names must be unique
+    across every model, so each model declares its own.
+    """
+    return [
+        models.Index(fields=['address'], name=prefix + '_address_idx'),
+        # Keyset pagination for the change feed
+        models.Index(
+            fields=['created_at', 'id'], name=prefix + '_created_idx'),
+    ]
+
+
 @python_2_unicode_compatible
 class Bounce(Feedback):
     """A bounce report for an individual email address"""
@@ -41,12 +191,23 @@ class Bounce(Feedback):
     status = models.CharField(
         db_index=True, null=True, blank=True, max_length=150)
     diagnostic_code = models.TextField(null=True, blank=True, max_length=5000)
+    # Null for bounces stored before categories were added, until they are
+    # backfilled
+    category = models.CharField(
+        blank=True, null=True, default='', max_length=50)
 
     def __str__(self):
         """Unicode representation of Bounce"""
         return "%s %s Bounce (message from %s)" % (
             self.address, self.bounce_type, self.mail_from)
 
+    class Meta(Feedback.Meta):
+        """Meta info for the Bounce model"""
+        indexes = feedback_indexes('bouncy_bounce') + [
+            models.Index(
+                fields=['category'], name='bouncy_bounce_category_idx'),
+        ]
+
 
 @python_2_unicode_compatible
 class Complaint(Feedback):
@@ -63,6 +224,10 @@ class Complaint(Feedback):
         return "%s Complaint (email sender: from %s)" % (
             self.address, self.mail_from)
 
+    class Meta(Feedback.Meta):
+        """Meta info for the Complaint model"""
+        indexes = feedback_indexes('bouncy_complaint')
+
 
 @python_2_unicode_compatible
 class Delivery(Feedback):
@@ -76,6 +241,152 @@ class Delivery(Feedback):
         return "%s Delivery (email sender: from %s)" % (
             self.address, self.mail_from)
 
-    class Meta(object):
+    class Meta(Feedback.Meta):
         """Meta info for the Delivery model"""
+        indexes = feedback_indexes('bouncy_delivery')
         verbose_name_plural = 'deliveries'
+
+
+@python_2_unicode_compatible
+class OutboxEvent(models.Model):
+    """A feedback event waiting to be relayed to other systems"""
+    created_at = models.DateTimeField(auto_now_add=True)
+    kind = models.CharField(max_length=50)
+    payload = models.TextField()
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        """Unicode representation of OutboxEvent"""
+        return "%s Event %s (%s attempts)" % (
+            self.kind, self.pk, self.attempts)
+
+    class Meta(object):
+        """Meta info for the OutboxEvent model"""
+        index_together = [('next_attempt_at', 'id')]
+
+
+@python_2_unicode_compatible
+class DeadLetter(models.Model):
+    """An outbox event that could not be relayed"""
+    created_at = models.DateTimeField(auto_now_add=True)
+    queued_at = models.DateTimeField()
+    kind = models.CharField(max_length=50)
+    payload = models.TextField()
+    attempts = models.IntegerField()
+    error = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        """Unicode representation of DeadLetter"""
+        return "%s Event Failed After %s Attempts" % (
+            self.kind, self.attempts)
+
+
+@python_2_unicode_compatible
+class SoftBounceCounter(models.Model):
+    """The number of soft bounces for an address in one slice of time"""
+    address = models.EmailField()
+    subtype = models.CharField(max_length=50)
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        """Unicode representation of SoftBounceCounter"""
+        return "%s %s Soft Bounce(s) from %s" % (
+            self.address, self.count, self.bucket)
+
+    class Meta(object):
+        """Meta info for the SoftBounceCounter model"""
+        unique_together = [('address', 'subtype', 'bucket')]
+
+
+class SuppressionQuerySet(models.QuerySet):
+    """QuerySet for suppressions"""
+    def active(self, now=None):
+        """Return the suppressions that have not expired"""
+        return self.filter(
+            models.Q(expires_at__isnull=True) |
+            models.Q(expires_at__gt=now or timezone.now()))
+
+
+@python_2_unicode_compatible
+class Suppression(models.Model):
+    """An address that should not be sent to, until expires_at if set"""
+    created_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+    address = models.EmailField(unique=True)
+    rule = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = SuppressionQuerySet.as_manager()
+
+    def __str__(self):
+        """Unicode representation of Suppression"""
+        return "%s Suppressed (%s)" % (self.address, self.rule or 'manual')
+
+    def is_active(self, now=None):
+        """Return True if the suppression has not expired"""
+        return self.expires_at is None or self.expires_at > (
+            now or timezone.now())
+
+
+@python_2_unicode_compatible
+class FeedbackStat(models.Model):
+    """The number of feedback records with the same details in an hour or day"""
+    RESOLUTIONS = (('hour', 'Hour'), ('day', 'Day'))
+
+    resolution = models.CharField(max_length=10, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()
+    kind = models.CharField(max_length=20)
+    feedback_type = models.CharField(max_length=150, blank=True)
+    sender = models.CharField(max_length=254, blank=True)
+    topic = models.CharField(max_length=350, blank=True)
+    # A digest of kind, feedback_type, sender and topic
+    key = models.CharField(max_length=32)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        """Unicode representation of FeedbackStat"""
+        return "%s %s(s) in the %s from %s" % (
+            self.count, self.kind, self.resolution, self.bucket)
+
+    class Meta(object):
+        """Meta info for the FeedbackStat model"""
+        unique_together = [('resolution', 'bucket', 'key')]
+        verbose_name_plural = 'feedback stats'
+
+
+@python_2_unicode_compatible
+class DeliveryLatency(models.Model):
+    """The number of deliveries in one latency bin of a histogram"""
+    bucket = models.DateTimeField()
+    sender = models.CharField(max_length=254, blank=True)
+    topic = models.CharField(max_length=350, blank=True)
+    # A digest of sender and topic
+    key = models.CharField(max_length=32)
+    bin = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        """Unicode representation of DeliveryLatency"""
+        return "%s Deliveries in Bin %s from %s" % (
+            self.count, self.bin, self.bucket)
+
+    class Meta(object):
+        """Meta info for the DeliveryLatency model"""
+        unique_together = [('bucket', 'key', 'bin')]
+        verbose_name_plural = 'delivery latencies'
+
+
+@python_2_unicode_compatible
+class CounterStart(models.Model):
+    """When feedback started being counted into a set of counters"""
+    # The name of the backfill that fills in the counters, such as
+    # feedback-stats
+    counters = models.CharField(max_length=50, unique=True)
+    started_at = models.DateTimeField()
+
+    def __str__(self):
+        """Unicode representation of CounterStart"""
+        return "%s counted since %s" % (self.counters, self.started_at)
@@ -0,0 +1,151 @@
+"""
+Migration operations that are safe to run on large tables
+
+On PostgreSQL these avoid holding locks that block writes for longer than
+a moment. Other databases fall back to the plain operation, or skip the
+step when they have no equivalent.
+"""
+from django.db import migrations
+from django.db.migrations.operations.base import Operation
+
+
+def _is_postgresql(schema_editor):
+    """Return True if the schema editor is for PostgreSQL"""
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    Add an index without blocking writes to the table on PostgreSQL
+
+    PostgreSQL can't build an index concurrently inside a transaction, so
+    migrations using this operation must set ``atomic = False``. An invalid
+    index left behind by a failed build is dropped before trying again.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _is_postgresql(schema_editor):
+            return super(AddIndexConcurrently, self).database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+        if schema_editor.atomic_migration:
+            raise ValueError(
+                'AddIndexConcurrently Requires A Migration With atomic = False')
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_index JOIN pg_class '
+                'ON pg_class.oid = pg_index.indexrelid '
+                'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid',
+                [self.index.name])
+            invalid = cursor.fetchone() is not None
+        if invalid:
+            schema_editor.execute('DROP INDEX CONCURRENTLY {0}'.format(
+                schema_editor.quote_name(self.index.name)))
+        schema_editor.execute(str(
+            self.index.create_sql(model, schema_editor)).replace(
+                'CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _is_postgresql(schema_editor):
+            return super(AddIndexConcurrently, self).database_backwards(
+                app_label, schema_editor, from_state, to_state)
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {0}'.format(
+            schema_editor.quote_name(self.index.name)))
+
+    def describe(self):
+        return 'Concurrently create index {0} on {1}'.format(
+            self.index.name, self.model_name)
+
+
+class AddCheckNotValid(Operation):
+    """
+    Add a CHECK constraint that is only enforced for new and changed rows
+
+    On PostgreSQL the constraint is added with NOT VALID, which takes a
+    brief lock and doesn't scan the table. Existing rows are checked later
+    by ValidateConstraint, which doesn't block writes. check is the SQL
+    condition, such as ``"category" IS NOT NULL``. Other databases skip
+    this step.
+    """
+    reversible = True
+    reduces_to_sql = True
+
+    def __init__(self, model_name, name, check):
+        self.model_name = model_name
+        self.name = name
+        self.check = check
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if (not _is_postgresql(schema_editor) or not
+                self.allow_migrate_model(schema_editor.connection.alias, model)):
+            return
+        schema_editor.execute(
+            'ALTER TABLE {0} ADD CONSTRAINT {1} CHECK ({2}) NOT VALID'.format(
+                schema_editor.quote_name(model._meta.db_table),
+                schema_editor.quote_name(self.name), self.check))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if (not _is_postgresql(schema_editor) or not
+                self.allow_migrate_model(schema_editor.connection.alias, model)):
+            return
+        schema_editor.execute(
+            'ALTER TABLE {0} DROP CONSTRAINT IF EXISTS {1}'.format(
+                schema_editor.quote_name(model._meta.db_table),
+                schema_editor.quote_name(self.name)))
+
+    def describe(self):
+        return 'Add unvalidated check {0} on {1}'.format(
+            self.name, self.model_name)
+
+
+class ValidateConstraint(Operation):
+    """
+    Check the existing rows against a constraint added with AddCheckNotValid
+
+    On PostgreSQL validation scans the table while still allowing reads and
+    writes. Run it in its own migration, after any backfill the constraint
+    depends on. Other databases skip this step.
+    """
+    reversible = True
+    reduces_to_sql = True
+
+    def __init__(self, model_name, name):
+        self.model_name = model_name
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if (not _is_postgresql(schema_editor) or not
+                self.allow_migrate_model(schema_editor.connection.alias, model)):
+            return
+        schema_editor.execute('ALTER TABLE {0} VALIDATE CONSTRAINT {1}'.format(
+            schema_editor.quote_name(model._meta.db_table),
+            schema_editor.quote_name(self.name)))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        # An unvalidated constraint is still enforced on new rows, so there
+        # is nothing to undo
+        pass
+
+    def describe(self):
+        return 'Validate constraint {0} on {1}'.format(
+            self.name, self.model_name)
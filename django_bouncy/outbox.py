@@ -0,0 +1,144 @@
+"""Transactional outbox for relaying feedback to other systems"""
+import datetime
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_bouncy.conf import get_config
+from django_bouncy.feed import serialize
+from django_bouncy.metrics import get_metrics
+from django_bouncy.models import DeadLetter, OutboxEvent
+from django_bouncy.routers import all_databases
+from django_bouncy.sinks import SinkError
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_events(instances, using=DEFAULT_DB_ALIAS):
+    """
+    Add an outbox event for each new feedback record
+
+    Call this inside the transaction that inserts the records, so the events
+    are stored if and only if the records are.
+    """
+    OutboxEvent.objects.using(using).bulk_create([
+        OutboxEvent(
+            kind=instance._meta.model_name,
+            payload=json.dumps(
+                serialize(instance._meta.model_name, instance),
+                cls=DjangoJSONEncoder))
+        for instance in instances])
+
+
+def get_sink():
+    """Return the sink named by BOUNCY_OUTBOX_SINK"""
+    config = get_config()
+    return import_string(config.outbox_sink)(**config.outbox_sink_options)
+
+
+def outbox_databases():
+    """Return every database that may hold outbox events"""
+    return sorted(all_databases() | set([DEFAULT_DB_ALIAS]))
+
+
+class OutboxRelay(object):
+    """
+    Deliver outbox events to a sink in batches
+
+    Delivered events are deleted a batch at a time. When the sink fails, the
+    batch is retried with exponential backoff, and events that fail
+    max_attempts times are moved to the DeadLetter table. A batch is claimed
+    for claim_timeout seconds before it is sent, and is due again after
+    that if the relay stops before finishing it.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, sink, batch_size=None, max_attempts=None,
+                 backoff=None, max_backoff=None, claim_timeout=None):
+        config = get_config()
+        self.sink = sink
+        self.batch_size = batch_size or config.outbox_batch_size
+        self.max_attempts = max_attempts or config.outbox_max_attempts
+        self.backoff = config.outbox_backoff if backoff is None else backoff
+        self.max_backoff = max_backoff or config.outbox_max_backoff
+        self.claim_timeout = claim_timeout or config.outbox_claim_timeout
+
+    def claim(self, now, using):
+        """
+        Return a batch of due events, claimed so no other relay sends them
+
+        The claim is committed straight away, so no locks are held while the
+        batch is sent.
+        """
+        with transaction.atomic(using=using):
+            queryset = OutboxEvent.objects.using(using).filter(
+                next_attempt_at__lte=now).order_by('next_attempt_at', 'pk')
+            # Let several relays share the outbox without sending an event
+            # twice, where the database can
+            if connections[using].features.has_select_for_update_skip_locked:
+                queryset = queryset.select_for_update(skip_locked=True)
+            events = list(queryset[:self.batch_size])
+            if events:
+                OutboxEvent.objects.using(using).filter(
+                    pk__in=[event.pk for event in events]).update(
+                        next_attempt_at=now + datetime.timedelta(
+                            seconds=self.claim_timeout))
+        return events
+
+    def relay_batch(self, using=DEFAULT_DB_ALIAS):
+        """Relay one batch of due events and return how many were handled"""
+        now = timezone.now()
+        events = self.claim(now, using)
+        if not events:
+            return 0
+
+        metrics = get_metrics()
+        try:
+            self.sink.send([json.loads(event.payload) for event in events])
+        except SinkError as error:
+            logger.warning('Outbox Sink Failed: %s', error)
+            metrics.increment('bouncy_outbox_failed_total', len(events))
+            with transaction.atomic(using=using):
+                self.fail(events, str(error), now, using)
+        else:
+            OutboxEvent.objects.using(using).filter(
+                pk__in=[event.pk for event in events]).delete()
+            metrics.increment('bouncy_outbox_delivered_total', len(events))
+        return len(events)
+
+    def fail(self, events, error, now, using):
+        """Schedule failed events to be retried, or give up on them"""
+        dead = []
+        for event in events:
+            event.attempts += 1
+            event.last_error = error
+            if event.attempts >= self.max_attempts:
+                dead.append(event)
+                continue
+            delay = min(
+                self.backoff * 2 ** (event.attempts - 1), self.max_backoff)
+            event.next_attempt_at = now + datetime.timedelta(seconds=delay)
+            event.save(
+                using=using,
+                update_fields=['attempts', 'last_error', 'next_attempt_at'])
+
+        if dead:
+            DeadLetter.objects.using(using).bulk_create([
+                DeadLetter(
+                    queued_at=event.created_at, kind=event.kind,
+                    payload=event.payload, attempts=event.attempts,
+                    error=error)
+                for event in dead])
+            OutboxEvent.objects.using(using).filter(
+                pk__in=[event.pk for event in dead]).delete()
+            get_metrics().increment('bouncy_outbox_dead_total', len(dead))
+            logger.error('%s Outbox Event(s) Moved To DeadLetter', len(dead))
+
+    def relay(self, databases=None):
+        """Relay one batch from each database and return the events handled"""
+        return sum(
+            self.relay_batch(using)
+            for using in databases or outbox_databases())
@@ -0,0 +1,73 @@
+"""Sampling profiler for the django_bouncy app"""
+import cProfile
+import functools
+import glob
+import logging
+import os
+import random
+import time
+
+from django_bouncy.conf import get_config
+
+PROFILE_SUFFIX = '.pstats'
+
+logger = logging.getLogger(__name__)
+
+
+def profile_paths(directory):
+    """Return the profiles saved in directory, oldest first"""
+    paths = glob.glob(os.path.join(directory, '*' + PROFILE_SUFFIX))
+    return sorted(paths, key=os.path.getmtime)
+
+
+def prune_profiles(directory, max_bytes):
+    """Delete the oldest profiles until directory is under max_bytes"""
+    paths = profile_paths(directory)
+    total = sum(os.path.getsize(path) for path in paths)
+    while paths and total > max_bytes:
+        path = paths.pop(0)
+        total -= os.path.getsize(path)
+        os.remove(path)
+
+
+def save_profile(profiler, directory):
+    """Write the stats collected by profiler to a new file in directory"""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, 'bouncy-{0}-{1}-{2:08x}{3}'.format(
+        time.strftime('%Y%m%dT%H%M%S'), os.getpid(),
+        random.getrandbits(32), PROFILE_SUFFIX))
+    profiler.dump_stats(path)
+    prune_profiles(directory, get_config().profile_max_bytes)
+    return path
+
+
+def profiled(view):
+    """
+    Decorator that profiles a random sample of calls to a view
+
+    A BOUNCY_PROFILE_SAMPLE_RATE fraction of calls are run under cProfile and
+    their stats saved to BOUNCY_PROFILE_DIR. All other calls go straight to
+    the view.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        """Run the view, profiling it if this call is sampled"""
+        config = get_config()
+        rate = config.profile_sample_rate
+        if not rate or random.random() >= rate:
+            return view(request, *args, **kwargs)
+
+        directory = config.profile_dir
+        if not directory:
+            return view(request, *args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(view, request, *args, **kwargs)
+        finally:
+            try:
+                save_profile(profiler, directory)
+            except (IOError, OSError):
+                logger.exception('Unable To Save Profile')
+    return wrapper
@@ -0,0 +1,116 @@
+"""Queries that follow the django_bouncy database routing"""
+from multiprocessing.pool import ThreadPool
+
+from django.db import connections
+
+from django_bouncy.conf import get_config
+from django_bouncy.models import Bounce, Complaint, Delivery, Suppression
+from django_bouncy.routers import (
+    model_databases, normalize_address, primary_for, recently_written,
+    replica_for, shard_for
+)
+
+FEEDBACK_MODELS = (Bounce, Complaint, Delivery)
+
+
+def _run(call):
+    """Run one scattered call, then close this thread's connections"""
+    _, func = call
+    try:
+        return func()
+    finally:
+        connections.close_all()
+
+
+def scatter(calls):
+    """
+    Run a list of (alias, func) calls and return their results in order
+
+    Calls against different databases run in parallel threads, each with its
+    own connections. When every call uses the same database they run one
+    after another in this thread, inside any transaction it has open.
+    """
+    if len(set(alias for alias, _ in calls)) < 2:
+        return [func() for _, func in calls]
+
+    pool = ThreadPool(min(len(calls), get_config().scatter_threads))
+    try:
+        return pool.map(_run, calls)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def address_history(address, models=FEEDBACK_MODELS):
+    """
+    Return every feedback record for an address, newest first
+
+    Records are matched on the address as given or its normalized form,
+    like suppressed, so the lookup can use the address index. Each model is
+    read from the shard that holds the address, on a replica unless the
+    address was written to recently.
+    """
+    fresh = bool(recently_written([address]))
+    forms = set([address, normalize_address(address)])
+    calls = []
+    for model in models:
+        alias = shard_for(model, address)
+        if not fresh:
+            alias = replica_for(alias)
+        calls.append((alias, lambda model=model, alias=alias: list(
+            model.objects.using(alias).filter(address__in=forms))))
+
+    history = [record for records in scatter(calls) for record in records]
+    history.sort(key=lambda record: record.created_at, reverse=True)
+    return history
+
+
+def suppressed(addresses):
+    """
+    Return the normalized addresses that should not be sent to again
+
+    An address is suppressed once it has a hard bounce or a complaint, or
+    while it has an active Suppression, such as one made by
+    BOUNCY_SOFT_BOUNCE_RULES. The addresses are grouped by shard, and every
+    shard is queried in parallel. Replicas are used except for addresses
+    written to recently.
+    """
+    fresh = recently_written(addresses)
+    by_shard = {}
+    for address in addresses:
+        for model in (Bounce, Complaint, Suppression):
+            alias = shard_for(model, address)
+            if normalize_address(address) not in fresh:
+                alias = replica_for(alias)
+            by_shard.setdefault((model, alias), set()).update(
+                [address, normalize_address(address)])
+
+    calls = []
+    for (model, alias), group in by_shard.items():
+        queryset = model.objects.using(alias).filter(address__in=group)
+        if model is Bounce:
+            queryset = queryset.filter(hard=True)
+        elif model is Suppression:
+            queryset = queryset.active()
+        calls.append((alias, lambda queryset=queryset: list(
+            queryset.values_list('address', flat=True).distinct())))
+
+    return set(
+        normalize_address(address)
+        for found in scatter(calls) for address in found)
+
+
+def for_each_shard(model, func):
+    """
+    Call func with a queryset for each database a model is stored in
+
+    Returns the results in the order of the model's aliases, so counts and
+    other aggregates can be combined by the caller. Each database is read
+    from its replica, if it has one.
+    """
+    aliases = [
+        replica_for(alias) for alias in
+        model_databases(model) or (primary_for(model.objects.db),)]
+    return scatter([
+        (alias, lambda alias=alias: func(model.objects.using(alias)))
+        for alias in aliases])
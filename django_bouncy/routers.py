@@ -0,0 +1,187 @@
+"""Database routing for the django_bouncy app"""
+import hashlib
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from django_bouncy.conf import get_config
+
+APP_LABEL = 'django_bouncy'
+
+# Written in the same transaction as feedback, so needed on every database
+# that feedback is stored in
+SHARED_MODELS = frozenset(['outboxevent', 'deadletter'])
+
+
+def normalize_address(address):
+    """Return the form of an address used to choose its shard"""
+    return address.strip().lower()
+
+
+def model_databases(model):
+    """
+    Return the database aliases a django_bouncy model is stored in
+
+    Returns an empty tuple if BOUNCY_DATABASES doesn't mention the model.
+    """
+    return get_config().databases.get(model._meta.model_name, ())
+
+
+def shard_for(model, address):
+    """Return the database alias that holds a model's rows for an address"""
+    aliases = model_databases(model)
+    if not aliases:
+        return DEFAULT_DB_ALIAS
+    if len(aliases) == 1:
+        return aliases[0]
+
+    # Python's hash() changes between processes, so use a stable digest
+    digest = hashlib.md5(
+        normalize_address(address).encode('utf-8')).hexdigest()
+    return aliases[int(digest[:8], 16) % len(aliases)]
+
+
+def replica_for(alias):
+    """Return the alias to read data written to a database from"""
+    return get_config().read_databases.get(alias, alias)
+
+
+def primary_for(alias):
+    """Return the alias of the database a read alias replicates"""
+    for primary, replica in get_config().read_databases.items():
+        if replica == alias:
+            return primary
+    return alias
+
+
+def _written_key(address):
+    """Return the cache key marking an address as recently written"""
+    return 'bouncy-written-' + hashlib.md5(
+        normalize_address(address).encode('utf-8')).hexdigest()
+
+
+def record_writes(addresses):
+    """
+    Remember that feedback was just written for these addresses
+
+    Reads about them go to the primary database for
+    BOUNCY_READ_YOUR_WRITES seconds, so they see the new rows even if the
+    replicas are behind.
+    """
+    config = get_config()
+    if not config.read_databases or not config.read_your_writes:
+        return
+    caches[config.recent_writes_cache].set_many(
+        dict((_written_key(address), True) for address in addresses),
+        config.read_your_writes)
+
+
+def recently_written(addresses):
+    """Return the normalized addresses that were written to recently"""
+    config = get_config()
+    if not config.read_databases or not config.read_your_writes:
+        return set()
+    keys = dict((_written_key(address), address) for address in addresses)
+    found = caches[config.recent_writes_cache].get_many(list(keys))
+    return set(normalize_address(keys[key]) for key in found)
+
+
+def read_database(model, address=None):
+    """
+    Return the alias to read a model's rows from
+
+    Given an address, reads go to the shard holding it, and to the primary
+    rather than a replica if the address was written to recently.
+    """
+    if address is None:
+        return replica_for((model_databases(model) or (DEFAULT_DB_ALIAS,))[0])
+    alias = shard_for(model, address)
+    if recently_written([address]):
+        return alias
+    return replica_for(alias)
+
+
+def all_databases():
+    """Return every database alias used by django_bouncy models"""
+    aliases = set()
+    for model_aliases in get_config().databases.values():
+        aliases.update(model_aliases)
+    return aliases
+
+
+class BouncyRouter(object):
+    """
+    Route django_bouncy models to the databases named in BOUNCY_DATABASES
+
+    Models given one alias are read from and written to it. Models given a
+    list of aliases are sharded by the hash of the normalized address, which
+    needs an instance to route on. Queries that aren't about one instance
+    go to the first alias in the list, so reads across every shard should use
+    the helpers in django_bouncy.queries or name a database with using().
+    Other apps are left to the default database and are never migrated onto
+    an alias that only django_bouncy uses.
+
+    Reads go to the replica named for each database in
+    BOUNCY_READ_DATABASES, except reads of an instance whose address was
+    written to recently.
+    """
+    # pylint: disable=protected-access,unused-argument
+    def db_for_read(self, model, **hints):
+        """Return the database to read a model from"""
+        if model._meta.app_label != APP_LABEL:
+            return None
+        alias = self._route(model, hints)
+        instance = hints.get('instance')
+        if (instance is not None and getattr(instance, 'address', None) and
+                recently_written([instance.address])):
+            return alias or DEFAULT_DB_ALIAS
+        replica = replica_for(alias or DEFAULT_DB_ALIAS)
+        if alias is None and replica == DEFAULT_DB_ALIAS:
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        """Return the database to write a model to"""
+        alias = self._route(model, hints)
+        instance = hints.get('instance')
+        if (alias is None and model._meta.app_label == APP_LABEL and
+                instance is not None and instance._state.db):
+            # Never write an instance back to the replica it was read from
+            primary = primary_for(instance._state.db)
+            if primary != instance._state.db:
+                return primary
+        return alias
+
+    @staticmethod
+    def _route(model, hints):
+        """Return the alias for a model and the instance in hints, if any"""
+        if model._meta.app_label != APP_LABEL:
+            return None
+        aliases = model_databases(model)
+        if not aliases:
+            return None
+
+        instance = hints.get('instance')
+        if instance is not None and getattr(instance, 'address', None):
+            return shard_for(model, instance.address)
+        return aliases[0]
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Leave relations to other routers"""
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Only create django_bouncy tables where they are routed"""
+        if app_label != APP_LABEL:
+            if db != DEFAULT_DB_ALIAS and db in all_databases():
+                return False
+            return None
+
+        if model_name is None:
+            return None
+        if model_name in SHARED_MODELS:
+            return db == DEFAULT_DB_ALIAS or db in all_databases()
+        aliases = get_config().databases.get(model_name)
+        if not aliases:
+            return db == DEFAULT_DB_ALIAS
+        return db in aliases
@@ -10,3 +10,6 @@ subscription = Signal(providing_args=["result", "notification"])
 
 # New bounce or complaint received
 feedback = Signal(providing_args=["instance", "message", "notification"])
+
+# An address was suppressed, or its suppression was lifted
+suppression = Signal(providing_args=["address", "suppressed", "instance"])
@@ -0,0 +1,391 @@
+"""
+Synthetic, signed SNS traffic for the django_bouncy app
+
+Used to benchmark and load test Django Bouncy with certificate verification
+turned on. Notifications are signed with a locally generated key, and the
+matching self-signed certificate is served by a local HTTP server.
+"""
+import base64
+import datetime
+import heapq
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import uuid
+
+import six
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.urllib.error import HTTPError, URLError
+from six.moves.urllib.request import Request, urlopen
+from OpenSSL import crypto
+
+from django_bouncy.metrics import clock
+from django_bouncy.utils import (
+    NOTIFICATION_HASH_FORMAT, SUBSCRIPTION_HASH_FORMAT
+)
+
+DEFAULT_TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:Bouncy_Simulator'
+
+BOUNCE_TYPES = [
+    # (bounceType, bounceSubType, status, diagnosticCode)
+    ('Permanent', 'General', '5.1.1', 'smtp; 550 5.1.1 user unknown'),
+    ('Permanent', 'NoEmail', '5.1.1', 'smtp; 550 5.1.1 mailbox unavailable'),
+    ('Permanent', 'Suppressed', '5.1.1', 'Amazon SES has suppressed sending'),
+    ('Transient', 'General', '4.0.0', 'smtp; 421 4.4.2 connection dropped'),
+    ('Transient', 'MailboxFull', '5.2.2', 'smtp; 552 5.2.2 mailbox full'),
+    ('Transient', 'ContentRejected', '5.7.1', 'smtp; 554 5.7.1 spam block'),
+]
+
+COMPLAINT_TYPES = ['abuse', 'fraud', 'not-spam', 'other', 'virus']
+
+DOMAINS = [
+    'gmail.com', 'yahoo.com', 'hotmail.com', 'aol.com', 'example.com',
+    'example.org', 'comcast.net', 'outlook.com'
+]
+
+
+def generate_certificate(bits=2048):
+    """Return a new private key and a matching self-signed PEM certificate"""
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, bits)
+
+    cert = crypto.X509()
+    cert.get_subject().CN = 'sns.local.amazonaws.com'
+    cert.set_serial_number(random.getrandbits(64))
+    cert.gmtime_adj_notBefore(0)
+    cert.gmtime_adj_notAfter(365 * 24 * 60 * 60)
+    cert.set_issuer(cert.get_subject())
+    cert.set_pubkey(key)
+    cert.sign(key, 'sha256')
+    return key, crypto.dump_certificate(crypto.FILETYPE_PEM, cert)
+
+
+class CertificateServer(object):
+    """
+    Local HTTP server that serves a certificate, standing in for SNS
+
+    Use as a context manager. While running, ``url`` is the SigningCertURL
+    to put in notifications and ``domain_regex`` is a
+    BOUNCY_CERT_DOMAIN_REGEX that accepts it.
+    """
+    path = '/SimpleNotificationService-bouncy-simulator.pem'
+
+    def __init__(self, pemfile, host='127.0.0.1', port=0):
+        self.pemfile = pemfile
+        self.requests = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Serve the certificate at CertificateServer.path"""
+            def do_GET(self):
+                """Respond to a certificate request"""
+                # pylint: disable=invalid-name
+                server.requests += 1
+                if self.path != server.path:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-pem-file')
+                self.send_header('Content-Length', str(len(server.pemfile)))
+                self.end_headers()
+                self.wfile.write(server.pemfile)
+
+            def log_message(self, *args):
+                """Don't log each request to stderr"""
+                pass
+
+        self.httpd = HTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def netloc(self):
+        """The host and port the server is listening on"""
+        return '{0}:{1}'.format(*self.httpd.server_address[:2])
+
+    @property
+    def url(self):
+        """The URL of the served certificate"""
+        return 'http://{0}{1}'.format(self.netloc, self.path)
+
+    @property
+    def domain_regex(self):
+        """A BOUNCY_CERT_DOMAIN_REGEX matching this server"""
+        return '^{0}$'.format(re.escape(self.netloc))
+
+    def start(self):
+        """Start serving in a background thread"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def timestamp(when=None):
+    """Format a datetime the way SNS and SES do"""
+    when = when or datetime.datetime.utcnow()
+    return when.strftime('%Y-%m-%dT%H:%M:%S.') + '{0:03d}Z'.format(
+        when.microsecond // 1000)
+
+
+def random_address(rng):
+    """Return a random recipient address"""
+    return 'user{0}@{1}'.format(rng.randint(1, 10 ** 7), rng.choice(DOMAINS))
+
+
+def build_message(kind, recipients=1, rng=None):
+    """
+    Return a synthetic SES message
+
+    kind is one of 'bounce', 'complaint' or 'delivery'. recipients is the
+    number of recipients the message reports on.
+    """
+    rng = rng or random
+    addresses = [random_address(rng) for _ in range(recipients)]
+    now = timestamp()
+    message = {
+        'notificationType': kind.capitalize(),
+        'mail': {
+            'timestamp': now,
+            'source': 'sender@{0}'.format(rng.choice(DOMAINS)),
+            'messageId': str(uuid.uuid4()),
+            'destination': addresses,
+        }
+    }
+
+    if kind == 'bounce':
+        bounce_type, subtype, status, diagnostic = rng.choice(BOUNCE_TYPES)
+        message['bounce'] = {
+            'bounceType': bounce_type,
+            'bounceSubType': subtype,
+            'bouncedRecipients': [{
+                'emailAddress': address,
+                'action': 'failed',
+                'status': status,
+                'diagnosticCode': diagnostic,
+            } for address in addresses],
+            'reportingMTA': 'dns; a8-70.smtp-out.amazonses.com',
+            'timestamp': now,
+            'feedbackId': str(uuid.uuid4()),
+        }
+    elif kind == 'complaint':
+        message['complaint'] = {
+            'userAgent': 'Bouncy Simulator Feedback Loop (V0.01)',
+            'complainedRecipients': [
+                {'emailAddress': address} for address in addresses],
+            'complaintFeedbackType': rng.choice(COMPLAINT_TYPES),
+            'arrivalDate': now,
+            'timestamp': now,
+            'feedbackId': str(uuid.uuid4()),
+        }
+    elif kind == 'delivery':
+        message['delivery'] = {
+            'timestamp': now,
+            'recipients': addresses,
+            'processingTimeMillis': rng.randint(200, 5000),
+            'reportingMTA': 'a8-70.smtp-out.amazonses.com',
+            'smtpResponse': '250 ok:  Message {0} accepted'.format(
+                rng.randint(1, 10 ** 8)),
+        }
+    else:
+        raise ValueError('Unknown Message Kind {0}'.format(kind))
+    return message
+
+
+def sign_notification(notification, key):
+    """Add a Signature made with key to a notification, returning it"""
+    if notification['Type'] == 'Notification':
+        hash_format = NOTIFICATION_HASH_FORMAT
+    else:
+        hash_format = SUBSCRIPTION_HASH_FORMAT
+    signature = crypto.sign(
+        key, six.b(hash_format.format(**notification)), 'sha1')
+    notification['Signature'] = base64.b64encode(signature).decode('ascii')
+    return notification
+
+
+def build_notification(message, key, cert_url, topic_arn=DEFAULT_TOPIC_ARN):
+    """Wrap a SES message in a signed SNS notification"""
+    notification = {
+        'Type': 'Notification',
+        'MessageId': str(uuid.uuid4()),
+        'TopicArn': topic_arn,
+        'Message': json.dumps(message),
+        'Timestamp': timestamp(),
+        'SignatureVersion': '1',
+        'SigningCertURL': cert_url,
+        'UnsubscribeURL': 'http://127.0.0.1/?Action=Unsubscribe',
+    }
+    return sign_notification(notification, key)
+
+
+def percentile(values, percent):
+    """Return the percent percentile of values, which must be sorted"""
+    if not values:
+        return None
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def post_notification(url, notification, timeout=15.0):
+    """
+    POST a notification to url the way SNS does
+
+    Returns the HTTP status code, or 0 if no response was received.
+    """
+    request = Request(
+        url, data=json.dumps(notification).encode('utf-8'), headers={
+            'Content-Type': 'text/plain; charset=UTF-8',
+            'x-amz-sns-message-type': notification['Type'],
+            'x-amz-sns-message-id': notification['MessageId'],
+            'x-amz-sns-topic-arn': notification['TopicArn'],
+        })
+    try:
+        response = urlopen(request, timeout=timeout)
+        response.read()
+        return response.getcode()
+    except HTTPError as error:
+        return error.code
+    except (URLError, socket.error):
+        return 0
+
+
+class LoadGenerator(object):
+    """
+    Deliver notifications to an endpoint concurrently, retrying like SNS
+
+    Notifications are started at up to ``rate`` per second (0 for no limit)
+    by ``concurrency`` worker threads. Any attempt that does not return a 2xx
+    status is retried after ``retry_delay`` seconds, up to ``retries`` times,
+    so the report shows how much redelivery an overloaded endpoint causes.
+    """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(self, url, notifications, concurrency=10, rate=0,
+                 retries=3, retry_delay=20.0, timeout=15.0,
+                 post=post_notification):
+        self.url = url
+        self.notifications = list(notifications)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.post = post
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._latencies = []
+        self._statuses = {}
+        self._attempts = 0
+        self._delivered = 0
+        self._failed = 0
+
+    def run(self):
+        """Deliver every notification and return a report dictionary"""
+        start = clock()
+        for index, notification in enumerate(self.notifications):
+            due = start + (float(index) / self.rate if self.rate else 0)
+            self._queue.append((due, next(self._sequence), notification, 0))
+        heapq.heapify(self._queue)
+        self._pending = len(self.notifications)
+
+        workers = [
+            threading.Thread(target=self._work)
+            for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return self.report(clock() - start)
+
+    def _next(self):
+        """Wait for the next attempt that is due. None when finished."""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    return None
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                wait = self._queue[0][0] - clock()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                return heapq.heappop(self._queue)
+
+    def _work(self):
+        """Worker loop run by each thread"""
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            _, _, notification, attempt = item
+
+            started = clock()
+            try:
+                status = self.post(self.url, notification, self.timeout)
+            except Exception:  # pylint: disable=broad-except
+                # A failed attempt must not stop the worker, or the run
+                # would never finish
+                status = 0
+            latency = clock() - started
+
+            with self._condition:
+                self._attempts += 1
+                self._latencies.append(latency)
+                self._statuses[status] = self._statuses.get(status, 0) + 1
+                if 200 <= status < 300:
+                    self._delivered += 1
+                    self._pending -= 1
+                elif attempt < self.retries:
+                    heapq.heappush(self._queue, (
+                        clock() + self.retry_delay, next(self._sequence),
+                        notification, attempt + 1))
+                else:
+                    self._failed += 1
+                    self._pending -= 1
+                self._condition.notify_all()
+
+    def report(self, elapsed):
+        """Summarize the run"""
+        latencies = sorted(self._latencies)
+        count = len(self.notifications)
+        return {
+            'notifications': count,
+            'attempts': self._attempts,
+            'delivered': self._delivered,
+            'failed': self._failed,
+            'statuses': dict(
+                (str(status), total)
+                for status, total in self._statuses.items()),
+            'elapsed_seconds': elapsed,
+            'throughput': self._delivered / elapsed if elapsed else 0.0,
+            'amplification': float(self._attempts) / count if count else 0.0,
+            'p50_ms': _milliseconds(percentile(latencies, 50)),
+            'p90_ms': _milliseconds(percentile(latencies, 90)),
+            'p99_ms': _milliseconds(percentile(latencies, 99)),
+        }
+
+
+def _milliseconds(seconds):
+    """Convert seconds to milliseconds, passing through None"""
+    return None if seconds is None else seconds * 1000
@@ -0,0 +1,104 @@
+"""Destinations that the outbox relay delivers feedback events to"""
+import json
+import os
+
+from six.moves import http_client
+from six.moves.urllib.parse import urlparse
+
+
+class SinkError(Exception):
+    """Raised when a sink could not accept a batch of events"""
+
+
+class Sink(object):
+    """
+    Base class for outbox sinks
+
+    send() is given a list of event dicts and must either accept all of them
+    or raise SinkError, in which case the whole batch is retried later.
+    """
+    def send(self, events):
+        """Deliver a batch of events"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the sink"""
+
+
+class WebhookSink(Sink):
+    """
+    POST each batch of events as JSON to a URL
+
+    The connection is kept open between batches, and reopened after errors.
+    Any response other than a 2xx is treated as a failure.
+    """
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = urlparse(url)
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Content-Type', 'application/json')
+        self._connection = None
+
+    def _connect(self):
+        """Return the open connection, opening it if needed"""
+        if self._connection is None:
+            if self.url.scheme == 'https':
+                connection_class = http_client.HTTPSConnection
+            else:
+                connection_class = http_client.HTTPConnection
+            self._connection = connection_class(
+                self.url.netloc, timeout=self.timeout)
+        return self._connection
+
+    def send(self, events):
+        """POST a batch of events"""
+        body = json.dumps({'events': events})
+        path = self.url.path or '/'
+        if self.url.query:
+            path += '?' + self.url.query
+        try:
+            connection = self._connect()
+            connection.request('POST', path, body, self.headers)
+            response = connection.getresponse()
+            response.read()
+        except (http_client.HTTPException, EnvironmentError) as error:
+            self.close()
+            raise SinkError(str(error))
+        if not 200 <= response.status < 300:
+            raise SinkError('Webhook Returned {0}'.format(response.status))
+
+    def close(self):
+        """Close the connection"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class FileSink(Sink):
+    """Append each event to a file as a line of JSON"""
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        """Append a batch of events and flush it to disk"""
+        try:
+            with open(self.path, 'a') as output:
+                for event in events:
+                    output.write(json.dumps(event) + '\n')
+                output.flush()
+                os.fsync(output.fileno())
+        except EnvironmentError as error:
+            raise SinkError(str(error))
+
+
+class MemorySink(Sink):
+    """Keep events in a list, for tests"""
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.events = []
+
+    def send(self, events):
+        """Store a batch of events, or fail if asked to"""
+        if self.fail:
+            raise SinkError('MemorySink Set To Fail')
+        self.events.extend(events)
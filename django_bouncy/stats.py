@@ -0,0 +1,198 @@
+"""Pre-aggregated feedback counts over time"""
+import collections
+import datetime
+import hashlib
+
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from django_bouncy.conf import get_config
+from django_bouncy.models import FeedbackStat, increment
+from django_bouncy.routers import read_database
+
+RESOLUTIONS = ('hour', 'day', 'week')
+PERIODS = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+    'week': datetime.timedelta(weeks=1),
+}
+GROUPS = {
+    'kind': ('kind',),
+    'type': ('kind', 'feedback_type'),
+    'sender': ('sender',),
+    'topic': ('topic',),
+}
+MAX_PERIODS = 2000
+
+
+def period_start(time, resolution):
+    """Return the start of the hour, day or week (from Monday) time is in"""
+    if timezone.is_aware(time):
+        time = time.astimezone(timezone.utc)
+    time = time.replace(minute=0, second=0, microsecond=0)
+    if resolution == 'hour':
+        return time
+    time = time.replace(hour=0)
+    if resolution == 'week':
+        time -= datetime.timedelta(days=time.weekday())
+    return time
+
+
+def dimensions(instance):
+    """Return the (kind, feedback_type, sender, topic) of a feedback record"""
+    kind = instance._meta.model_name
+    if kind == 'bounce':
+        feedback_type = instance.bounce_type
+    else:
+        feedback_type = getattr(instance, 'feedback_type', None)
+    return (
+        kind, feedback_type or '', instance.mail_from or '',
+        instance.sns_topic or '')
+
+
+def stat_key(dims):
+    """Return the key identifying a combination of dimensions"""
+    return hashlib.md5(u'\n'.join(dims).encode('utf-8')).hexdigest()
+
+
+def record_stats(instances):
+    """Add newly stored feedback records to the hourly stats"""
+    counts = collections.Counter(
+        (period_start(instance.created_at, 'hour'), dimensions(instance))
+        for instance in instances)
+    alias = router.db_for_write(FeedbackStat)
+    for (bucket, dims), count in counts.items():
+        kind, feedback_type, sender, topic = dims
+        increment(
+            FeedbackStat, alias, count, resolution='hour', bucket=bucket,
+            key=stat_key(dims), kind=kind, feedback_type=feedback_type,
+            sender=sender, topic=topic)
+
+
+def rollup(now=None):
+    """
+    Downsample the hourly stats of every finished day into daily stats
+
+    Days are derived again from their hours each time, so feedback stored
+    late is counted. Hourly stats older than BOUNCY_STATS_HOURLY_RETENTION
+    days are deleted afterwards, a whole day at a time. Returns the number
+    of days rolled up.
+    """
+    now = now or timezone.now()
+    alias = router.db_for_write(FeedbackStat)
+    today = period_start(now, 'day')
+    hours = FeedbackStat.objects.using(alias).filter(
+        resolution='hour', bucket__lt=today)
+
+    totals = collections.Counter()
+    details = {}
+    for bucket, key, count, kind, feedback_type, sender, topic in (
+            hours.values_list(
+                'bucket', 'key', 'count', 'kind', 'feedback_type', 'sender',
+                'topic').iterator()):
+        day = period_start(bucket, 'day')
+        totals[(day, key)] += count
+        details[key] = (kind, feedback_type, sender, topic)
+
+    days = sorted(set(day for day, _ in totals))
+    with transaction.atomic(using=alias):
+        FeedbackStat.objects.using(alias).filter(
+            resolution='day', bucket__in=days).delete()
+        FeedbackStat.objects.using(alias).bulk_create([
+            FeedbackStat(
+                resolution='day', bucket=day, key=key, count=count,
+                kind=details[key][0], feedback_type=details[key][1],
+                sender=details[key][2], topic=details[key][3])
+            for (day, key), count in totals.items()], batch_size=500)
+        hours.filter(bucket__lt=period_start(now - datetime.timedelta(
+            days=get_config().stats_hourly_retention), 'day')).delete()
+    return len(days)
+
+
+def _read(queryset, fields, resolution, start, end):
+    """Return the summed counts of a queryset by (period, group)"""
+    rows = queryset.filter(
+        bucket__gte=period_start(start, resolution), bucket__lte=end).values(
+            'bucket', *fields).annotate(total=Sum('count')).order_by()
+    counts = collections.Counter()
+    for row in rows:
+        counts[(
+            period_start(row['bucket'], resolution),
+            '/'.join(row[field] for field in fields))] += row['total']
+    return counts
+
+
+def series(resolution='hour', start=None, end=None, group_by='kind'):
+    """
+    Return the feedback counts per period from start to end
+
+    Hourly counts are read from the hourly stats. Daily and weekly counts
+    are read from the daily stats for the days rolled up so far and from the
+    hourly stats after them. Every period in the range is included, with
+    zeros where there was no feedback. Returns a dict of the periods and
+    the counts of each group, in the same order as the periods.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError('Bad Resolution')
+    if group_by not in GROUPS:
+        raise ValueError('Bad Group')
+    end = end or timezone.now()
+    start = start or end - PERIODS[resolution] * 48
+    periods = []
+    period = period_start(start, resolution)
+    while period <= end:
+        periods.append(period)
+        period += PERIODS[resolution]
+        if len(periods) > MAX_PERIODS:
+            raise ValueError('Too Many Periods')
+
+    queryset = FeedbackStat.objects.using(read_database(FeedbackStat))
+    fields = GROUPS[group_by]
+    if resolution == 'hour':
+        counts = _read(
+            queryset.filter(resolution='hour'), fields, resolution, start,
+            end)
+    else:
+        rolled_up = queryset.filter(resolution='day').aggregate(
+            latest=Max('bucket'))['latest']
+        hours = queryset.filter(resolution='hour')
+        counts = collections.Counter()
+        if rolled_up is not None:
+            rolled_up += PERIODS['day']
+            counts.update(_read(
+                queryset.filter(resolution='day', bucket__lt=rolled_up),
+                fields, resolution, start, end))
+            hours = hours.filter(bucket__gte=rolled_up)
+        counts.update(_read(hours, fields, resolution, start, end))
+
+    groups = sorted(set(group for _, group in counts))
+    return {
+        'resolution': resolution,
+        'group_by': group_by,
+        'periods': periods,
+        'series': dict(
+            (group, [counts[(period, group)] for period in periods])
+            for group in groups),
+    }
+
+
+def cached_series(resolution='hour', start=None, end=None, group_by='kind'):
+    """
+    Return series(), cached for BOUNCY_STATS_CACHE_TTL seconds
+
+    Without an explicit end, the range ends at the start of the current
+    minute, so requests made within the same minute share a cache entry.
+    """
+    config = get_config()
+    end = end or timezone.now().replace(second=0, microsecond=0)
+    key = 'bouncy-stats-' + hashlib.md5(u' '.join([
+        resolution, group_by, start.isoformat() if start else '',
+        end.isoformat()]).encode('utf-8')).hexdigest()
+    cache = caches[config.stats_cache]
+    result = cache.get(key)
+    if result is None:
+        result = series(resolution, start, end, group_by)
+        cache.set(key, result, config.stats_cache_ttl)
+    return result
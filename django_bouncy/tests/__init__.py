@@ -3,3 +3,23 @@
 
 from django_bouncy.tests.views import *
 from django_bouncy.tests.utils import *
+from django_bouncy.tests.archive import *
+from django_bouncy.tests.metrics import *
+from django_bouncy.tests.profiling import *
+from django_bouncy.tests.simulator import *
+from django_bouncy.tests.admission import *
+from django_bouncy.tests.batch import *
+from django_bouncy.tests.conf import *
+from django_bouncy.tests.routers import *
+from django_bouncy.tests.models import *
+from django_bouncy.tests.feed import *
+from django_bouncy.tests.outbox import *
+from django_bouncy.tests.httpclient import *
+from django_bouncy.tests.certificates import *
+from django_bouncy.tests.escalation import *
+from django_bouncy.tests.classifier import *
+from django_bouncy.tests.stats import *
+from django_bouncy.tests.histograms import *
+from django_bouncy.tests.operations import *
+from django_bouncy.tests.factories import *
+from django_bouncy.tests.bulk import *
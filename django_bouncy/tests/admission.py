@@ -0,0 +1,96 @@
+"""Tests for admission.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import json
+
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.conf import settings
+from django.db import OperationalError
+
+from django_bouncy.tests.helpers import BouncyTestCase, loader
+from django_bouncy import admission, metrics, views
+from django_bouncy.conf import reset_config
+
+
+class AdmissionControllerTest(BouncyTestCase):
+    """Test the AdmissionController class"""
+    def test_in_flight_limit(self):
+        """Test that notifications are shed once too many are in flight"""
+        controller = admission.AdmissionController(max_in_flight=2)
+        self.assertIsNone(controller.admit())
+        self.assertIsNone(controller.admit())
+        self.assertEqual(controller.admit(), 'in_flight')
+
+        controller.release()
+        self.assertIsNone(controller.admit())
+
+    def test_db_latency_limit(self):
+        """Test that notifications are shed while the database is slow"""
+        controller = admission.AdmissionController(
+            max_db_latency=0.5, smoothing=1)
+        controller.record_db_latency(2)
+        # A probe is still allowed through while nothing is in flight
+        self.assertIsNone(controller.admit())
+        self.assertEqual(controller.admit(), 'db_latency')
+
+        controller.record_db_latency(0.1)
+        self.assertIsNone(controller.admit())
+
+    @override_settings(BOUNCY_MAX_DB_LATENCY=0.5)
+    def test_latency_recorded_on_error(self):
+        """Test that a block that raises still records its latency"""
+        controller = admission.get_admission_controller()
+        controller.smoothing = 1
+        with self.assertRaises(OperationalError):
+            with admission.measure_db_latency():
+                raise OperationalError('timeout')
+        self.assertGreater(controller.db_latency, 0)
+
+    def test_disabled_by_default(self):
+        """Test that there is no controller unless a limit is set"""
+        self.assertIsNone(admission.get_admission_controller())
+
+
+@override_settings(
+    BOUNCY_MAX_IN_FLIGHT=1,
+    BOUNCY_METRICS_BACKEND='django_bouncy.metrics.InMemoryMetrics')
+class AdmissionEndpointTest(BouncyTestCase):
+    """Test load shedding in the endpoint"""
+    def setUp(self):
+        """Fill the in-flight limit"""
+        # A new metrics backend and controller for each test
+        reset_config()
+        self.controller = admission.get_admission_controller()
+        self.controller.admit()
+        self.factory = RequestFactory()
+
+    def request(self, notification):
+        """Build a request for a notification, with the SNS headers"""
+        return self.factory.post(
+            '/', json.dumps(notification), content_type='text/plain',
+            HTTP_X_AMZ_SNS_TOPIC_ARN=settings.BOUNCY_TOPIC_ARN[0],
+            HTTP_X_AMZ_SNS_MESSAGE_TYPE=notification['Type'])
+
+    def test_notification_shed(self):
+        """Test that a notification gets a retryable response and is counted"""
+        result = views.endpoint(self.request(self.notification))
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(result['Retry-After'], '5')
+        self.assertIn(
+            'bouncy_shed_total{reason="in_flight"} 1',
+            metrics.get_metrics().render())
+
+    @override_settings(BOUNCY_AUTO_SUBSCRIBE=False)
+    def test_subscription_not_shed(self):
+        """Test that a subscription confirmation is never shed"""
+        request = self.request(loader('subscriptionconfirmation'))
+        with self.assertRaises(views.Http404):
+            views.endpoint(request)
+
+    def test_admitted_after_release(self):
+        """Test that notifications are accepted again once load drops"""
+        self.controller.release()
+        result = views.endpoint(self.request(self.notification))
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(self.controller.in_flight, 0)
+        self.assertGreater(self.controller.db_latency, 0)
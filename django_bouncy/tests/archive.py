@@ -0,0 +1,116 @@
+"""Tests for archive.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import json
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.conf import settings
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase, loader
+from django_bouncy import archive, views
+from django_bouncy.models import Bounce
+
+
+class NotificationArchiveTest(BouncyTestCase):
+    """Test the NotificationArchive class"""
+    def setUp(self):
+        """Create a temporary archive directory"""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary archive directory"""
+        shutil.rmtree(self.directory)
+
+    def test_buffered_until_flush(self):
+        """Test that notifications are only written on flush"""
+        notification_archive = archive.NotificationArchive(
+            self.directory, flush_interval=60)
+        notification_archive.append(self.notification)
+        self.assertEqual(archive.segment_paths(self.directory), [])
+
+        notification_archive.flush()
+        segments = archive.segment_paths(self.directory)
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(
+            list(archive.iter_archive(segments)), [self.notification])
+
+    def test_flush_by_size(self):
+        """Test that a full buffer is written without an explicit flush"""
+        notification_archive = archive.NotificationArchive(
+            self.directory, flush_bytes=1, flush_interval=60)
+        notification_archive.append(self.notification)
+        segments = archive.segment_paths(self.directory)
+        self.assertEqual(len(list(archive.iter_archive(segments))), 1)
+
+    def test_find_notification(self):
+        """Test that an archived notification can be found by MessageId"""
+        notification_archive = archive.NotificationArchive(
+            self.directory, flush_interval=60)
+        complaint = loader('complaint_notification')
+        notification_archive.append(self.notification)
+        notification_archive.flush()
+        notification_archive.append(complaint)
+        notification_archive.flush()
+
+        self.assertEqual(
+            archive.find_notification(self.directory, complaint['MessageId']),
+            complaint)
+        self.assertIsNone(
+            archive.find_notification(self.directory, 'Not A MessageId'))
+
+    def test_segment_rotation(self):
+        """Test that a new segment is started once a segment is full"""
+        notification_archive = archive.NotificationArchive(
+            self.directory, segment_size=1, flush_interval=60)
+        notification_archive.append(self.notification)
+        notification_archive.flush()
+        notification_archive.append(self.notification)
+        notification_archive.flush()
+        self.assertEqual(len(archive.segment_paths(self.directory)), 2)
+
+
+class ArchiveEndpointTest(BouncyTestCase):
+    """Test the archive integration with the endpoint and replay command"""
+    def setUp(self):
+        """Create a temporary archive directory"""
+        self.directory = tempfile.mkdtemp()
+        self.request = RequestFactory().post('/')
+        self.request.META['HTTP_X_AMZ_SNS_TOPIC_ARN'] = \
+            settings.BOUNCY_TOPIC_ARN[0]
+
+    def tearDown(self):
+        """Remove the temporary archive directory"""
+        shutil.rmtree(self.directory)
+
+    def test_endpoint_archives_notification(self):
+        """Test that a verified notification is archived by the endpoint"""
+        with override_settings(BOUNCY_ARCHIVE_DIR=self.directory):
+            self.request._body = json.dumps(self.notification)
+            views.endpoint(self.request)
+            archive.get_archive().flush()
+
+        self.assertEqual(
+            archive.find_notification(
+                self.directory, self.notification['MessageId']),
+            self.notification)
+
+    def test_no_archive_by_default(self):
+        """Test that no archive is used unless configured"""
+        self.assertIsNone(archive.get_archive())
+
+    def test_replay_command(self):
+        """Test that the replay command processes archived notifications"""
+        notification_archive = archive.NotificationArchive(self.directory)
+        notification_archive.append(self.notification)
+        notification_archive.flush()
+        Bounce.objects.all().delete()
+
+        output = StringIO()
+        call_command('bouncy_replay', self.directory, stdout=output)
+
+        self.assertEqual(Bounce.objects.count(), 1)
+        self.assertIn('Replayed 1 Notification(s)', output.getvalue())
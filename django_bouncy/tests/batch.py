@@ -0,0 +1,197 @@
+"""Tests for the batch endpoint in the django-bouncy app"""
+import gzip
+import hashlib
+import hmac
+import io
+import json
+
+try:
+    # Python 2.6/2.7
+    from mock import patch
+except ImportError:
+    # Python 3
+    from unittest.mock import patch
+
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.http import Http404
+
+from django_bouncy.tests.helpers import SignedBouncyTestCase
+from django_bouncy import views
+from django_bouncy.httpclient import HTTPClientError
+from django_bouncy.models import Bounce, Complaint, Delivery, OutboxEvent
+
+
+@override_settings(BOUNCY_BATCH_SECRET='s3cret')
+class BatchEndpointTest(SignedBouncyTestCase):
+    """Test the batch_endpoint view"""
+    def setUp(self):
+        """Setup the test"""
+        self.factory = RequestFactory()
+
+    def request(self, notifications, **extra):
+        """Build an authenticated request for a batch of notifications"""
+        extra.setdefault('HTTP_X_BOUNCY_TOKEN', 's3cret')
+        return self.factory.post(
+            '/batch/', json.dumps(notifications),
+            content_type='application/json', **extra)
+
+    def test_batch_processed(self):
+        """Test that every notification in a batch is stored"""
+        notifications = [
+            self.signed_notification('bounce', 2),
+            self.signed_notification('complaint'),
+            self.signed_notification('delivery', 3),
+        ]
+        result = views.batch_endpoint(self.request(notifications))
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(
+            [item['detail'] for item in json.loads(
+                result.content.decode('utf-8'))['results']],
+            ['Bounce Processed', 'Complaint Processed', 'Delivery Processed'])
+        self.assertEqual(Bounce.objects.count(), 2)
+        self.assertEqual(Complaint.objects.count(), 1)
+        self.assertEqual(Delivery.objects.count(), 3)
+
+    @override_settings(BOUNCY_BATCH_COPY=True)
+    def test_batch_copy(self):
+        """Test that a batch is stored through the bulk insert path"""
+        notifications = [
+            self.signed_notification('bounce', 2),
+            self.signed_notification('delivery', 3),
+        ]
+        result = views.batch_endpoint(self.request(notifications))
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(Bounce.objects.count(), 2)
+        self.assertEqual(Delivery.objects.count(), 3)
+
+    @override_settings(BOUNCY_OUTBOX=True)
+    def test_batch_outbox_ids(self):
+        """Test that outbox events from a batch carry the stored ids"""
+        notifications = [
+            self.signed_notification('bounce', 2),
+            self.signed_notification('delivery', 3),
+        ]
+        views.batch_endpoint(self.request(notifications))
+        ids = sorted(
+            json.loads(payload)['id'] for payload in
+            OutboxEvent.objects.values_list('payload', flat=True))
+        self.assertEqual(ids, sorted(
+            list(Bounce.objects.values_list('pk', flat=True)) +
+            list(Delivery.objects.values_list('pk', flat=True))))
+
+    def test_bad_notification_rejected_alone(self):
+        """Test that one bad notification doesn't fail the whole batch"""
+        tampered = self.signed_notification('bounce')
+        tampered['Message'] = tampered['Message'].replace('@', '@x')
+        notifications = [tampered, self.signed_notification('delivery')]
+        result = views.batch_endpoint(self.request(notifications))
+
+        results = json.loads(result.content.decode('utf-8'))['results']
+        self.assertEqual(results[0]['status'], 400)
+        self.assertEqual(results[0]['detail'], 'Improper Signature')
+        self.assertEqual(results[0]['MessageId'], tampered['MessageId'])
+        self.assertEqual(results[1]['status'], 200)
+        self.assertEqual(Bounce.objects.count(), 0)
+        self.assertEqual(Delivery.objects.count(), 1)
+
+    def test_bad_topic(self):
+        """Test that the topic inside each notification is checked"""
+        notification = self.signed_notification()
+        notification['TopicArn'] = 'Bad ARN'
+        result = views.batch_endpoint(self.request([notification]))
+        results = json.loads(result.content.decode('utf-8'))['results']
+        self.assertEqual(results[0]['detail'], 'Bad Topic')
+
+    def test_topic_not_string(self):
+        """Test that a topic that isn't a string is rejected"""
+        notification = self.signed_notification()
+        notification['TopicArn'] = ['Bad ARN']
+        result = views.batch_endpoint(self.request([notification]))
+        results = json.loads(result.content.decode('utf-8'))['results']
+        self.assertEqual(results[0]['status'], 400)
+        self.assertEqual(results[0]['detail'], 'Bad Topic')
+
+    def test_certificate_unavailable(self):
+        """Test that a failed certificate fetch asks for that item again"""
+        notifications = [
+            self.signed_notification('bounce'),
+            self.signed_notification('delivery'),
+        ]
+        for error in (ValueError, HTTPClientError):
+            Delivery.objects.all().delete()
+            with patch('django_bouncy.views.check_signature',
+                       side_effect=[error('Unavailable'), None]):
+                result = views.batch_endpoint(self.request(notifications))
+
+            self.assertEqual(result.status_code, 200)
+            results = json.loads(result.content.decode('utf-8'))['results']
+            self.assertEqual(results[0]['status'], 500)
+            self.assertEqual(
+                results[0]['detail'], 'Unable To Verify Notification')
+            self.assertEqual(results[1]['status'], 200)
+            self.assertEqual(Bounce.objects.count(), 0)
+            self.assertEqual(Delivery.objects.count(), 1)
+
+    def test_ndjson_gzip(self):
+        """Test a gzip-encoded, newline delimited batch"""
+        body = '\n'.join(
+            json.dumps(self.signed_notification('delivery'))
+            for _ in range(3)).encode('utf-8')
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as gzipped:
+            gzipped.write(body)
+        request = self.factory.post(
+            '/batch/', buf.getvalue(), content_type='application/x-ndjson',
+            HTTP_CONTENT_ENCODING='gzip', HTTP_X_BOUNCY_TOKEN='s3cret')
+
+        result = views.batch_endpoint(request)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(Delivery.objects.count(), 3)
+
+    @override_settings(BOUNCY_BATCH_MAX_BYTES=100)
+    def test_decompressed_size_limited(self):
+        """Test that a batch may not decompress past the limit"""
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as gzipped:
+            gzipped.write(b' ' * 10000)
+        request = self.factory.post(
+            '/batch/', buf.getvalue(), content_type='application/json',
+            HTTP_CONTENT_ENCODING='gzip', HTTP_X_BOUNCY_TOKEN='s3cret')
+
+        result = views.batch_endpoint(request)
+        self.assertEqual(result.status_code, 400)
+        self.assertEqual(result.content.decode('ascii'), 'Batch Too Large')
+
+    @override_settings(BOUNCY_BATCH_MAX_ITEMS=1)
+    def test_too_many_notifications(self):
+        """Test that batches are limited in size"""
+        result = views.batch_endpoint(self.request([{}, {}]))
+        self.assertEqual(result.status_code, 400)
+        self.assertEqual(
+            result.content.decode('ascii'), 'Too Many Notifications')
+
+    def test_hmac_signature(self):
+        """Test authenticating with an HMAC of the body"""
+        body = json.dumps([self.signed_notification('delivery')])
+        signature = hmac.new(
+            b's3cret', body.encode('utf-8'), hashlib.sha256).hexdigest()
+        request = self.factory.post(
+            '/batch/', body, content_type='application/json',
+            HTTP_X_BOUNCY_SIGNATURE=signature)
+        result = views.batch_endpoint(request)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(Delivery.objects.count(), 1)
+
+    def test_bad_secret(self):
+        """Test that a wrong secret is refused"""
+        result = views.batch_endpoint(
+            self.request([], HTTP_X_BOUNCY_TOKEN='wrong'))
+        self.assertEqual(result.status_code, 403)
+
+    @override_settings(BOUNCY_BATCH_SECRET=None)
+    def test_disabled_without_secret(self):
+        """Test that the batch endpoint doesn't exist without a secret"""
+        with self.assertRaises(Http404):
+            views.batch_endpoint(self.request([]))
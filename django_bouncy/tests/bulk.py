@@ -0,0 +1,117 @@
+"""Tests for bulk.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import datetime
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import override_settings
+try:
+    # Python 2.6/2.7
+    from mock import patch
+except ImportError:
+    # Python 3
+    from unittest.mock import patch
+
+from django_bouncy import bulk, routers
+from django_bouncy.factories import FeedbackFactory
+from django_bouncy.models import Bounce, Delivery
+
+END = datetime.datetime(2020, 1, 31, 12)
+
+
+class RowStreamTest(TestCase):
+    """Test the COPY rows read from instances"""
+    def test_copy_value(self):
+        """Test that values are escaped for the COPY text format"""
+        self.assertEqual(bulk.copy_value(None), '\\N')
+        self.assertEqual(bulk.copy_value(True), 't')
+        self.assertEqual(bulk.copy_value(12), '12')
+        self.assertEqual(
+            bulk.copy_value('a\tb\nc\\d\re'), 'a\\tb\\nc\\\\d\\re')
+
+    def test_read(self):
+        """Test that rows are formatted as they are read"""
+        instances = list(FeedbackFactory(end=END).build('delivery', 20))
+        stream = bulk.RowStream(
+            iter(instances), bulk.copy_fields(Delivery), connection)
+        first = stream.read(10)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(stream.rows, 1)
+
+        data = first + stream.read()
+        self.assertEqual(stream.rows, 20)
+        self.assertEqual(stream.read(10), b'')
+        lines = data.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 20)
+        self.assertEqual(
+            len(lines[0].split('\t')), len(bulk.copy_fields(Delivery)))
+        self.assertIn(instances[0].address, lines[0])
+
+
+class BulkInsertTest(TestCase):
+    """Test bulk inserts on the database the tests run against"""
+    def test_insert(self):
+        """Test that every row is inserted from a generator"""
+        factory = FeedbackFactory(end=END)
+        self.assertEqual(
+            bulk.bulk_insert(Bounce, factory.build('bounce', 30),
+                             batch_size=7), 30)
+        self.assertEqual(Bounce.objects.count(), 30)
+
+    def test_skip_duplicates(self):
+        """Test that stored and repeated notifications are skipped"""
+        bounces = list(FeedbackFactory(end=END).build('bounce', 10))
+        bulk.bulk_insert(Bounce, bounces[:4])
+        self.assertEqual(bulk.bulk_insert(
+            Bounce, iter(bounces + bounces[-2:]), skip_duplicates=True,
+            batch_size=3), 6)
+        self.assertEqual(Bounce.objects.count(), 10)
+
+    def test_fetch_pks(self):
+        """Test that the keys of inserted rows are read back"""
+        bounces = list(FeedbackFactory(end=END).build('bounce', 12))
+        bulk.bulk_insert(Bounce, bounces)
+        bounces.append(Bounce(sns_messageid='missing', address='a@b.com'))
+        bulk.fetch_pks(Bounce, bounces, 'default', chunk_size=5)
+        for bounce in bounces[:-1]:
+            self.assertEqual(
+                Bounce.objects.get(pk=bounce.pk).sns_messageid,
+                bounce.sns_messageid)
+        self.assertIsNone(bounces[-1].pk)
+
+    @override_settings(BOUNCY_DATABASES={'Delivery': ['shard0', 'shard1']})
+    def test_route(self):
+        """Test that sharded rows are grouped by the shard they belong in"""
+        deliveries = list(FeedbackFactory(end=END).build('delivery', 20))
+        with patch('django_bouncy.bulk.router', routers.BouncyRouter()):
+            routes = dict(bulk._route(Delivery, iter(deliveries)))
+            self.assertEqual(bulk._route(Bounce, deliveries), [
+                (None, deliveries)])
+        self.assertEqual(set(routes), set(['shard0', 'shard1']))
+        for alias, instances in routes.items():
+            for instance in instances:
+                self.assertEqual(
+                    routers.shard_for(Delivery, instance.address), alias)
+        self.assertEqual(sum(len(rows) for rows in routes.values()), 20)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'COPY Tests Need PostgreSQL')
+class CopyInsertTest(TestCase):
+    """Test the COPY path on PostgreSQL"""
+    def test_copy(self):
+        """Test that rows are copied with their values intact"""
+        bounces = list(FeedbackFactory(end=END).build('bounce', 50))
+        bounces[0].diagnostic_code = 'line one\nline\ttwo \\ three'
+        self.assertEqual(
+            bulk.copy_insert(Bounce, iter(bounces), 'default'), 50)
+        stored = Bounce.objects.get(sns_messageid=bounces[0].sns_messageid)
+        self.assertEqual(stored.diagnostic_code, bounces[0].diagnostic_code)
+        self.assertEqual(stored.hard, bounces[0].hard)
+
+        # Staging again in the same transaction works, and skips the rows
+        # already stored
+        self.assertEqual(bulk.copy_insert(
+            Bounce, iter(bounces), 'default', skip_duplicates=True), 0)
+        self.assertEqual(Bounce.objects.count(), 50)
@@ -0,0 +1,76 @@
+"""Tests for certificate warming in the django-bouncy app"""
+# pylint: disable=protected-access
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import SignedBouncyTestCase
+from django_bouncy import apps, archive, utils
+
+
+class WarmCertificatesTest(SignedBouncyTestCase):
+    """Test warming the signing certificate caches"""
+    def setUp(self):
+        """Start from empty caches"""
+        caches['default'].clear()
+        utils._certificates.clear()
+        self.fetched = self.certificate_server.requests
+
+    def test_warm(self):
+        """Test that certificates are fetched, cached and parsed"""
+        url = self.certificate_server.url
+        self.assertEqual(utils.warm_certificates([url, url]), {})
+        self.assertTrue(caches['default'].get(url))
+        self.assertEqual(len(utils._certificates), 1)
+        self.assertEqual(
+            self.certificate_server.requests - self.fetched, 1)
+
+        # A warmed certificate is verified without being fetched again
+        self.assertTrue(utils.verify_notification(self.signed_notification()))
+        self.assertEqual(
+            self.certificate_server.requests - self.fetched, 1)
+
+    def test_improper_location(self):
+        """Test that certificates are only fetched from the allowed domains"""
+        url = 'http://example.com/cert.pem'
+        self.assertEqual(
+            utils.warm_certificates([url]),
+            {url: 'Improper Certificate Location'})
+
+    def test_load_certificate_cached(self):
+        """Test that a PEM file is only parsed once"""
+        pemfile = utils.grab_keyfile(self.certificate_server.url)
+        self.assertIs(
+            utils.load_certificate(pemfile), utils.load_certificate(pemfile))
+
+    def test_known_urls(self):
+        """Test that URLs come from settings and the archive"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        notification_archive = archive.NotificationArchive(directory)
+        notification_archive.append(self.signed_notification())
+        notification_archive.flush()
+
+        with override_settings(
+                BOUNCY_CERT_URLS=['https://sns.example.com/cert.pem'],
+                BOUNCY_ARCHIVE_DIR=directory):
+            self.assertEqual(apps.known_cert_urls(), set([
+                'https://sns.example.com/cert.pem',
+                self.certificate_server.url]))
+
+    def test_command(self):
+        """Test the bouncy_warm_certs command"""
+        out = StringIO()
+        call_command(
+            'bouncy_warm_certs', self.certificate_server.url, stdout=out)
+        self.assertIn('OK ' + self.certificate_server.url, out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'bouncy_warm_certs', 'http://example.com/cert.pem',
+                stdout=StringIO())
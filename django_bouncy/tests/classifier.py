@@ -0,0 +1,76 @@
+"""Tests for classifier.py in the django-bouncy app"""
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import classifier, views
+from django_bouncy.models import Bounce
+
+
+class ClassifierTest(BouncyTestCase):
+    """Test classifying SMTP responses"""
+    def test_default_rules(self):
+        """Test that common responses are given the right category"""
+        cases = [
+            ('5.1.1', 'smtp; 550 5.1.1 user unknown', 'mailbox_unknown'),
+            ('5.0.0', 'smtp; 552 Mailbox is full', 'mailbox_full'),
+            ('5.0.0', 'smtp; 554 Message rejected as spam', 'spam_block'),
+            ('4.4.7', None, 'connection'),
+            ('5.0.0', 'smtp; 550 Requested action not taken', ''),
+            (None, None, ''),
+        ]
+        for status, diagnostic_code, category in cases:
+            self.assertEqual(
+                classifier.classify(status, diagnostic_code), category)
+
+    def test_leftmost_match_wins(self):
+        """Test that the status code decides before the text after it"""
+        self.assertEqual(
+            classifier.classify('5.2.2', 'blocked: mailbox full'),
+            'mailbox_full')
+
+    def test_no_rules(self):
+        """Test that a classifier without rules classifies nothing"""
+        self.assertEqual(classifier.Classifier([]).classify('5.1.1'), '')
+
+    @override_settings(BOUNCY_CLASSIFIER_RULES=[('custom', r'user unknown')])
+    def test_custom_rules(self):
+        """Test that BOUNCY_CLASSIFIER_RULES replaces the default rules"""
+        self.assertEqual(
+            classifier.classify('5.0.0', 'smtp; 550 user unknown'), 'custom')
+        self.assertEqual(classifier.classify('5.2.2', None), '')
+
+    def test_classified_at_ingestion(self):
+        """Test that stored bounces are classified"""
+        views.process_message(self.bounce, self.notification)
+        self.assertEqual(
+            dict(Bounce.objects.values_list('address', 'category')), {
+                'recipient1@example.com': 'mailbox_unknown',
+                'recipient2@example.com': ''})
+
+    def test_reclassify(self):
+        """Test that stored bounces are classified with new rules"""
+        views.process_message(self.bounce, self.notification)
+        views.process_message(self.bounce, self.notification)
+        with override_settings(
+                BOUNCY_CLASSIFIER_RULES=[('delayed', r'\b4\.0\.0\b')]):
+            self.assertEqual(
+                classifier.reclassify(chunk_size=3, processes=1), (4, 4))
+            self.assertEqual(
+                classifier.reclassify(chunk_size=3, processes=1), (4, 0))
+        self.assertEqual(
+            sorted(Bounce.objects.values_list('category', flat=True)),
+            ['', '', 'delayed', 'delayed'])
+
+    def test_reclassify_command(self):
+        """Test that the command classifies with a pool of processes"""
+        views.process_message(self.bounce, self.notification)
+        Bounce.objects.update(category='stale')
+        output = StringIO()
+        call_command(
+            'bouncy_reclassify', chunk_size=1, processes=2, stdout=output)
+        self.assertIn('Reclassified 2 Of 2 Bounce(s)', output.getvalue())
+        self.assertEqual(
+            Bounce.objects.get(address='recipient1@example.com').category,
+            'mailbox_unknown')
@@ -0,0 +1,50 @@
+"""Tests for conf.py in the django-bouncy app"""
+from django.conf import settings
+from django.test.utils import override_settings
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import conf
+
+
+class BouncyConfigTest(BouncyTestCase):
+    """Test the compiled settings snapshot"""
+    def test_compiled(self):
+        """Test that settings are prepared for fast lookups"""
+        config = conf.get_config()
+        self.assertIsInstance(config.topic_arns, frozenset)
+        self.assertTrue(
+            config.cert_domain_regex.search('sns.us-east-1.amazonaws.com'))
+        self.assertIs(conf.get_config(), config)
+
+    def test_rebuilt_on_setting_changed(self):
+        """Test that override_settings replaces the snapshot"""
+        config = conf.get_config()
+        with override_settings(BOUNCY_TOPIC_ARN=['Other ARN']):
+            self.assertEqual(
+                conf.get_config().topic_arns, frozenset(['Other ARN']))
+        self.assertIsNot(conf.get_config(), config)
+        self.assertNotIn('Other ARN', conf.get_config().topic_arns)
+
+    def test_other_settings_ignored(self):
+        """Test that changing other settings keeps the snapshot"""
+        config = conf.get_config()
+        with override_settings(USE_TZ=False):
+            self.assertIs(conf.get_config(), config)
+
+    def test_no_topics(self):
+        """Test that topics aren't checked without BOUNCY_TOPIC_ARN"""
+        with self.settings():
+            del settings.BOUNCY_TOPIC_ARN
+            conf.reset_config()
+            self.assertIsNone(conf.get_config().topic_arns)
+        conf.reset_config()
+
+    def test_cached_objects(self):
+        """Test that built objects live on the snapshot"""
+        from django_bouncy.metrics import get_metrics
+        backend = get_metrics()
+        self.assertIs(conf.get_config().metrics, backend)
+        self.assertIs(get_metrics(), backend)
+        with override_settings(BOUNCY_MAX_IN_FLIGHT=5):
+            self.assertIsNone(conf.get_config().metrics)
+            self.assertEqual(conf.get_config().max_in_flight, 5)
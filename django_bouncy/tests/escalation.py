@@ -0,0 +1,180 @@
+"""Tests for escalation.py in the django-bouncy app"""
+import copy
+import datetime
+
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import escalation, queries, signals, views
+from django_bouncy.conf import get_config
+from django_bouncy.models import Bounce, SoftBounceCounter, Suppression
+
+DAY = 24 * 60 * 60
+RULES = [{'name': 'weekly', 'count': 3, 'window': 7 * DAY,
+          'duration': 30 * DAY}]
+
+
+@override_settings(BOUNCY_SOFT_BOUNCE_RULES=RULES)
+class SoftBounceTest(BouncyTestCase):
+    """Test escalating soft bounces to suppressions"""
+    def setUp(self):
+        """Record the suppression signals sent"""
+        self.changes = []
+        signals.suppression.connect(self.record_change)
+
+    def tearDown(self):
+        """Stop recording the suppression signals"""
+        signals.suppression.disconnect(self.record_change)
+
+    def record_change(self, address, suppressed, **kwargs):
+        """Receive a suppression signal"""
+        # pylint: disable=unused-argument
+        self.changes.append((address, suppressed))
+
+    def soft_bounce(self, subtype='General', address='soft@example.com'):
+        """Store a soft bounce for an address"""
+        message = copy.deepcopy(self.bounce)
+        message['bounce']['bounceType'] = 'Transient'
+        message['bounce']['bounceSubType'] = subtype
+        message['bounce']['bouncedRecipients'] = [{
+            'status': '4.0.0', 'action': 'delayed', 'emailAddress': address}]
+        views.process_message(message, self.notification)
+
+    def test_bucket_for(self):
+        """Test that times are rounded down to the start of their bucket"""
+        width = datetime.timedelta(hours=1)
+        self.assertEqual(
+            escalation.bucket_for(
+                datetime.datetime(2020, 1, 1, 10, 59, 59), width),
+            datetime.datetime(2020, 1, 1, 10))
+        self.assertEqual(
+            escalation.bucket_for(datetime.datetime(
+                2020, 1, 1, 10, 30, tzinfo=timezone.utc), width),
+            datetime.datetime(2020, 1, 1, 10, tzinfo=timezone.utc))
+
+    def test_matching_rules(self):
+        """Test that only counters inside a rule's window are summed"""
+        config = get_config()
+        now = datetime.datetime(2020, 1, 10)
+        counters = [
+            ('General', datetime.datetime(2020, 1, 9), 2),
+            ('General', datetime.datetime(2019, 12, 1), 5)]
+        self.assertEqual(escalation.matching_rules(
+            counters, now, config.soft_bounce_rules,
+            config.soft_bounce_bucket), [])
+
+        counters.append(('MailboxFull', datetime.datetime(2020, 1, 8), 1))
+        self.assertEqual(escalation.matching_rules(
+            counters, now, config.soft_bounce_rules,
+            config.soft_bounce_bucket), list(config.soft_bounce_rules))
+
+    def test_suppressed_at_ingestion(self):
+        """Test that an address is suppressed once it meets a rule"""
+        self.soft_bounce()
+        self.soft_bounce()
+        self.assertFalse(Suppression.objects.exists())
+        self.assertEqual(SoftBounceCounter.objects.get().count, 2)
+
+        self.soft_bounce()
+        suppression = Suppression.objects.get()
+        self.assertEqual(suppression.address, 'soft@example.com')
+        self.assertEqual(suppression.rule, 'weekly')
+        self.assertTrue(suppression.is_active())
+        self.assertEqual(self.changes, [('soft@example.com', True)])
+        self.assertEqual(
+            queries.suppressed(['Soft@Example.com']), set(['soft@example.com']))
+
+        # Further bounces extend the suppression without another signal
+        self.soft_bounce()
+        self.assertEqual(len(self.changes), 1)
+
+    def test_hard_bounces_ignored(self):
+        """Test that hard bounces are not counted"""
+        for _ in range(3):
+            views.process_message(self.bounce, self.notification)
+        self.assertFalse(SoftBounceCounter.objects.exists())
+        self.assertFalse(Suppression.objects.exists())
+
+    @override_settings(BOUNCY_SOFT_BOUNCE_RULES=[
+        {'count': 2, 'window': DAY, 'subtypes': ['MailboxFull']}])
+    def test_subtypes(self):
+        """Test that a rule only counts the subtypes it names"""
+        self.soft_bounce('General')
+        self.soft_bounce('MailboxFull')
+        self.assertFalse(Suppression.objects.exists())
+
+        self.soft_bounce('MailboxFull')
+        suppression = Suppression.objects.get()
+        self.assertEqual(suppression.rule, 'soft-bounce-1')
+        self.assertIsNone(suppression.expires_at)
+
+    @override_settings(BOUNCY_SOFT_BOUNCE_RULES=[])
+    def test_reevaluate(self):
+        """Test that new rules are applied to stored soft bounces"""
+        for _ in range(3):
+            self.soft_bounce()
+        self.soft_bounce(address='other@example.com')
+        self.assertFalse(SoftBounceCounter.objects.exists())
+
+        output = StringIO()
+        with override_settings(BOUNCY_SOFT_BOUNCE_RULES=RULES):
+            call_command('bouncy_soft_bounces', stdout=output)
+        self.assertIn(
+            'Evaluated 2 Address(es): 1 Suppressed, 0 Released',
+            output.getvalue())
+        self.assertEqual(
+            list(Suppression.objects.values_list('address', flat=True)),
+            ['soft@example.com'])
+        self.assertEqual(SoftBounceCounter.objects.count(), 2)
+
+        # Rules that no longer match lift the suppressions they made
+        with override_settings(BOUNCY_SOFT_BOUNCE_RULES=[
+                {'count': 10, 'window': DAY}]):
+            results = escalation.reevaluate()
+        self.assertEqual(results['released'], 1)
+        self.assertFalse(Suppression.objects.active().exists())
+        self.assertEqual(self.changes, [
+            ('soft@example.com', True), ('soft@example.com', False)])
+
+    def test_reevaluate_keeps_increments(self):
+        """Test that counters are corrected in place, keeping live counts"""
+        config = get_config()
+        for _ in range(2):
+            self.soft_bounce(address='past@example.com')
+        past = timezone.now() - datetime.timedelta(hours=3)
+        Bounce.objects.update(created_at=past)
+        SoftBounceCounter.objects.update(
+            bucket=escalation.bucket_for(past, config.soft_bounce_bucket),
+            count=5)
+        counter = SoftBounceCounter.objects.get()
+
+        # The current bucket is being incremented as bounces are stored, so
+        # a count the Bounce table doesn't know about yet is left alone
+        SoftBounceCounter.objects.create(
+            address='live@example.com', subtype='General', count=4,
+            bucket=escalation.bucket_for(
+                timezone.now(), config.soft_bounce_bucket))
+
+        escalation.reevaluate()
+        counter.refresh_from_db()
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(SoftBounceCounter.objects.get(
+            address='live@example.com').count, 4)
+
+    def test_reevaluate_expired(self):
+        """Test that old bounces neither suppress nor keep counters"""
+        for _ in range(3):
+            self.soft_bounce(address='old@example.com')
+        Suppression.objects.all().delete()
+        old = timezone.now() - datetime.timedelta(days=60)
+        Bounce.objects.update(created_at=old)
+        SoftBounceCounter.objects.update(bucket=escalation.bucket_for(
+            old, get_config().soft_bounce_bucket))
+
+        results = escalation.reevaluate()
+        self.assertEqual(results['suppressed'], 0)
+        self.assertFalse(Suppression.objects.exists())
+        self.assertFalse(SoftBounceCounter.objects.exists())
@@ -0,0 +1,86 @@
+"""Tests for factories.py in the django-bouncy app"""
+import datetime
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from django_bouncy import factories
+from django_bouncy.models import Bounce, Complaint, Delivery
+
+END = datetime.datetime(2020, 1, 31, 12)
+
+
+def rows(kind, count, seed=0):
+    """Return the fields of generated instances that identify them"""
+    factory = factories.FeedbackFactory(seed=seed, end=END)
+    return [(instance.created_at, instance.address, instance.mail_id)
+            for instance in factory.build(kind, count)]
+
+
+class FeedbackFactoryTest(TestCase):
+    """Test the synthetic feedback factory"""
+    def test_deterministic(self):
+        """Test that a seed always generates the same rows"""
+        for kind in factories.KINDS:
+            self.assertEqual(rows(kind, 50), rows(kind, 50))
+            self.assertNotEqual(rows(kind, 50), rows(kind, 50, seed=1))
+        self.assertNotEqual(rows('bounce', 50), rows('complaint', 50))
+
+    def test_distribution(self):
+        """Test that rows are in time order, skewed and consistent"""
+        generated = rows('bounce', 2000)
+        times = [created_at for created_at, _, _ in generated]
+        self.assertEqual(times, sorted(times))
+        self.assertGreater(times[0], END - datetime.timedelta(days=30))
+        self.assertLessEqual(times[-1], END)
+        # The rate of feedback grows, so the last half of the period has
+        # more of it
+        middle = END - datetime.timedelta(days=15)
+        self.assertGreater(
+            sum(1 for time in times if time > middle), len(times) * 0.6)
+
+        domains = {}
+        for _, address, _ in generated:
+            number, domain = address.split('@')
+            self.assertEqual(domains.setdefault(number, domain), domain)
+        self.assertLess(len(domains), len(generated))
+
+    def test_bounce_fields(self):
+        """Test that bounces are classified and typed consistently"""
+        factory = factories.FeedbackFactory(end=END)
+        for bounce in factory.build('bounce', 200):
+            self.assertEqual(bounce.hard, bounce.bounce_type == 'Permanent')
+            self.assertLessEqual(bounce.mail_timestamp, bounce.created_at)
+            if bounce.bounce_subtype == 'MailboxFull':
+                self.assertEqual(bounce.category, 'mailbox_full')
+
+    def test_create(self):
+        """Test that rows are stored in batches with their own times"""
+        factory = factories.FeedbackFactory(end=END)
+        progress = []
+        self.assertEqual(
+            factory.create('delivery', 25, batch_size=10,
+                           progress=progress.append), 25)
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(Delivery.objects.count(), 25)
+
+        first = Delivery.objects.order_by('pk').first()
+        self.assertEqual(first.created_at, rows('delivery', 25)[0][0])
+        self.assertEqual(first.modified_at, first.created_at)
+
+        # Saving normally still sets the times
+        first.save()
+        self.assertGreater(first.modified_at, END)
+
+    def test_command(self):
+        """Test that the command stores each kind of feedback"""
+        output = StringIO()
+        call_command(
+            'bouncy_seed', bounces=30, complaints=5, batch_size=7, seed=3,
+            stdout=output)
+        self.assertIn('Stored 30 Bounce Row(s)', output.getvalue())
+        self.assertIn('Stored 5 Complaint Row(s)', output.getvalue())
+        self.assertEqual(Bounce.objects.count(), 30)
+        self.assertEqual(Complaint.objects.count(), 5)
+        self.assertEqual(Delivery.objects.count(), 0)
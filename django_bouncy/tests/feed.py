@@ -0,0 +1,134 @@
+"""Tests for feed.py in the django-bouncy app"""
+import json
+
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.http import Http404
+
+from django_bouncy.tests.helpers import BouncyTestCase, loader
+from django_bouncy import feed, views
+
+
+@override_settings(BOUNCY_FEED_DELAY=0, BOUNCY_FEED_POLL_INTERVAL=0.01)
+class ReadFeedTest(BouncyTestCase):
+    """Test the read_feed function"""
+    def setUp(self):
+        """Store bounces, a complaint and a delivery"""
+        views.process_message(self.bounce, self.notification)
+        views.process_message(self.complaint, self.notification)
+        views.process_message(loader('delivery'), self.notification)
+
+    def test_pages(self):
+        """Test that paging with the cursor returns each record once"""
+        seen = []
+        cursor = None
+        while True:
+            records, cursor = feed.read_feed(cursor, limit=2)
+            if not records:
+                break
+            seen += [(record['type'], record['id']) for record in records]
+
+        everything, _ = feed.read_feed(limit=100)
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(
+            seen, [(record['type'], record['id']) for record in everything])
+
+    def test_cursor_kept_when_empty(self):
+        """Test that the cursor is returned unchanged with no new records"""
+        _, cursor = feed.read_feed(limit=100)
+        records, next_cursor = feed.read_feed(cursor)
+        self.assertEqual(records, [])
+        self.assertEqual(next_cursor, cursor)
+
+    def test_filters(self):
+        """Test filtering by type and topic"""
+        records, _ = feed.read_feed(types=['complaint'])
+        self.assertEqual([record['type'] for record in records], ['complaint'])
+        records, _ = feed.read_feed(topics=['Other Topic'])
+        self.assertEqual(records, [])
+
+    def test_bad_cursor(self):
+        """Test that a made up cursor is refused"""
+        with self.assertRaises(ValueError):
+            feed.read_feed('not a cursor')
+        with self.assertRaises(ValueError):
+            feed.read_feed(types=['unsubscribe'])
+
+    @override_settings(BOUNCY_FEED_DELAY=60)
+    def test_recent_records_held_back(self):
+        """Test that records still settling are not returned"""
+        records, cursor = feed.read_feed()
+        self.assertEqual(records, [])
+        self.assertIsNone(cursor)
+
+    def test_wait(self):
+        """Test that waiting gives up once the time has passed"""
+        _, cursor = feed.read_feed(limit=100)
+        self.assertEqual(feed.wait_for_feed(0.05, cursor), ([], cursor))
+        self.assertEqual(
+            feed.wait_for_feed(float('nan'), cursor), ([], cursor))
+
+
+@override_settings(BOUNCY_FEED_SECRET='s3cret', BOUNCY_FEED_DELAY=0)
+class FeedEndpointTest(BouncyTestCase):
+    """Test the feed_endpoint view"""
+    def setUp(self):
+        """Store a bounce"""
+        views.process_message(self.bounce, self.notification)
+        self.factory = RequestFactory()
+
+    def request(self, **params):
+        """Build an authenticated feed request"""
+        return self.factory.get(
+            '/feed/', params, HTTP_X_BOUNCY_TOKEN='s3cret')
+
+    def test_records(self):
+        """Test that records and a cursor are returned"""
+        result = views.feed_endpoint(self.request(type='bounce'))
+        self.assertEqual(result.status_code, 200)
+        body = json.loads(result.content.decode('utf-8'))
+        self.assertEqual(len(body['records']), 2)
+        self.assertEqual(body['records'][0]['type'], 'bounce')
+        self.assertTrue(body['cursor'])
+
+    def test_not_modified(self):
+        """Test that a consumer that is up to date gets a 304"""
+        result = views.feed_endpoint(self.request())
+        cursor = json.loads(result.content.decode('utf-8'))['cursor']
+
+        result = views.feed_endpoint(self.request(cursor=cursor))
+        request = self.request(cursor=cursor)
+        request.META['HTTP_IF_NONE_MATCH'] = result['ETag']
+        self.assertEqual(views.feed_endpoint(request).status_code, 304)
+
+    def test_gzip(self):
+        """Test that the feed can be compressed"""
+        request = self.request()
+        request.META['HTTP_ACCEPT_ENCODING'] = 'gzip'
+        result = views.feed_endpoint(request)
+        self.assertEqual(result['Content-Encoding'], 'gzip')
+
+    def test_bad_cursor(self):
+        """Test that a bad cursor is a bad request"""
+        result = views.feed_endpoint(self.request(cursor='nope'))
+        self.assertEqual(result.status_code, 400)
+        self.assertEqual(result.content.decode('ascii'), 'Bad Cursor')
+
+    def test_bad_wait(self):
+        """Test that a wait that isn't a finite number is a bad request"""
+        for wait in ('nan', '-inf', 'soon'):
+            result = views.feed_endpoint(self.request(wait=wait))
+            self.assertEqual(result.status_code, 400)
+            self.assertEqual(
+                result.content.decode('ascii'), 'Bad Limit Or Wait')
+
+    def test_bad_secret(self):
+        """Test that the feed needs the shared secret"""
+        request = self.factory.get('/feed/', HTTP_X_BOUNCY_TOKEN='wrong')
+        self.assertEqual(views.feed_endpoint(request).status_code, 403)
+
+    @override_settings(BOUNCY_FEED_SECRET=None)
+    def test_disabled_without_secret(self):
+        """Test that the feed doesn't exist without a secret"""
+        with self.assertRaises(Http404):
+            views.feed_endpoint(self.request())
@@ -4,19 +4,23 @@ import json
 
 from django.test import TestCase
 from django.test.utils import override_settings
-from django.conf import settings
+
+from django_bouncy import simulator
 
 DIRNAME, _ = os.path.split(os.path.abspath(__file__))
 
 
-@override_settings(BOUNCY_VERIFY_CERTIFICATE=False)
+@override_settings(
+    BOUNCY_VERIFY_CERTIFICATE=False,
+    BOUNCY_TOPIC_ARN=[
+        'arn:aws:sns:us-east-1:250214102493:Demo_App_Unsubscribes'
+    ])
 class BouncyTestCase(TestCase):
     """Custom TestCase for django-bouncy"""
     @classmethod
     def setUpClass(cls):
         """Setup the BouncyTestCase Class"""
         super(BouncyTestCase, cls).setUpClass()
-        cls.old_setting = getattr(settings, 'BOUNCY_TOPIC_ARN', None)
         cls.notification = loader('bounce_notification')
         cls.complaint = loader('complaint')
         cls.bounce = loader('bounce')
@@ -25,15 +29,45 @@ class BouncyTestCase(TestCase):
                                          'pem'))
         cls.pemfile = cls.keyfileobj.read()
 
-        settings.BOUNCY_TOPIC_ARN = [
-            'arn:aws:sns:us-east-1:250214102493:Demo_App_Unsubscribes'
-        ]
-
     @classmethod
     def tearDownClass(cls):
         """Tear down the BouncyTestCase Class"""
-        if cls.old_setting is not None:
-            settings.BOUNCY_TOPIC_ARN = cls.old_setting
+        cls.keyfileobj.close()
+        super(BouncyTestCase, cls).tearDownClass()
+
+
+class SignedBouncyTestCase(BouncyTestCase):
+    """
+    BouncyTestCase that verifies signatures, like a production endpoint
+
+    Notifications built with signed_notification are signed by a local key
+    whose certificate is served by a local CertificateServer.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Start the certificate server and turn verification on"""
+        super(SignedBouncyTestCase, cls).setUpClass()
+        cls.signing_key, certificate = simulator.generate_certificate(1024)
+        cls.certificate_server = simulator.CertificateServer(certificate)
+        cls.certificate_server.start()
+        cls.signed_settings = override_settings(
+            BOUNCY_VERIFY_CERTIFICATE=True,
+            BOUNCY_CERT_DOMAIN_REGEX=cls.certificate_server.domain_regex,
+            BOUNCY_TOPIC_ARN=[simulator.DEFAULT_TOPIC_ARN])
+        cls.signed_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the certificate server"""
+        cls.signed_settings.disable()
+        cls.certificate_server.stop()
+        super(SignedBouncyTestCase, cls).tearDownClass()
+
+    def signed_notification(self, kind='bounce', recipients=1):
+        """Return a new signed notification"""
+        return simulator.build_notification(
+            simulator.build_message(kind, recipients),
+            self.signing_key, self.certificate_server.url)
 
 
 def loader(example_name):
@@ -0,0 +1,65 @@
+"""Tests for histograms.py in the django-bouncy app"""
+import datetime
+import json
+
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from django_bouncy.tests.helpers import BouncyTestCase, loader
+from django_bouncy import histograms, views
+from django_bouncy.models import DeliveryLatency
+
+
+class HistogramTest(BouncyTestCase):
+    """Test the delivery latency histograms"""
+    def test_bins(self):
+        """Test that bins report latencies within 5% of their value"""
+        self.assertEqual(histograms.bin_for(0), 0)
+        for value in (1, 7, 546, 12345, 3600000):
+            estimate = histograms.bin_value(histograms.bin_for(value))
+            self.assertLess(abs(estimate - value) / value, 0.05)
+
+    def test_percentiles(self):
+        """Test percentiles of merged histograms"""
+        first = histograms.Histogram()
+        second = histograms.Histogram()
+        for value in range(1, 51):
+            first.add(value * 10)
+            second.add(value * 10 + 500)
+        first.merge(second)
+
+        self.assertEqual(first.count, 100)
+        self.assertAlmostEqual(first.percentile(50), 500, delta=25)
+        self.assertAlmostEqual(first.percentile(99), 990, delta=50)
+        self.assertIsNone(histograms.Histogram().percentile(50))
+
+    def test_recorded_at_ingestion(self):
+        """Test that deliveries are added to the histograms"""
+        delivery = loader('delivery')
+        views.process_message(delivery, self.notification)
+        views.process_message(delivery, self.notification)
+
+        row = DeliveryLatency.objects.get()
+        self.assertEqual(row.bin, histograms.bin_for(546))
+        self.assertEqual(row.count, 2)
+        self.assertEqual(row.sender, delivery['mail']['source'])
+
+        result = histograms.latency_percentiles(
+            start=timezone.now() - datetime.timedelta(hours=1),
+            sender=delivery['mail']['source'])
+        self.assertEqual(result['count'], 2)
+        self.assertAlmostEqual(result['p99'], 546, delta=546 * 0.05)
+        self.assertEqual(
+            histograms.latency_percentiles(sender='nobody')['count'], 0)
+
+    @override_settings(BOUNCY_STATS_SECRET='s3cret')
+    def test_latency_endpoint(self):
+        """Test that percentiles are returned as JSON"""
+        views.process_message(loader('delivery'), self.notification)
+        result = views.latency_endpoint(RequestFactory().get(
+            '/stats/latency/', HTTP_X_BOUNCY_TOKEN='s3cret'))
+        self.assertEqual(result.status_code, 200)
+        data = json.loads(result.content.decode('utf-8'))
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(sorted(data), ['count', 'p50', 'p95', 'p99'])
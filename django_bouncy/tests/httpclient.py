@@ -0,0 +1,146 @@
+"""Tests for httpclient.py in the django-bouncy app"""
+from django.test.utils import override_settings
+from six.moves import http_client
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import httpclient, simulator
+
+
+class StubResponse(object):
+    """A canned httplib response"""
+    def __init__(self, status, body, will_close=False):
+        self.status = status
+        self.body = body
+        self.will_close = will_close
+
+    def read(self):
+        """Return the body"""
+        return self.body
+
+    @staticmethod
+    def getheaders():
+        """Return no headers"""
+        return []
+
+
+class StubTransport(object):
+    """Transport whose connections return queued responses"""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.connections = []
+        self.requests = []
+
+    def __call__(self, scheme, netloc, timeout, ssl_context=None):
+        """Open a stub connection"""
+        connection = StubConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+class StubConnection(object):
+    """A connection that answers from its transport's queue"""
+    def __init__(self, transport):
+        self.transport = transport
+        self.closed = False
+
+    def request(self, method, path, body, headers):
+        """Record the request"""
+        self.transport.requests.append((method, path, body, headers))
+
+    def getresponse(self):
+        """Return the next response, raising it if it's an exception"""
+        response = self.transport.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        """Mark the connection as closed"""
+        self.closed = True
+
+
+class HTTPClientTest(BouncyTestCase):
+    """Test the HTTPClient class"""
+    def make_client(self, *responses, **kwargs):
+        """Return a client using a stub transport"""
+        self.transport = StubTransport(responses)
+        kwargs.setdefault('backoff', 0)
+        return httpclient.HTTPClient(transport=self.transport, **kwargs)
+
+    def test_connection_reused(self):
+        """Test that kept-alive connections are reused for a host"""
+        client = self.make_client(
+            StubResponse(200, b'a'), StubResponse(200, b'b'))
+        self.assertEqual(client.get('http://example.com/a').read(), b'a')
+        self.assertEqual(client.get('http://example.com/b?c=d').body, b'b')
+        self.assertEqual(len(self.transport.connections), 1)
+        self.assertEqual(self.transport.requests[1][1], '/b?c=d')
+
+    def test_closed_connection_not_reused(self):
+        """Test that connections the server closes aren't pooled"""
+        client = self.make_client(
+            StubResponse(200, b'a', will_close=True), StubResponse(200, b'b'))
+        client.get('http://example.com/')
+        client.get('http://example.com/')
+        self.assertEqual(len(self.transport.connections), 2)
+        self.assertTrue(self.transport.connections[0].closed)
+
+    def test_stale_connection_replaced(self):
+        """Test that a failed idle connection is replaced without a retry"""
+        client = self.make_client(
+            StubResponse(200, b'a'), http_client.BadStatusLine(''),
+            StubResponse(200, b'b'), retries=0, backoff=60)
+        client.get('http://example.com/')
+        self.assertEqual(client.get('http://example.com/').body, b'b')
+        self.assertEqual(len(self.transport.connections), 2)
+        self.assertTrue(self.transport.connections[0].closed)
+
+        # A new connection that fails is not tried again
+        client = self.make_client(IOError('refused'), retries=0)
+        with self.assertRaises(httpclient.HTTPClientError):
+            client.get('http://example.com/')
+        self.assertEqual(len(self.transport.connections), 1)
+
+    def test_retry(self):
+        """Test that errors and 5xx responses are retried"""
+        client = self.make_client(
+            http_client.BadStatusLine(''), StubResponse(503, b''),
+            StubResponse(200, b'ok'), retries=2)
+        self.assertEqual(client.get('http://example.com/').status, 200)
+        self.assertEqual(len(self.transport.requests), 3)
+
+    def test_retries_exhausted(self):
+        """Test that a request fails once retries run out"""
+        client = self.make_client(
+            IOError('refused'), IOError('refused'), retries=1)
+        with self.assertRaises(httpclient.HTTPClientError):
+            client.get('http://example.com/')
+
+        client = self.make_client(StubResponse(500, b'no'), retries=0)
+        self.assertEqual(client.get('http://example.com/').status, 500)
+
+    def test_client_errors_not_retried(self):
+        """Test that 4xx responses are returned straight away"""
+        client = self.make_client(StubResponse(404, b''), retries=2)
+        self.assertEqual(client.get('http://example.com/').status, 404)
+        self.assertEqual(len(self.transport.requests), 1)
+
+    def test_unsupported_url(self):
+        """Test that only HTTP and HTTPS URLs are fetched"""
+        with self.assertRaises(httpclient.HTTPClientError):
+            self.make_client().get('file:///etc/passwd')
+
+    def test_real_server(self):
+        """Test fetching from a local HTTP server"""
+        _, certificate = simulator.generate_certificate(1024)
+        with simulator.CertificateServer(certificate) as server:
+            response = httpclient.HTTPClient().get(server.url)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, certificate)
+
+    def test_rebuilt_on_setting_changed(self):
+        """Test that the shared client follows the settings"""
+        client = httpclient.get_client()
+        self.assertIs(httpclient.get_client(), client)
+        with override_settings(BOUNCY_HTTP_TIMEOUT=1):
+            self.assertEqual(httpclient.get_client().timeout, 1)
@@ -0,0 +1,105 @@
+"""Tests for metrics.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import json
+
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.http import Http404
+from django.conf import settings
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import metrics, views
+from django_bouncy.conf import reset_config
+
+
+class InMemoryMetricsTest(BouncyTestCase):
+    """Test the InMemoryMetrics backend"""
+    def test_counters_and_summaries(self):
+        """Test that counters and observations are rendered"""
+        backend = metrics.InMemoryMetrics()
+        backend.increment('bouncy_rejected_total', reason='Bad Topic')
+        backend.increment('bouncy_rejected_total', reason='Bad Topic')
+        backend.observe('bouncy_recipients', 3, type='Bounce')
+
+        output = backend.render()
+        self.assertIn(
+            'bouncy_rejected_total{reason="Bad Topic"} 2', output)
+        self.assertIn('bouncy_recipients_count{type="Bounce"} 1', output)
+        self.assertIn('bouncy_recipients_sum{type="Bounce"} 3.0', output)
+
+    def test_timer(self):
+        """Test that a timer records one observation"""
+        backend = metrics.InMemoryMetrics()
+        with backend.timer('bouncy_stage_seconds', stage='parse'):
+            pass
+        key = ('bouncy_stage_seconds', (('stage', 'parse'),))
+        self.assertEqual(backend.summaries[key][0], 1)
+
+    def test_disabled_backend(self):
+        """Test that the default backend discards metrics"""
+        backend = metrics.get_metrics()
+        self.assertFalse(backend.enabled)
+        self.assertIs(backend.timer('anything'), metrics.NULL_TIMER)
+        self.assertIsNone(backend.render())
+
+
+@override_settings(
+    BOUNCY_METRICS_BACKEND='django_bouncy.metrics.InMemoryMetrics')
+class EndpointMetricsTest(BouncyTestCase):
+    """Test the metrics recorded by the endpoint"""
+    def setUp(self):
+        """Setup the test"""
+        self.factory = RequestFactory()
+        self.request = self.factory.post('/')
+        self.request.META['HTTP_X_AMZ_SNS_TOPIC_ARN'] = \
+            settings.BOUNCY_TOPIC_ARN[0]
+        # A new metrics backend for each test
+        reset_config()
+
+    def test_rejection_counted(self):
+        """Test that a bad request is counted by its reason"""
+        self.request._body = 'This Is Not JSON'
+        views.endpoint(self.request)
+        output = metrics.get_metrics().render()
+        self.assertIn(
+            'bouncy_rejected_total{reason="Not Valid JSON"} 1', output)
+
+    def test_notification_counted(self):
+        """Test that notification types, stages and recipients are recorded"""
+        self.request._body = json.dumps(self.notification)
+        views.endpoint(self.request)
+        output = metrics.get_metrics().render()
+        self.assertIn(
+            'bouncy_notifications_total{type="Notification"} 1', output)
+        self.assertIn('bouncy_messages_total{type="Bounce"} 1', output)
+        self.assertIn('bouncy_recipients_sum{type="Bounce"} 1.0', output)
+        self.assertIn('bouncy_stage_seconds_count{stage="db"} 1', output)
+
+    @override_settings(BOUNCY_METRICS_SECRET='s3cret')
+    def test_prometheus_view(self):
+        """Test that the metrics view renders the in-memory metrics"""
+        metrics.get_metrics().increment('bouncy_notifications_total')
+        response = views.prometheus_metrics(self.factory.get(
+            '/metrics/', HTTP_X_BOUNCY_TOKEN='s3cret'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'bouncy_notifications_total 1', response.content.decode('ascii'))
+
+    @override_settings(BOUNCY_METRICS_SECRET='s3cret')
+    def test_prometheus_view_secret(self):
+        """Test that the metrics view refuses requests without the secret"""
+        for extra in ({}, {'HTTP_X_BOUNCY_TOKEN': 'wrong'}):
+            response = views.prometheus_metrics(
+                self.factory.get('/metrics/', **extra))
+            self.assertEqual(response.status_code, 403)
+
+    def test_prometheus_view_disabled(self):
+        """Test that the metrics view is hidden unless turned on"""
+        with self.assertRaises(Http404):
+            views.prometheus_metrics(self.factory.get('/metrics/'))
+        with override_settings(
+                BOUNCY_METRICS_SECRET='s3cret',
+                BOUNCY_METRICS_BACKEND='django_bouncy.metrics.MetricsBackend'):
+            with self.assertRaises(Http404):
+                views.prometheus_metrics(self.factory.get(
+                    '/metrics/', HTTP_X_BOUNCY_TOKEN='s3cret'))
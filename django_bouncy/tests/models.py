@@ -0,0 +1,138 @@
+"""Tests for models.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import datetime
+import os
+import subprocess
+import sys
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+try:
+    # Python 2.6/2.7
+    from mock import Mock
+except ImportError:
+    # Python 3
+    from mock import Mock
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import views
+from django_bouncy.factories import FeedbackFactory
+from django_bouncy.models import Bounce, Delivery
+from django_bouncy.routers import shard_for
+
+END = datetime.datetime(2020, 1, 31, 12)
+
+
+class FeedbackQuerySetTest(BouncyTestCase):
+    """Test the batched address lookups"""
+    def setUp(self):
+        """Store two bounces for one address and one for another"""
+        views.process_message(self.bounce, self.notification)
+        views.process_message(self.bounce, self.notification)
+        self.latest = Bounce.objects.order_by('-pk')[:2]
+        self.addresses = [
+            'recipient1@example.com', 'recipient2@example.com',
+            'nobody@example.com']
+
+    def test_latest_for(self):
+        """Test that the latest record for each address is returned"""
+        latest = Bounce.objects.latest_for(self.addresses)
+        self.assertEqual(
+            latest, dict((bounce.address, bounce) for bounce in self.latest))
+
+    def test_counts_for(self):
+        """Test that records are counted per address"""
+        self.assertEqual(
+            Bounce.objects.counts_for(self.addresses),
+            {'recipient1@example.com': 2, 'recipient2@example.com': 2})
+        self.assertEqual(
+            Bounce.objects.counts_for(
+                self.addresses,
+                since=timezone.now() + datetime.timedelta(days=1)),
+            {})
+        self.assertEqual(Delivery.objects.counts_for(self.addresses), {})
+
+    def test_chunks(self):
+        """Test that lookups are split into chunks and merged"""
+        pool = Mock()
+        pool.map.side_effect = lambda func, chunks: [
+            func(chunk) for chunk in chunks]
+
+        latest = Bounce.objects.latest_for(
+            self.addresses, chunk_size=1, pool=pool)
+        self.assertEqual(len(pool.map.call_args[0][1]), 3)
+        self.assertEqual(
+            latest, dict((bounce.address, bounce) for bounce in self.latest))
+
+    def test_chunk_size_limited(self):
+        """Test that chunks fit within SQLite's parameter limit"""
+        chunks = Bounce.objects.all()._chunks(
+            ['{0}@example.com'.format(i) for i in range(5000)], None)
+        self.assertTrue(all(len(chunk) < 999 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 5000)
+
+
+
+@override_settings(BOUNCY_DATABASES={'Bounce': ['default', 'other']})
+class ShardedFeedbackQuerySetTest(BouncyTestCase):
+    """Test the batched address lookups on a sharded model"""
+    multi_db = True
+
+    def setUp(self):
+        """Store two bounces for each address on the shard it hashes to"""
+        self.bounces = list(FeedbackFactory(end=END).build('bounce', 40))
+        for bounce in self.bounces:
+            bounce.save(using=shard_for(Bounce, bounce.address))
+        for bounce in self.bounces:
+            # A second, later record for every address
+            bounce.pk = None
+            bounce.save(using=shard_for(Bounce, bounce.address))
+        self.addresses = set(bounce.address for bounce in self.bounces)
+
+    def test_addresses_on_both_shards(self):
+        """Test that the addresses are spread over both shards"""
+        self.assertEqual(
+            set(shard_for(Bounce, address) for address in self.addresses),
+            set(['default', 'other']))
+
+    def test_latest_for(self):
+        """Test that each address is looked up on its own shard"""
+        latest = Bounce.objects.latest_for(self.addresses, chunk_size=5)
+        self.assertEqual(set(latest), self.addresses)
+        for address, bounce in latest.items():
+            self.assertEqual(bounce._state.db, shard_for(Bounce, address))
+            self.assertEqual(bounce.pk, Bounce.objects.using(
+                bounce._state.db).filter(address=address).latest('pk').pk)
+
+    def test_counts_for(self):
+        """Test that records on every shard are counted"""
+        counts = Bounce.objects.counts_for(
+            list(self.addresses) + ['nobody@example.com'])
+        expected = {}
+        for bounce in self.bounces:
+            expected[bounce.address] = expected.get(bounce.address, 0) + 2
+        self.assertEqual(counts, expected)
+
+    def test_using_kept(self):
+        """Test that a database chosen with using() is the only one read"""
+        self.assertEqual(
+            set(Bounce.objects.using('other').counts_for(self.addresses)),
+            set(address for address in self.addresses
+                if shard_for(Bounce, address) == 'other'))
+
+
+class ImportCostTest(SimpleTestCase):
+    """Test that loading the app does not import the verification libraries"""
+    def test_models_import_is_light(self):
+        """Test that importing the models leaves OpenSSL, pem and dateutil"""
+        script = (
+            'import sys, django; django.setup(); '
+            'import django_bouncy.models, django_bouncy.views; '
+            'print(\",\".join(sorted(name for name in '
+            '(\"OpenSSL\", \"pem\", \"dateutil\") '
+            'if name in sys.modules)))')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output(
+            [sys.executable, '-c', script], env=env)
+        self.assertEqual(output.strip(), b'')
@@ -0,0 +1,272 @@
+"""Tests for operations.py and backfill.py in the django-bouncy app"""
+import datetime
+import os
+import threading
+import unittest
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, models
+from django.db.models import Sum
+from django.db.migrations.state import ProjectState
+from django.test import TransactionTestCase
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import backfill, operations, stats, views
+from django_bouncy.metrics import clock
+from django_bouncy.models import (
+    Bounce, CounterStart, Delivery, FeedbackStat)
+
+APP_LABEL = 'django_bouncy'
+
+# The size of the synthetic table and the longest a write may wait for a
+# lock in the PostgreSQL tests
+ROWS = int(os.environ.get('BOUNCY_MIGRATION_TEST_ROWS', 200000))
+MAX_LOCK = float(os.environ.get('BOUNCY_MIGRATION_MAX_LOCK', 0.5))
+
+
+def run_operation(operation, backwards=False, atomic=True):
+    """Apply a migration operation to the current models"""
+    state = ProjectState.from_apps(apps)
+    new_state = state.clone()
+    operation.state_forwards(APP_LABEL, new_state)
+    with connection.schema_editor(atomic=atomic) as editor:
+        if backwards:
+            operation.database_backwards(APP_LABEL, editor, new_state, state)
+        else:
+            operation.database_forwards(APP_LABEL, editor, state, new_state)
+
+
+def index_names(model):
+    """Return the names of the indexes on a model's table"""
+    with connection.cursor() as cursor:
+        return set(connection.introspection.get_constraints(
+            cursor, model._meta.db_table))
+
+
+class OperationsTest(TransactionTestCase):
+    """Test that the operations fall back on databases without support"""
+    def setUp(self):
+        """Skip on PostgreSQL, which LargeTableMigrationTest covers"""
+        if connection.vendor == 'postgresql':
+            self.skipTest('Covered By LargeTableMigrationTest')
+
+    def test_add_index_concurrently(self):
+        """Test that the index is added and removed normally"""
+        operation = operations.AddIndexConcurrently(
+            'delivery', models.Index(
+                fields=['smtp_response'], name='bouncy_test_smtp_idx'))
+        self.assertEqual(
+            operation.describe(),
+            'Concurrently create index bouncy_test_smtp_idx on delivery')
+
+        run_operation(operation)
+        self.assertIn('bouncy_test_smtp_idx', index_names(Delivery))
+        run_operation(operation, backwards=True)
+        self.assertNotIn('bouncy_test_smtp_idx', index_names(Delivery))
+
+    def test_check_constraint_skipped(self):
+        """Test that constraint steps are skipped and serialize"""
+        add = operations.AddCheckNotValid(
+            'delivery', 'bouncy_test_check', '"processing_time" >= 0')
+        validate = operations.ValidateConstraint(
+            'delivery', 'bouncy_test_check')
+        run_operation(add)
+        run_operation(validate)
+        run_operation(add, backwards=True)
+
+        name, args, kwargs = add.deconstruct()
+        self.assertEqual(name, 'AddCheckNotValid')
+        self.assertEqual(list(args), [
+            'delivery', 'bouncy_test_check', '"processing_time" >= 0'])
+        self.assertEqual(kwargs, {})
+        self.assertEqual(list(validate.deconstruct()[1]), [
+            'delivery', 'bouncy_test_check'])
+
+
+class BackfillTest(BouncyTestCase):
+    """Test chunked backfills"""
+    def setUp(self):
+        """Store two bounces without categories"""
+        views.process_message(self.bounce, self.notification)
+        Bounce.objects.update(category=None)
+
+    def test_backfill(self):
+        """Test that each chunk is passed to the function in key order"""
+        chunks = []
+        progress = []
+        total, last = backfill.backfill(
+            Bounce.objects.all(), lambda chunk: chunks.append(
+                list(chunk.values_list('pk', flat=True))),
+            chunk_size=1, progress=lambda *args: progress.append(args))
+
+        pks = sorted(Bounce.objects.values_list('pk', flat=True))
+        self.assertEqual((total, last), (2, pks[-1]))
+        self.assertEqual(chunks, [[pks[0]], [pks[1]]])
+        self.assertEqual(progress, [(1, pks[0]), (2, pks[1])])
+
+        # Resuming after the last key has nothing left to do
+        self.assertEqual(backfill.backfill(
+            Bounce.objects.all(), chunks.append, start=last), (0, last))
+
+    def test_command(self):
+        """Test that the command runs a named backfill"""
+        output = StringIO()
+        call_command(
+            'bouncy_backfill', 'bounce-category', chunk_size=1,
+            stdout=output)
+        self.assertIn('Backfilled 2 Bounce Row(s) On default',
+                      output.getvalue())
+        self.assertEqual(
+            Bounce.objects.get(address='recipient1@example.com').category,
+            'mailbox_unknown')
+
+        with self.assertRaises(CommandError):
+            call_command('bouncy_backfill', 'feedback-stats', start=1)
+
+    def test_counted_rows_left_out(self):
+        """Test that rows counted as they were stored aren't counted again"""
+        def counted():
+            """Return the number of bounces in the hourly stats"""
+            return FeedbackStat.objects.filter(
+                resolution='hour', kind='bounce').aggregate(
+                    total=Sum('count'))['total'] or 0
+
+        self.assertEqual(counted(), 2)
+        start = Bounce.objects.earliest('created_at').created_at
+        CounterStart.objects.update_or_create(
+            counters='feedback-stats', defaults={'started_at': start})
+        self.assertEqual(backfill.counted_since('feedback-stats'), start)
+        output = StringIO()
+        call_command('bouncy_backfill', 'feedback-stats', stdout=output)
+        self.assertIn('Backfilled 0 Bounce Row(s)', output.getvalue())
+        self.assertEqual(counted(), 2)
+
+        # Without the recorded start, the first hour is used even once it
+        # has been rolled up into a day starting earlier
+        CounterStart.objects.all().delete()
+        hour = FeedbackStat.objects.get(kind='bounce').bucket
+        stats.rollup(now=hour + datetime.timedelta(days=1))
+        self.assertTrue(FeedbackStat.objects.filter(
+            resolution='day', bucket=stats.period_start(hour, 'day')).exists())
+        self.assertEqual(backfill.counted_since('feedback-stats'), hour)
+        call_command('bouncy_backfill', 'feedback-stats', stdout=output)
+        self.assertEqual(counted(), 2)
+
+        # Without any counters every row is counted
+        FeedbackStat.objects.all().delete()
+        self.assertIsNone(backfill.counted_since('feedback-stats'))
+        call_command('bouncy_backfill', 'feedback-stats', stdout=output)
+        self.assertEqual(counted(), 2)
+
+        # An explicit end overrides the first counted hour
+        call_command(
+            'bouncy_backfill', 'feedback-stats', stdout=output,
+            end=Bounce.objects.latest('created_at').created_at)
+        self.assertEqual(counted(), 2 + Bounce.objects.filter(
+            created_at__lt=Bounce.objects.latest(
+                'created_at').created_at).count())
+
+
+class WriteProbe(threading.Thread):
+    """Insert deliveries in a loop and record how long each insert takes"""
+    def __init__(self, interval=0.01):
+        super(WriteProbe, self).__init__()
+        self.daemon = True
+        self.interval = interval
+        self.latencies = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        """Insert until stopped, on this thread's own connection"""
+        try:
+            while not self.stopped.is_set():
+                start = clock()
+                Delivery.objects.create(
+                    sns_topic='probe', sns_messageid='probe',
+                    mail_timestamp='2020-01-01T00:00:00Z', mail_id='probe',
+                    mail_from='probe@example.com',
+                    address='probe@example.com')
+                self.latencies.append(clock() - start)
+                self.stopped.wait(self.interval)
+        finally:
+            connections.close_all()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.join()
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Lock Tests Need PostgreSQL')
+class LargeTableMigrationTest(TransactionTestCase):
+    """
+    Test that the operations don't block writes to a large table
+
+    Each test fills the Delivery table with BOUNCY_MIGRATION_TEST_ROWS rows,
+    then runs a step while another connection keeps inserting deliveries.
+    No insert may wait longer than BOUNCY_MIGRATION_MAX_LOCK seconds.
+    """
+    def setUp(self):
+        """Fill the Delivery table with synthetic rows"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {0} (created_at, modified_at, sns_topic, '
+                'sns_messageid, mail_timestamp, mail_id, mail_from, address, '
+                'processing_time, smtp_response) '
+                "SELECT now(), now(), 'topic', 'message' || g, now(), "
+                "'mail' || g, 'sender@example.com', "
+                "'recipient' || g || '@example.com', g %% 5000, '250 Ok' "
+                'FROM generate_series(1, %s) AS g'.format(
+                    connection.ops.quote_name(Delivery._meta.db_table)),
+                [ROWS])
+            cursor.execute('ANALYZE {0}'.format(
+                connection.ops.quote_name(Delivery._meta.db_table)))
+
+    def assertWritesNotBlocked(self, probe):
+        """Assert that no insert waited longer than MAX_LOCK"""
+        # pylint: disable=invalid-name
+        self.assertTrue(probe.latencies)
+        self.assertLess(max(probe.latencies), MAX_LOCK)
+
+    def test_add_index_concurrently(self):
+        """Test that an index is built without blocking writes"""
+        operation = operations.AddIndexConcurrently(
+            'delivery', models.Index(
+                fields=['smtp_response'], name='bouncy_test_smtp_idx'))
+        with self.assertRaises(ValueError):
+            run_operation(operation)
+
+        with WriteProbe() as probe:
+            run_operation(operation, atomic=False)
+        self.assertWritesNotBlocked(probe)
+        self.assertIn('bouncy_test_smtp_idx', index_names(Delivery))
+        run_operation(operation, backwards=True, atomic=False)
+
+    def test_check_then_validate(self):
+        """Test that a check constraint is added and validated"""
+        add = operations.AddCheckNotValid(
+            'delivery', 'bouncy_test_check', '"processing_time" >= 0')
+        with WriteProbe() as probe:
+            run_operation(add)
+            run_operation(operations.ValidateConstraint(
+                'delivery', 'bouncy_test_check'))
+        self.assertWritesNotBlocked(probe)
+        self.assertIn('bouncy_test_check', index_names(Delivery))
+        run_operation(add, backwards=True)
+
+    def test_chunked_backfill(self):
+        """Test that a backfill of every row doesn't block writes"""
+        with WriteProbe() as probe:
+            total, _ = backfill.backfill(
+                Delivery.objects.all(), lambda chunk: chunk.update(
+                    processing_time=models.F('processing_time') + 1),
+                chunk_size=5000)
+        self.assertWritesNotBlocked(probe)
+        self.assertGreaterEqual(total, ROWS)
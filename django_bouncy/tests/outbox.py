@@ -0,0 +1,109 @@
+"""Tests for outbox.py and sinks.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import outbox, sinks, views
+from django_bouncy.models import Bounce, DeadLetter, OutboxEvent
+
+
+@override_settings(BOUNCY_OUTBOX=True)
+class OutboxTest(BouncyTestCase):
+    """Test writing and relaying outbox events"""
+    def setUp(self):
+        """Store two bounces with their outbox events"""
+        views.process_message(self.bounce, self.notification)
+
+    def test_events_written_with_feedback(self):
+        """Test that an event is stored for each record"""
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+        payload = json.loads(OutboxEvent.objects.first().payload)
+        self.assertEqual(payload['type'], 'bounce')
+        self.assertIn(payload['id'], Bounce.objects.values_list(
+            'pk', flat=True))
+
+    @override_settings(BOUNCY_OUTBOX=False)
+    def test_disabled(self):
+        """Test that no events are stored unless the outbox is on"""
+        views.process_message(self.bounce, self.notification)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_relay(self):
+        """Test that delivered events are removed from the outbox"""
+        sink = sinks.MemorySink()
+        relay = outbox.OutboxRelay(sink, batch_size=1)
+        self.assertEqual(relay.relay(), 1)
+        self.assertEqual(relay.relay(), 1)
+        self.assertEqual(relay.relay(), 0)
+        self.assertEqual(len(sink.events), 2)
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+
+    def test_claimed_while_sending(self):
+        """Test that a batch is claimed before it is sent"""
+        due = []
+
+        class CheckingSink(sinks.MemorySink):
+            """Sink that counts the events still due while it sends"""
+            def send(self, events):
+                due.append(OutboxEvent.objects.filter(
+                    next_attempt_at__lte=timezone.now()).count())
+                super(CheckingSink, self).send(events)
+
+        relay = outbox.OutboxRelay(CheckingSink(), claim_timeout=60)
+        self.assertEqual(relay.relay(), 2)
+        self.assertEqual(due, [0])
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+
+    def test_retry_with_backoff(self):
+        """Test that failed events are retried later"""
+        relay = outbox.OutboxRelay(sinks.MemorySink(fail=True), backoff=60)
+        self.assertEqual(relay.relay(), 2)
+        # Nothing is due until the backoff has passed
+        self.assertEqual(relay.relay(), 0)
+        event = OutboxEvent.objects.first()
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, 'MemorySink Set To Fail')
+
+    def test_dead_letter(self):
+        """Test that events that keep failing are moved to DeadLetter"""
+        relay = outbox.OutboxRelay(
+            sinks.MemorySink(fail=True), max_attempts=2, backoff=0)
+        relay.relay()
+        relay.relay()
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+        self.assertEqual(DeadLetter.objects.count(), 2)
+        self.assertEqual(DeadLetter.objects.first().attempts, 2)
+
+    def test_command(self):
+        """Test the bouncy_outbox_relay command with a file sink"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.jsonl')
+
+        out = StringIO()
+        with override_settings(BOUNCY_OUTBOX_SINK_OPTIONS={'path': path}):
+            call_command(
+                'bouncy_outbox_relay', sink='django_bouncy.sinks.FileSink',
+                once=True, stdout=out)
+
+        self.assertIn('Relayed 2 Outbox Event(s)', out.getvalue())
+        with open(path) as events:
+            self.assertEqual(len(events.readlines()), 2)
+
+
+class WebhookSinkTest(BouncyTestCase):
+    """Test the WebhookSink class"""
+    def test_connection_refused(self):
+        """Test that an unreachable webhook raises SinkError"""
+        sink = sinks.WebhookSink('http://127.0.0.1:1/events', timeout=1)
+        with self.assertRaises(sinks.SinkError):
+            sink.send([{'type': 'bounce'}])
+        self.assertIsNone(sink._connection)
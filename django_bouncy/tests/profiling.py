@@ -0,0 +1,64 @@
+"""Tests for profiling.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import json
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.conf import settings
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import profiling, views
+
+
+class SampledProfileTest(BouncyTestCase):
+    """Test the sampling profiler"""
+    def setUp(self):
+        """Create a temporary profile directory"""
+        self.directory = tempfile.mkdtemp()
+        self.request = RequestFactory().post('/')
+        self.request.META['HTTP_X_AMZ_SNS_TOPIC_ARN'] = \
+            settings.BOUNCY_TOPIC_ARN[0]
+        self.request._body = json.dumps(self.notification)
+
+    def tearDown(self):
+        """Remove the temporary profile directory"""
+        shutil.rmtree(self.directory)
+
+    def test_not_sampled_by_default(self):
+        """Test that no profiles are saved unless a rate is configured"""
+        with override_settings(BOUNCY_PROFILE_DIR=self.directory):
+            views.endpoint(self.request)
+        self.assertEqual(profiling.profile_paths(self.directory), [])
+
+    def test_sampled_request_saved(self):
+        """Test that a sampled request saves its profile"""
+        with override_settings(BOUNCY_PROFILE_DIR=self.directory,
+                               BOUNCY_PROFILE_SAMPLE_RATE=1):
+            result = views.endpoint(self.request)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(profiling.profile_paths(self.directory)), 1)
+
+    def test_disk_cap(self):
+        """Test that old profiles are removed once over the cap"""
+        with override_settings(BOUNCY_PROFILE_DIR=self.directory,
+                               BOUNCY_PROFILE_SAMPLE_RATE=1,
+                               BOUNCY_PROFILE_MAX_BYTES=0):
+            views.endpoint(self.request)
+        self.assertEqual(profiling.profile_paths(self.directory), [])
+
+    def test_summary_command(self):
+        """Test that the summary command merges saved profiles"""
+        with override_settings(BOUNCY_PROFILE_DIR=self.directory,
+                               BOUNCY_PROFILE_SAMPLE_RATE=1):
+            views.endpoint(self.request)
+            views.endpoint(self.request)
+
+        output = StringIO()
+        call_command(
+            'bouncy_profile_summary', self.directory, limit=5, stdout=output)
+        self.assertIn('Merged 2 Profile(s)', output.getvalue())
+        self.assertIn('process_bounce', output.getvalue())
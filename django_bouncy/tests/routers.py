@@ -0,0 +1,147 @@
+"""Tests for routers.py and queries.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import threading
+
+from django.core.cache import caches
+from django.test.utils import override_settings
+try:
+    # Python 2.6/2.7
+    from mock import Mock
+except ImportError:
+    # Python 3
+    from mock import Mock
+
+from django_bouncy.tests.helpers import BouncyTestCase, loader
+from django_bouncy import queries, routers, views
+from django_bouncy.models import Bounce, Complaint, Delivery
+
+SHARDED = {'Delivery': ['shard0', 'shard1', 'shard2'], 'Bounce': 'feedback'}
+
+
+@override_settings(BOUNCY_DATABASES=SHARDED)
+class BouncyRouterTest(BouncyTestCase):
+    """Test the BouncyRouter class"""
+    def setUp(self):
+        """Setup the test"""
+        self.router = routers.BouncyRouter()
+
+    def test_shard_stable(self):
+        """Test that an address always maps to the same shard"""
+        self.assertEqual(
+            routers.shard_for(Delivery, 'Someone@Example.com '),
+            routers.shard_for(Delivery, 'someone@example.com'))
+        shards = set(
+            routers.shard_for(Delivery, 'user{0}@example.com'.format(i))
+            for i in range(100))
+        self.assertEqual(shards, set(SHARDED['Delivery']))
+
+    def test_db_for_write(self):
+        """Test that writes follow the instance's address"""
+        delivery = Delivery(address='someone@example.com')
+        self.assertEqual(
+            self.router.db_for_write(Delivery, instance=delivery),
+            routers.shard_for(Delivery, 'someone@example.com'))
+        self.assertEqual(self.router.db_for_write(Delivery), 'shard0')
+        self.assertEqual(self.router.db_for_write(Bounce), 'feedback')
+        self.assertIsNone(self.router.db_for_write(Complaint))
+
+    def test_allow_migrate(self):
+        """Test that tables are only created where they're routed"""
+        self.assertTrue(
+            self.router.allow_migrate('shard1', 'django_bouncy', 'delivery'))
+        self.assertFalse(
+            self.router.allow_migrate('default', 'django_bouncy', 'delivery'))
+        self.assertTrue(
+            self.router.allow_migrate('default', 'django_bouncy', 'complaint'))
+        self.assertFalse(
+            self.router.allow_migrate('feedback', 'auth', 'user'))
+        self.assertIsNone(
+            self.router.allow_migrate('default', 'auth', 'user'))
+
+
+class QueriesTest(BouncyTestCase):
+    """Test the routed query helpers"""
+    def setUp(self):
+        """Store a bounce and a delivery for the same address"""
+        self.address = 'recipient1@example.com'
+        delivery = loader('delivery')
+        delivery['delivery']['recipients'] = [self.address]
+        views.process_message(self.bounce, self.notification)
+        views.process_message(delivery, self.notification)
+
+    def test_address_history(self):
+        """Test that every kind of feedback is returned for an address"""
+        history = queries.address_history(self.address.upper())
+        self.assertEqual(
+            sorted(type(record).__name__ for record in history),
+            ['Bounce', 'Delivery'])
+
+    def test_suppressed(self):
+        """Test that hard bounced addresses are suppressed"""
+        Bounce.objects.update(hard=True)
+        self.assertEqual(
+            queries.suppressed([self.address, 'other@example.com']),
+            set([routers.normalize_address(self.address)]))
+
+        Bounce.objects.update(hard=False)
+        self.assertEqual(queries.suppressed([self.address]), set())
+
+    def test_for_each_shard(self):
+        """Test that per-shard results are returned in order"""
+        self.assertEqual(
+            queries.for_each_shard(Bounce, lambda queryset: queryset.count()),
+            [2])
+
+    def test_scatter_parallel(self):
+        """Test that calls to different databases run in other threads"""
+        main = threading.current_thread()
+        results = queries.scatter([
+            ('a', lambda: (1, threading.current_thread() is main)),
+            ('b', lambda: (2, threading.current_thread() is main)),
+        ])
+        self.assertEqual(results, [(1, False), (2, False)])
+
+
+@override_settings(
+    BOUNCY_READ_DATABASES={'default': 'replica'},
+    DATABASE_ROUTERS=['django_bouncy.routers.BouncyRouter'])
+class ReadReplicaTest(BouncyTestCase):
+    """Test reading from replicas with read-your-writes"""
+    def setUp(self):
+        """Setup the test"""
+        caches['default'].clear()
+        self.router = routers.BouncyRouter()
+
+    def test_reads_go_to_replica(self):
+        """Test that reads use the replica and writes the primary"""
+        self.assertEqual(self.router.db_for_read(Bounce), 'replica')
+        self.assertIsNone(self.router.db_for_write(Bounce))
+        self.assertEqual(Bounce.objects.all().db, 'replica')
+        other = Mock()
+        other._meta.app_label = 'other'
+        self.assertIsNone(self.router.db_for_read(other))
+
+    def test_read_your_writes(self):
+        """Test that a recently written address is read from the primary"""
+        bounce = Bounce(address='Someone@example.com')
+        self.assertEqual(
+            self.router.db_for_read(Bounce, instance=bounce), 'replica')
+        routers.record_writes([bounce.address])
+        self.assertEqual(
+            routers.recently_written(['someone@EXAMPLE.com', 'x@y.com']),
+            set(['someone@example.com']))
+        self.assertEqual(
+            self.router.db_for_read(Bounce, instance=bounce), 'default')
+
+    def test_replica_instance_saved_to_primary(self):
+        """Test that an instance read from a replica isn't written back"""
+        bounce = Bounce(address='someone@example.com')
+        bounce._state.db = 'replica'
+        self.assertEqual(
+            self.router.db_for_write(Bounce, instance=bounce), 'default')
+
+    def test_history_after_write(self):
+        """Test that history just written is read from the primary"""
+        views.process_message(self.bounce, self.notification)
+        history = queries.address_history('recipient1@example.com')
+        self.assertEqual(len(history), 1)
@@ -0,0 +1,155 @@
+"""Tests for simulator.py in the django-bouncy app"""
+# pylint: disable=protected-access
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import RequestFactory
+from django.utils.six import StringIO
+
+from django_bouncy.tests.helpers import BouncyTestCase, SignedBouncyTestCase
+from django_bouncy import signals, simulator, utils, views
+from django_bouncy.models import Bounce, Delivery
+
+
+class SimulatorTest(BouncyTestCase):
+    """Test the synthetic notification helpers"""
+    @classmethod
+    def setUpClass(cls):
+        """Generate one key for the whole test case"""
+        super(SimulatorTest, cls).setUpClass()
+        cls.key, cls.certificate = simulator.generate_certificate(1024)
+
+    def test_build_message(self):
+        """Test that messages have the requested number of recipients"""
+        bounce = simulator.build_message('bounce', 3)
+        complaint = simulator.build_message('complaint', 2)
+        delivery = simulator.build_message('delivery', 4)
+
+        self.assertEqual(len(bounce['bounce']['bouncedRecipients']), 3)
+        self.assertEqual(
+            len(complaint['complaint']['complainedRecipients']), 2)
+        self.assertEqual(len(delivery['delivery']['recipients']), 4)
+
+        with self.assertRaises(ValueError):
+            simulator.build_message('not a kind')
+
+    def test_signed_notification_verifies(self):
+        """Test that a signed notification passes verify_notification"""
+        with simulator.CertificateServer(self.certificate) as server:
+            notification = simulator.build_notification(
+                simulator.build_message('bounce'), self.key, server.url)
+            self.assertTrue(utils.verify_notification(notification))
+
+            notification['Message'] = 'Tampered'
+            self.assertFalse(utils.verify_notification(notification))
+            self.assertEqual(server.requests, 1)
+
+    def test_percentile(self):
+        """Test the percentile helper"""
+        values = list(range(101))
+        self.assertEqual(simulator.percentile(values, 50), 50)
+        self.assertEqual(simulator.percentile(values, 99), 99)
+        self.assertIsNone(simulator.percentile([], 50))
+
+
+class BenchmarkCommandTest(BouncyTestCase):
+    """Test the bouncy_benchmark command"""
+    def test_results_written(self):
+        """Test that results are written and benchmark rows rolled back"""
+        original_count = Bounce.objects.count()
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            call_command(
+                'bouncy_benchmark', recipients='2', iterations=2,
+                output=path, stdout=StringIO())
+            with open(path) as output:
+                report = json.load(output)
+        finally:
+            os.remove(path)
+
+        names = set(result['name'] for result in report['results'])
+        self.assertEqual(names, set([
+            'clean_time', 'verify_notification', 'endpoint',
+            'process_bounce', 'process_complaint', 'process_delivery']))
+        self.assertEqual(Bounce.objects.count(), original_count)
+
+
+class BenchmarkDatabaseTest(BouncyTestCase):
+    """Test the bouncy_benchmark command against another database"""
+    multi_db = True
+
+    def test_other_database(self):
+        """Test that rows are written to, and rolled back on, the alias"""
+        stored = []
+
+        def store(instance, **kwargs):
+            """Remember the database each instance was stored in"""
+            # pylint: disable=unused-argument
+            stored.append(instance._state.db)
+
+        signals.feedback.connect(store)
+        try:
+            call_command(
+                'bouncy_benchmark', recipients='1', iterations=1,
+                database='other', stdout=StringIO())
+        finally:
+            signals.feedback.disconnect(store)
+
+        self.assertTrue(stored)
+        self.assertEqual(set(stored), set(['other']))
+        for alias in ('default', 'other'):
+            self.assertEqual(Bounce.objects.using(alias).count(), 0)
+            self.assertEqual(Delivery.objects.using(alias).count(), 0)
+
+
+class LoadGeneratorTest(SignedBouncyTestCase):
+    """Test the LoadGenerator against the endpoint"""
+    def setUp(self):
+        """Share the test connection with the LoadGenerator threads"""
+        self.factory = RequestFactory()
+        self.connection = connections['default']
+        self.connection.inc_thread_sharing()
+
+    def tearDown(self):
+        """Stop sharing the test connection"""
+        self.connection.dec_thread_sharing()
+
+    def post(self, url, notification, timeout):
+        """Deliver a notification straight to the endpoint view"""
+        # pylint: disable=unused-argument
+        # Use the test's connection, as LiveServerTestCase does, so the
+        # thread sees the test transaction
+        connections['default'] = self.connection
+        request = self.factory.post(
+            url, json.dumps(notification), content_type='text/plain',
+            HTTP_X_AMZ_SNS_TOPIC_ARN=notification['TopicArn'])
+        return views.endpoint(request).status_code
+
+    def test_signed_notifications_delivered(self):
+        """Test that signed notifications pass verification"""
+        notifications = [
+            self.signed_notification('delivery', 2) for _ in range(3)]
+        report = simulator.LoadGenerator(
+            '/', notifications, concurrency=1, post=self.post).run()
+
+        self.assertEqual(report['delivered'], 3)
+        self.assertEqual(report['attempts'], 3)
+        self.assertEqual(report['statuses'], {'200': 3})
+        self.assertEqual(Delivery.objects.count(), 6)
+
+    def test_retries_amplify_load(self):
+        """Test that rejected notifications are retried like SNS"""
+        notification = self.signed_notification()
+        notification['Message'] = 'Tampered'
+        report = simulator.LoadGenerator(
+            '/', [notification], concurrency=2, retries=2, retry_delay=0,
+            post=self.post).run()
+
+        self.assertEqual(report['attempts'], 3)
+        self.assertEqual(report['failed'], 1)
+        self.assertEqual(report['amplification'], 3.0)
+        self.assertEqual(report['statuses'], {'400': 3})
@@ -0,0 +1,136 @@
+"""Tests for stats.py in the django-bouncy app"""
+import datetime
+import json
+
+from django.core.cache import caches
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from django_bouncy.tests.helpers import BouncyTestCase
+from django_bouncy import stats, views
+from django_bouncy.models import FeedbackStat
+
+
+class StatsTest(BouncyTestCase):
+    """Test the pre-aggregated feedback stats"""
+    def setUp(self):
+        """Store two bounces and a complaint"""
+        caches['default'].clear()
+        views.process_message(self.bounce, self.notification)
+        views.process_message(self.complaint, self.notification)
+        self.now = timezone.now()
+
+    def test_period_start(self):
+        """Test that times are rounded down to their period"""
+        time = datetime.datetime(2020, 1, 16, 10, 30)
+        self.assertEqual(
+            stats.period_start(time, 'hour'),
+            datetime.datetime(2020, 1, 16, 10))
+        self.assertEqual(
+            stats.period_start(time, 'day'), datetime.datetime(2020, 1, 16))
+        self.assertEqual(
+            stats.period_start(time, 'week'), datetime.datetime(2020, 1, 13))
+
+    def test_recorded_at_ingestion(self):
+        """Test that stored feedback is counted in hourly stats"""
+        stat = FeedbackStat.objects.get(kind='bounce')
+        self.assertEqual(stat.resolution, 'hour')
+        self.assertEqual(stat.count, 2)
+        self.assertEqual(stat.feedback_type, 'Permanent')
+
+        views.process_message(self.bounce, self.notification)
+        self.assertEqual(FeedbackStat.objects.get(kind='bounce').count, 4)
+
+    def test_series(self):
+        """Test that counts are returned for every period"""
+        result = stats.series('hour', end=self.now)
+        self.assertEqual(len(result['periods']), 49)
+        self.assertEqual(result['series']['bounce'][-1], 2)
+        self.assertEqual(result['series']['complaint'][-1], 1)
+        self.assertEqual(sum(result['series']['bounce']), 2)
+
+        result = stats.series('hour', end=self.now, group_by='type')
+        self.assertEqual(
+            sorted(result['series']),
+            ['bounce/Permanent', 'complaint/abuse'])
+
+    def test_bad_series(self):
+        """Test that bad arguments are refused"""
+        self.assertRaises(ValueError, stats.series, 'minute')
+        self.assertRaises(ValueError, stats.series, group_by='address')
+        self.assertRaises(
+            ValueError, stats.series, 'hour',
+            self.now - datetime.timedelta(days=365), self.now)
+
+    @override_settings(BOUNCY_STATS_HOURLY_RETENTION=2)
+    def test_rollup(self):
+        """Test that finished days are downsampled and old hours deleted"""
+        FeedbackStat.objects.filter(kind='bounce').update(
+            bucket=stats.period_start(
+                self.now - datetime.timedelta(days=3), 'hour'))
+        self.assertEqual(stats.rollup(self.now), 1)
+
+        day = FeedbackStat.objects.get(resolution='day')
+        self.assertEqual(day.kind, 'bounce')
+        self.assertEqual(day.count, 2)
+        self.assertEqual(
+            list(FeedbackStat.objects.filter(resolution='hour').values_list(
+                'kind', flat=True)), ['complaint'])
+
+        # Rolling up again doesn't count the days twice
+        stats.rollup(self.now)
+        result = stats.series('day', end=self.now)
+        self.assertEqual(sum(result['series']['bounce']), 2)
+        self.assertEqual(result['series']['complaint'][-1], 1)
+
+        result = stats.series('week', end=self.now)
+        self.assertEqual(sum(result['series']['bounce']), 2)
+
+    def test_cached_series(self):
+        """Test that series are cached"""
+        first = stats.cached_series('day')
+        views.process_message(self.bounce, self.notification)
+        self.assertEqual(stats.cached_series('day'), first)
+        caches['default'].clear()
+        self.assertEqual(
+            stats.cached_series('day')['series']['bounce'][-1], 4)
+
+
+class StatsEndpointTest(BouncyTestCase):
+    """Test the stats_endpoint view"""
+    def setUp(self):
+        """Setup the test"""
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        views.process_message(self.bounce, self.notification)
+
+    def test_disabled(self):
+        """Test that the endpoint 404s without BOUNCY_STATS_SECRET"""
+        with self.assertRaises(Http404):
+            views.stats_endpoint(self.factory.get('/stats/'))
+
+    @override_settings(BOUNCY_STATS_SECRET='s3cret')
+    def test_stats(self):
+        """Test that counts are returned as JSON"""
+        result = views.stats_endpoint(self.factory.get(
+            '/stats/', {'resolution': 'day'}, HTTP_X_BOUNCY_TOKEN='s3cret'))
+        self.assertEqual(result.status_code, 200)
+        data = json.loads(result.content.decode('utf-8'))
+        self.assertEqual(data['resolution'], 'day')
+        self.assertEqual(data['series']['bounce'][-1], 2)
+
+    @override_settings(BOUNCY_STATS_SECRET='s3cret')
+    def test_bad_request(self):
+        """Test that bad secrets and parameters are refused"""
+        result = views.stats_endpoint(self.factory.get(
+            '/stats/', HTTP_X_BOUNCY_TOKEN='wrong'))
+        self.assertEqual(result.status_code, 403)
+
+        for params, reason in (({'resolution': 'minute'}, b'Bad Resolution'),
+                               ({'start': 'not a time'}, b'Bad Time')):
+            result = views.stats_endpoint(self.factory.get(
+                '/stats/', params, HTTP_X_BOUNCY_TOKEN='s3cret'))
+            self.assertEqual(result.status_code, 400)
+            self.assertEqual(result.content, reason)
@@ -1,36 +1,35 @@
 """Tests for utils.py in the django-bouncy app"""
-from django.conf import settings
 from django.dispatch import receiver
+from django.test.utils import override_settings
 try:
     # Python 2.6/2.7
-    from mock import Mock, patch
+    from mock import patch
 except ImportError:
     # Python 3
-    from unittest.mock import Mock, patch
+    from unittest.mock import patch
 
 from django_bouncy.tests.helpers import BouncyTestCase, loader
 from django_bouncy import utils, signals
+from django_bouncy.httpclient import Response
+from django_bouncy.models import Bounce, Delivery
 
 
 class TestVerificationSystem(BouncyTestCase):
     """Test the message verification utilities"""
-    @patch('django_bouncy.utils.urlopen')
+    @patch('django_bouncy.utils.get_client')
     def test_grab_keyfile(self, mock):
         """Test the grab_keyfile plugin"""
-        responsemock = Mock()
-        responsemock.read.return_value = self.pemfile
-        mock.return_value = responsemock
+        mock.return_value.get.return_value = Response(200, self.pemfile)
         result = utils.grab_keyfile('http://www.fakeurl.com')
 
-        mock.assert_called_with('http://www.fakeurl.com')
+        mock.return_value.get.assert_called_with('http://www.fakeurl.com')
         self.assertEqual(result, self.pemfile)
 
-    @patch('django_bouncy.utils.urlopen')
+    @patch('django_bouncy.utils.get_client')
     def test_bad_keyfile(self, mock):
         """Test a non-valid keyfile"""
-        responsemock = Mock()
-        responsemock.read.return_value = 'Not A Certificate'
-        mock.return_value = responsemock
+        mock.return_value.get.return_value = Response(
+            200, 'Not A Certificate')
 
         with self.assertRaises(ValueError) as context_manager:
             utils.grab_keyfile('http://www.fakeurl.com')
@@ -38,6 +37,16 @@ class TestVerificationSystem(BouncyTestCase):
         the_exception = context_manager.exception
         self.assertEqual(the_exception.args[0], 'Invalid Certificate File')
 
+    @patch('django_bouncy.utils.get_client')
+    def test_keyfile_error_status(self, mock):
+        """Test that an error response is not parsed as a certificate"""
+        mock.return_value.get.return_value = Response(404, self.pemfile)
+
+        with self.assertRaises(ValueError) as context_manager:
+            utils.grab_keyfile('http://www.fakeurl.com/missing')
+        self.assertEqual(
+            context_manager.exception.args[0], 'Could Not Fetch Certificate')
+
     @patch('django_bouncy.utils.grab_keyfile')
     def test_verify_notification(self, mock):
         """Test the verification of a valid notification"""
@@ -77,21 +86,19 @@ class TestVerificationSystem(BouncyTestCase):
 
 class SubscriptionApprovalTest(BouncyTestCase):
     """Test the approve_subscription function"""
-    @patch('django_bouncy.utils.urlopen')
+    @patch('django_bouncy.utils.get_client')
     def test_approve_subscription(self, mock):
         """Test the subscription approval mechanism"""
-        responsemock = Mock()
-        responsemock.read.return_value = 'Return Value'
-        mock.return_value = responsemock
+        mock.return_value.get.return_value = Response(200, 'Return Value')
         notification = loader('subscriptionconfirmation')
 
         response = utils.approve_subscription(notification)
 
-        mock.assert_called_with(notification['SubscribeURL'])
+        mock.return_value.get.assert_called_with(notification['SubscribeURL'])
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content.decode('ascii'), 'Return Value')
 
-    @patch('django_bouncy.utils.urlopen')
+    @patch('django_bouncy.utils.get_client')
     def test_signal_sent(self, mock):
         """
         Test that the subscription signal was sent
@@ -99,9 +106,7 @@ class SubscriptionApprovalTest(BouncyTestCase):
         Based on http://stackoverflow.com/questions/3817213/
         """
         # pylint: disable=attribute-defined-outside-init, unused-variable
-        responsemock = Mock()
-        responsemock.read.return_value = 'Return Value'
-        mock.return_value = responsemock
+        mock.return_value.get.return_value = Response(200, 'Return Value')
         notification = loader('subscriptionconfirmation')
         self.signal_count = 0
 
@@ -120,11 +125,10 @@ class SubscriptionApprovalTest(BouncyTestCase):
         self.assertEqual(self.signal_result, 'Return Value')
         self.assertEqual(self.signal_notification, notification)
 
+    @override_settings(
+        BOUNCY_SUBSCRIBE_DOMAIN_REGEX=r"sns.[a-z0-9\-]+.amazonaws.com$")
     def test_bad_url(self):
         """Test to make sure an invalid URL isn't requested by our system"""
-        old_setting = getattr(settings, 'BOUNCY_SUBSCRIBE_DOMAIN_REGEX', None)
-        settings.BOUNCY_SUBSCRIBE_DOMAIN_REGEX = \
-            r"sns.[a-z0-9\-]+.amazonaws.com$"
         notification = loader('bounce_notification')
         notification['SubscribeURL'] = 'http://bucket.s3.amazonaws.com'
         result = utils.approve_subscription(notification)
@@ -133,5 +137,31 @@ class SubscriptionApprovalTest(BouncyTestCase):
         self.assertEqual(
             result.content.decode('ascii'), 'Improper Subscription Domain')
 
-        if old_setting is not None:
-            settings.BOUNCY_SUBSCRIBE_DOMAIN_REGEX = old_setting
+
+class ProjectFieldsTest(BouncyTestCase):
+    """Test the project_fields function"""
+    def test_fields_unchanged_by_default(self):
+        """Test that values are passed through when nothing is configured"""
+        values = {'address': 'test@example.com', 'diagnostic_code': 'smtp'}
+        result = utils.project_fields(Bounce, values)
+        self.assertEqual(result, values)
+
+    @override_settings(BOUNCY_EXCLUDE_FIELDS=['diagnostic_code', 'address'])
+    def test_excluded_fields(self):
+        """Test that only optional excluded fields are dropped"""
+        values = {'address': 'test@example.com', 'diagnostic_code': 'smtp'}
+        result = utils.project_fields(Bounce, values)
+        self.assertEqual(result, {'address': 'test@example.com'})
+
+    def test_text_field_max_length_enforced(self):
+        """Test that a text field is truncated to its declared max_length"""
+        result = utils.project_fields(
+            Bounce, {'diagnostic_code': 'x' * 6000})
+        self.assertEqual(len(result['diagnostic_code']), 5000)
+
+    @override_settings(BOUNCY_FIELD_MAX_LENGTHS={'smtp_response': 10})
+    def test_configured_max_length(self):
+        """Test that a configured limit truncates the field"""
+        result = utils.project_fields(
+            Delivery, {'smtp_response': '250 ok:  Message 64111812 accepted'})
+        self.assertEqual(result['smtp_response'], '250 ok:  M')
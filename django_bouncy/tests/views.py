@@ -7,6 +7,7 @@ from django.test.utils import override_settings
 from django.http import Http404
 from django.conf import settings
 from django.dispatch import receiver
+from django.core.cache import caches
 try:
     # Python 2.6/2.7
     from mock import patch
@@ -16,7 +17,8 @@ except ImportError:
     from mock import patch
 
 from django_bouncy.tests.helpers import BouncyTestCase, loader
-from django_bouncy import views, signals
+from django_bouncy import metrics, views, signals
+from django_bouncy.conf import reset_config
 from django_bouncy.utils import clean_time
 from django_bouncy.models import Bounce, Complaint, Delivery
 
@@ -119,18 +121,16 @@ class BouncyEndpointViewTest(BouncyTestCase):
         self.assertEqual(
             result.content.decode('ascii'), 'Improper Certificate Location')
 
+    @override_settings(BOUNCY_AUTO_SUBSCRIBE=False)
     def test_subscription_throws_404(self):
         """
         Test that a subscription request sent to bouncy throws a 404 if not
         permitted
         """
-        original_setting = getattr(settings, 'BOUNCY_AUTO_SUBSCRIBE', True)
-        settings.BOUNCY_AUTO_SUBSCRIBE = False
         with self.assertRaises(Http404):
             notification = loader('subscriptionconfirmation')
             self.request._body = json.dumps(notification)
             views.endpoint(self.request)
-        settings.BOUNCY_AUTO_SUBSCRIBE = original_setting
 
     @patch('django_bouncy.views.approve_subscription')
     def test_approve_subscription_called(self, mock):
@@ -260,6 +260,17 @@ class ProcessBounceTest(BouncyTestCase):
             diagnostic_code='smtp; 550 user unknown'
         ).exists())
 
+    @override_settings(BOUNCY_EXCLUDE_FIELDS=['reporting_mta'])
+    def test_excluded_field_not_stored(self):
+        """Test that an excluded field is not written to the database"""
+        Bounce.objects.all().delete()
+
+        views.process_bounce(self.bounce, self.notification)
+
+        self.assertEqual(Bounce.objects.count(), 2)
+        self.assertFalse(
+            Bounce.objects.filter(reporting_mta__isnull=False).exists())
+
 
 class ProcessComplaintTest(BouncyTestCase):
     """Test the process_complaint function"""
@@ -409,3 +420,59 @@ class ProcessDeliveryTest(BouncyTestCase):
             smtp_response='250 ok:  Message 64111812 accepted'
         ).exists())
 
+
+@override_settings(
+    BOUNCY_DEDUPE_CACHE='default',
+    BOUNCY_METRICS_BACKEND='django_bouncy.metrics.InMemoryMetrics')
+class DuplicateNotificationTest(BouncyTestCase):
+    """Test that retried notifications are acknowledged without work"""
+    def setUp(self):
+        """Setup the test"""
+        caches['default'].clear()
+        # A new metrics backend for each test
+        reset_config()
+        self.factory = RequestFactory()
+
+    def request(self, notification):
+        """Build a request for a notification"""
+        return self.factory.post(
+            '/', json.dumps(notification), content_type='text/plain',
+            HTTP_X_AMZ_SNS_TOPIC_ARN=settings.BOUNCY_TOPIC_ARN[0])
+
+    def test_retry_skipped(self):
+        """Test that the same body is only verified and stored once"""
+        views.endpoint(self.request(self.notification))
+        with patch('django_bouncy.views.check_signature') as mock:
+            result = views.endpoint(self.request(self.notification))
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(
+            result.content.decode('ascii'), 'Duplicate Notification')
+        self.assertFalse(mock.called)
+        self.assertEqual(Bounce.objects.count(), 1)
+        self.assertIn(
+            'bouncy_duplicates_total 1', metrics.get_metrics().render())
+
+    def test_rejected_not_remembered(self):
+        """Test that a rejected body is checked again when retried"""
+        notification = dict(self.notification, Type='Bad')
+        views.endpoint(self.request(notification))
+        result = views.endpoint(self.request(notification))
+        self.assertEqual(result.status_code, 400)
+
+    def test_malformed_rejected_first(self):
+        """Test that malformed bodies are rejected without asking the cache"""
+        with patch('django_bouncy.views.already_processed') as mock:
+            for body in ('not json', json.dumps(
+                    dict(self.notification, Type='Bad'))):
+                request = self.request(self.notification)
+                request._body = body.encode('utf-8')
+                self.assertEqual(views.endpoint(request).status_code, 400)
+        self.assertFalse(mock.called)
+
+    @override_settings(BOUNCY_DEDUPE_CACHE=None)
+    def test_disabled(self):
+        """Test that bodies are processed every time by default"""
+        views.endpoint(self.request(self.notification))
+        views.endpoint(self.request(self.notification))
+        self.assertEqual(Bounce.objects.count(), 2)
@@ -1,8 +1,16 @@
 """URLs for the Django-Bouncy App"""
 from django.conf.urls import url
 # pylint: disable=invalid-name
-from django_bouncy.views import endpoint
+from django_bouncy.views import (
+    endpoint, batch_endpoint, feed_endpoint, prometheus_metrics,
+    stats_endpoint, latency_endpoint
+)
 
 urlpatterns = [
-    url(r'^$', endpoint)
+    url(r'^$', endpoint),
+    url(r'^batch/$', batch_endpoint),
+    url(r'^feed/$', feed_endpoint),
+    url(r'^metrics/$', prometheus_metrics),
+    url(r'^stats/$', stats_endpoint),
+    url(r'^stats/latency/$', latency_endpoint),
 ]
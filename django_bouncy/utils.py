@@ -1,37 +1,31 @@
 # -*- coding: utf-8 -*-
 """Utility functions for the django_bouncy app"""
-try:
-    import urllib2 as urllib
-except ImportError:
-    import urllib
-
-try:
-    # Python 3
-    from urllib.request import urlopen
-except ImportError:
-    # Python 2.7
-    from urllib import urlopen
-
 try:
     from urlparse import urlparse
 except ImportError:
     from urllib.parse import urlparse
 
 import base64
-import re
-import pem
+import hashlib
+import hmac
+import threading
+from multiprocessing.pool import ThreadPool
 import logging
 import six
 
-from OpenSSL import crypto
+# pem, pyOpenSSL and dateutil are slow to import, so they are imported by the
+# functions that use them rather than here
 from django.conf import settings
 from django.core.cache import caches
+from django.db import models
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.utils import timezone
 from django.utils.encoding import smart_bytes
-import dateutil.parser
 
 from django_bouncy import signals
+from django_bouncy.conf import get_config
+from django_bouncy.httpclient import HTTPClientError, get_client
+from django_bouncy.metrics import get_metrics
 
 NOTIFICATION_HASH_FORMAT = u'''Message
 {Message}
@@ -63,6 +57,11 @@ Type
 
 logger = logging.getLogger(__name__)
 
+# Parsed certificates, keyed by their PEM file
+MAX_CERTIFICATES = 64
+_certificates = {}
+_certificates_lock = threading.Lock()
+
 
 def grab_keyfile(cert_url):
     """
@@ -72,11 +71,17 @@ def grab_keyfile(cert_url):
     for all SNS requests. So we need to keep a copy of the cert in our
     cache
     """
-    key_cache = caches[getattr(settings, 'BOUNCY_KEY_CACHE', 'default')]
+    key_cache = caches[get_config().key_cache]
 
     pemfile = key_cache.get(cert_url)
     if not pemfile:
-        response = urlopen(cert_url)
+        import pem
+        response = get_client().get(cert_url)
+        if response.status != 200:
+            logger.error(
+                'Certificate Fetch Failed: URL %s Status %s', cert_url,
+                response.status)
+            raise ValueError('Could Not Fetch Certificate')
         pemfile = response.read()
         # Extract the first certificate in the file and confirm it's a valid
         # PEM certificate
@@ -91,15 +96,76 @@ def grab_keyfile(cert_url):
     return pemfile
 
 
+def load_certificate(pemfile):
+    """
+    Return the parsed certificate in a PEM file
+
+    Parsed certificates are kept in memory, so each process only parses a
+    signing certificate once.
+    """
+    pemfile = smart_bytes(pemfile)
+    cert = _certificates.get(pemfile)
+    if cert is None:
+        from OpenSSL import crypto
+        cert = crypto.load_certificate(crypto.FILETYPE_PEM, pemfile)
+        with _certificates_lock:
+            if len(_certificates) >= MAX_CERTIFICATES:
+                _certificates.clear()
+            _certificates[pemfile] = cert
+    return cert
+
+
+def warm_certificates(cert_urls, concurrency=4):
+    """
+    Fetch, validate and cache the signing certificates at cert_urls
+
+    Each certificate is stored in BOUNCY_KEY_CACHE as grab_keyfile would
+    store it, and parsed into this process's memory. The URLs are fetched
+    concurrently. Returns a dict of each URL that failed to the reason.
+    """
+    from OpenSSL import crypto
+
+    def warm(cert_url):
+        """Warm one certificate and return the reason it failed, if any"""
+        if not get_config().cert_domain_regex.search(
+                urlparse(cert_url).netloc):
+            return cert_url, 'Improper Certificate Location'
+        try:
+            load_certificate(grab_keyfile(cert_url))
+        except (ValueError, HTTPClientError, crypto.Error) as error:
+            return cert_url, str(error) or error.__class__.__name__
+        return cert_url, None
+
+    cert_urls = sorted(set(cert_urls))
+    if not cert_urls:
+        return {}
+    pool = ThreadPool(max(1, min(concurrency, len(cert_urls))))
+    try:
+        results = pool.map(warm, cert_urls)
+    finally:
+        pool.close()
+        pool.join()
+
+    failures = dict(
+        (cert_url, reason) for cert_url, reason in results if reason)
+    for cert_url, reason in failures.items():
+        logger.warning('Unable To Warm Certificate %s: %s', cert_url, reason)
+    return failures
+
+
 def verify_notification(data):
     """
     Function to verify notification came from a trusted source
 
     Returns True if verfied, False if not verified
     """
-    pemfile = grab_keyfile(data['SigningCertURL'])
-    cert = crypto.load_certificate(crypto.FILETYPE_PEM, pemfile)
-    signature = base64.decodestring(six.b(data['Signature']))
+    from OpenSSL import crypto
+
+    metrics = get_metrics()
+    with metrics.timer('bouncy_stage_seconds', stage='keyfile'):
+        pemfile = grab_keyfile(data['SigningCertURL'])
+    cert = load_certificate(pemfile)
+    signature = base64.b64decode(six.b(data['Signature']))
 
     if data['Type'] == "Notification":
         hash_format = NOTIFICATION_HASH_FORMAT
@@ -107,8 +173,9 @@ def verify_notification(data):
         hash_format = SUBSCRIPTION_HASH_FORMAT
 
     try:
-        crypto.verify(
-            cert, signature, six.b(hash_format.format(**data)), 'sha1')
+        with metrics.timer('bouncy_stage_seconds', stage='signature'):
+            crypto.verify(
+                cert, signature, six.b(hash_format.format(**data)), 'sha1')
     except crypto.Error:
         return False
     return True
@@ -124,21 +191,16 @@ def approve_subscription(data):
     url = data['SubscribeURL']
 
     domain = urlparse(url).netloc
-    pattern = getattr(
-        settings,
-        'BOUNCY_SUBSCRIBE_DOMAIN_REGEX',
-        r"sns.[a-z0-9\-]+.amazonaws.com$"
-    )
-    if not re.search(pattern, domain):
+    if not get_config().subscribe_domain_regex.search(domain):
         logger.error('Invalid Subscription Domain %s', url)
         return HttpResponseBadRequest('Improper Subscription Domain')
 
-    try:
-        result = urlopen(url).read()
-        logger.info('Subscription Request Sent %s', url)
-    except urllib.HTTPError as error:
-        result = error.read()
+    response = get_client().get(url)
+    result = response.read()
+    if response.status >= 400:
         logger.warning('HTTP Error Creating Subscription %s', str(result))
+    else:
+        logger.info('Subscription Request Sent %s', url)
 
     signals.subscription.send(
         sender='bouncy_approve_subscription',
@@ -152,6 +214,8 @@ def approve_subscription(data):
 
 def clean_time(time_string):
     """Return a datetime from the Amazon-provided datetime string"""
+    import dateutil.parser
+
     # Get a timezone-aware datetime object from the string
     time = dateutil.parser.parse(time_string)
     if not settings.USE_TZ:
@@ -159,3 +223,84 @@ def clean_time(time_string):
         # remove the timezone field
         time = time.astimezone(timezone.utc).replace(tzinfo=None)
     return time
+
+
+def project_fields(model, values):
+    """
+    Return the subset of ``values`` that should be stored on ``model``
+
+    Optional (nullable) fields listed in ``BOUNCY_EXCLUDE_FIELDS`` are
+    dropped, and string values are truncated to the limit given for that
+    field in ``BOUNCY_FIELD_MAX_LENGTHS``. Text fields without an explicit
+    limit are truncated to their declared ``max_length``, which the database
+    does not enforce for them.
+    """
+    config = get_config()
+    excluded = config.exclude_fields
+    max_lengths = config.field_max_lengths
+
+    projected = {}
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        if field.null and name in excluded:
+            continue
+
+        if isinstance(value, six.string_types):
+            if name in max_lengths:
+                limit = max_lengths[name]
+            elif isinstance(field, models.TextField):
+                limit = field.max_length
+            else:
+                limit = None
+            if limit is not None and len(value) > limit:
+                value = value[:limit]
+
+        projected[name] = value
+    return projected
+
+
+def check_shared_secret(request, secret):
+    """
+    Return True if a request proves it knows the shared secret
+
+    The request must either send the secret itself in the X-Bouncy-Token
+    header, or send the hex HMAC-SHA256 of its body, keyed with the secret,
+    in the X-Bouncy-Signature header.
+    """
+    token = request.META.get('HTTP_X_BOUNCY_TOKEN')
+    if token is not None:
+        return hmac.compare_digest(smart_bytes(token), smart_bytes(secret))
+
+    signature = request.META.get('HTTP_X_BOUNCY_SIGNATURE')
+    if signature is not None:
+        expected = hmac.new(
+            smart_bytes(secret), request.body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(
+            smart_bytes(signature), smart_bytes(expected))
+
+    return False
+
+
+def body_digest(body):
+    """Return the SHA-256 hex digest of a raw request body"""
+    return hashlib.sha256(smart_bytes(body)).hexdigest()
+
+
+def already_processed(digest):
+    """
+    Return True if a body with this digest was verified and processed
+
+    Always returns False unless BOUNCY_DEDUPE_CACHE is set.
+    """
+    config = get_config()
+    if config.dedupe_cache is None:
+        return False
+    return bool(caches[config.dedupe_cache].get('bouncy-processed-' + digest))
+
+
+def mark_processed(digest):
+    """Remember that a body with this digest was verified and processed"""
+    config = get_config()
+    if config.dedupe_cache is not None:
+        caches[config.dedupe_cache].set(
+            'bouncy-processed-' + digest, True, config.dedupe_ttl)
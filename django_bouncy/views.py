@@ -1,21 +1,43 @@
 """Views for the django_bouncy app"""
+import hashlib
 import json
+import math
+import zlib
 try:
     from urlparse import urlparse
 except ImportError:
     from urllib.parse import urlparse
 
-import re
 import logging
 
-from django.http import HttpResponseBadRequest, HttpResponse, Http404
+import six
+from django.db import router, transaction
+from django.http import (
+    HttpResponseBadRequest, HttpResponseForbidden, HttpResponse, Http404,
+    HttpResponseNotModified, JsonResponse
+)
 from django.views.decorators.csrf import csrf_exempt
-from django.conf import settings
+from django.views.decorators.gzip import gzip_page
 
 from django_bouncy.utils import (
-    verify_notification, approve_subscription, clean_time
+    verify_notification, approve_subscription, clean_time, project_fields,
+    check_shared_secret, body_digest, already_processed, mark_processed
 )
 from django_bouncy.models import Bounce, Complaint, Delivery
+from django_bouncy.conf import get_config
+from django_bouncy.admission import admission_controlled, measure_db_latency
+from django_bouncy.archive import get_archive
+from django_bouncy.bulk import bulk_insert, fetch_pks
+from django_bouncy.classifier import classify
+from django_bouncy.escalation import record_soft_bounces
+from django_bouncy.feed import wait_for_feed
+from django_bouncy.histograms import latency_percentiles, record_latencies
+from django_bouncy.httpclient import HTTPClientError
+from django_bouncy.outbox import enqueue_events
+from django_bouncy.metrics import get_metrics
+from django_bouncy.profiling import profiled
+from django_bouncy.routers import record_writes
+from django_bouncy.stats import cached_series, record_stats
 from django_bouncy import signals
 
 VITAL_NOTIFICATION_FIELDS = [
@@ -31,10 +53,83 @@ VITAL_MESSAGE_FIELDS = [
 ALLOWED_TYPES = [
     'Notification', 'SubscriptionConfirmation', 'UnsubscribeConfirmation'
 ]
+
+_VITAL_NOTIFICATION_KEYS = frozenset(VITAL_NOTIFICATION_FIELDS)
+_VITAL_MESSAGE_KEYS = frozenset(VITAL_MESSAGE_FIELDS)
+_ALLOWED_TYPES = frozenset(ALLOWED_TYPES)
 logger = logging.getLogger(__name__)
 
 
+def bad_request(metrics, reason):
+    """Count a rejected request and return a HttpResponseBadRequest"""
+    metrics.increment('bouncy_rejected_total', reason=reason)
+    return HttpResponseBadRequest(reason)
+
+
+def check_notification(data, metrics, config):
+    """
+    Check that a SNS notification is complete and was signed by Amazon
+
+    Returns None if the notification can be trusted, otherwise the reason it
+    was rejected.
+    """
+    return (check_notification_fields(data, config) or
+            check_signature(data, metrics, config))
+
+
+def check_notification_fields(data, config):
+    """
+    Check the keys, type and certificate location of a SNS notification
+
+    These checks need no network or cache access, so they run before
+    anything slower. Returns None if they pass, otherwise the reason the
+    notification was rejected.
+    """
+    # Ensure that the JSON we're provided contains all the keys we expect
+    # Comparison code from http://stackoverflow.com/questions/1285911/
+    if not _VITAL_NOTIFICATION_KEYS.issubset(data):
+        logger.warning('Request Missing Necessary Keys')
+        return 'Request Missing Necessary Keys'
+
+    # Ensure that the type of notification is one we'll accept
+    if not data['Type'] in _ALLOWED_TYPES:
+        logger.info('Notification Type Not Known %s', data['Type'])
+        return 'Unknown Notification Type'
+
+    # Confirm that the signing certificate is hosted on a correct domain
+    # AWS by default uses sns.{region}.amazonaws.com
+    # On the off chance you need this to be a different domain, allow the
+    # regex to be overridden in settings
+    domain = urlparse(data['SigningCertURL']).netloc
+    if not config.cert_domain_regex.search(domain):
+        logger.warning(
+            'Improper Certificate Location %s', data['SigningCertURL'])
+        return 'Improper Certificate Location'
+
+    return None
+
+
+def check_signature(data, metrics, config):
+    """
+    Check that a SNS notification was signed by Amazon
+
+    Returns None if the signature is good or isn't checked, otherwise the
+    reason the notification was rejected.
+    """
+    # Verify that the notification is signed by Amazon
+    if config.verify_certificate:
+        with metrics.timer('bouncy_stage_seconds', stage='verify'):
+            verified = verify_notification(data)
+        if not verified:
+            logger.error('Verification Failure %s', )
+            return 'Improper Signature'
+
+    return None
+
+
 @csrf_exempt
+@profiled
+@admission_controlled
 def endpoint(request):
     """Endpoint that SNS accesses. Includes logic verifying request"""
     # pylint: disable=too-many-return-statements,too-many-branches
@@ -44,18 +139,21 @@ def endpoint(request):
     if request.method != 'POST':
         raise Http404
 
+    metrics = get_metrics()
+    config = get_config()
+
     # If necessary, check that the topic is correct
-    if hasattr(settings, 'BOUNCY_TOPIC_ARN'):
+    if config.topic_arns is not None:
         # Confirm that the proper topic header was sent
         if 'HTTP_X_AMZ_SNS_TOPIC_ARN' not in request.META:
-            return HttpResponseBadRequest('No TopicArn Header')
+            return bad_request(metrics, 'No TopicArn Header')
 
         # Check to see if the topic is in the settings
         # Because you can have bounces and complaints coming from multiple
         # topics, BOUNCY_TOPIC_ARN is a list
         if (not request.META['HTTP_X_AMZ_SNS_TOPIC_ARN']
-                in settings.BOUNCY_TOPIC_ARN):
-            return HttpResponseBadRequest('Bad Topic')
+                in config.topic_arns):
+            return bad_request(metrics, 'Bad Topic')
 
     # Load the JSON POST Body
     if isinstance(request.body, str):
@@ -64,50 +162,47 @@ def endpoint(request):
     else:
         # and return bytes in python 3.4
         request_body = request.body.decode()
+
     try:
-        data = json.loads(request_body)
+        with metrics.timer('bouncy_stage_seconds', stage='parse'):
+            data = json.loads(request_body)
     except ValueError:
         logger.warning('Notification Not Valid JSON: {}'.format(request_body))
-        return HttpResponseBadRequest('Not Valid JSON')
+        return bad_request(metrics, 'Not Valid JSON')
 
-    # Ensure that the JSON we're provided contains all the keys we expect
-    # Comparison code from http://stackoverflow.com/questions/1285911/
-    if not set(VITAL_NOTIFICATION_FIELDS) <= set(data):
-        logger.warning('Request Missing Necessary Keys')
-        return HttpResponseBadRequest('Request Missing Necessary Keys')
+    reason = check_notification_fields(data, config)
+    if reason is not None:
+        return bad_request(metrics, reason)
 
-    # Ensure that the type of notification is one we'll accept
-    if not data['Type'] in ALLOWED_TYPES:
-        logger.info('Notification Type Not Known %s', data['Type'])
-        return HttpResponseBadRequest('Unknown Notification Type')
+    # SNS retries send byte-identical bodies, so a body that has already been
+    # verified and stored can be acknowledged without doing either again.
+    # The cache is only asked once the cheap checks have passed.
+    digest = body_digest(request.body)
+    if already_processed(digest):
+        metrics.increment('bouncy_duplicates_total')
+        logger.info('Duplicate Notification Acknowledged')
+        return HttpResponse('Duplicate Notification')
 
-    # Confirm that the signing certificate is hosted on a correct domain
-    # AWS by default uses sns.{region}.amazonaws.com
-    # On the off chance you need this to be a different domain, allow the
-    # regex to be overridden in settings
-    domain = urlparse(data['SigningCertURL']).netloc
-    pattern = getattr(
-        settings, 'BOUNCY_CERT_DOMAIN_REGEX', r"sns.[a-z0-9\-]+.amazonaws.com$"
-    )
-    if not re.search(pattern, domain):
-        logger.warning(
-            'Improper Certificate Location %s', data['SigningCertURL'])
-        return HttpResponseBadRequest('Improper Certificate Location')
+    reason = check_signature(data, metrics, config)
+    if reason is not None:
+        return bad_request(metrics, reason)
 
-    # Verify that the notification is signed by Amazon
-    if (getattr(settings, 'BOUNCY_VERIFY_CERTIFICATE', True)
-            and not verify_notification(data)):
-        logger.error('Verification Failure %s', )
-        return HttpResponseBadRequest('Improper Signature')
+    metrics.increment('bouncy_notifications_total', type=data['Type'])
+
+    # Keep a compressed copy of the verified notification for auditing
+    archive = get_archive()
+    if archive is not None:
+        archive.append(data)
 
     # Send a signal to say a valid notification has been received
-    signals.notification.send(
-        sender='bouncy_endpoint', notification=data, request=request)
+    with metrics.timer('bouncy_stage_seconds', stage='signals'):
+        signals.notification.send(
+            sender='bouncy_endpoint', notification=data, request=request)
 
     # Handle subscription-based messages.
     if data['Type'] == 'SubscriptionConfirmation':
         # Allow the disabling of the auto-subscription feature
-        if not getattr(settings, 'BOUNCY_AUTO_SUBSCRIBE', True):
+        if not config.auto_subscribe:
             raise Http404
         return approve_subscription(data)
     elif data['Type'] == 'UnsubscribeConfirmation':
@@ -125,7 +220,10 @@ def endpoint(request):
         logger.info('Non-Valid JSON Message Received')
         return HttpResponse('Message is not valid JSON')
 
-    return process_message(message, data)
+    response = process_message(message, data)
+    if response.status_code == 200:
+        mark_processed(digest)
+    return response
 
 
 def process_message(message, notification):
@@ -134,13 +232,16 @@ def process_message(message, notification):
     """
     # Confirm that there are 'notificationType' and 'mail' fields in our
     # message
-    if not set(VITAL_MESSAGE_FIELDS) <= set(message):
+    if not _VITAL_MESSAGE_KEYS.issubset(message):
         # At this point we're sure that it's Amazon sending the message
         # If we don't return a 200 status code, Amazon will attempt to send us
         # this same message a few seconds later.
         logger.info('JSON Message Missing Vital Fields')
         return HttpResponse('Missing Vital Fields')
 
+    get_metrics().increment(
+        'bouncy_messages_total', type=message['notificationType'])
+
     if message['notificationType'] == 'Complaint':
         return process_complaint(message, notification)
     if message['notificationType'] == 'Bounce':
@@ -151,15 +252,15 @@ def process_message(message, notification):
         return HttpResponse('Unknown Notification Type')
 
 
-def process_bounce(message, notification):
-    """Function to process a bounce notification"""
+def build_bounces(message, notification):
+    """Return an unsaved Bounce for each recipient of a bounce message"""
     mail = message['mail']
     bounce = message['bounce']
 
     bounces = []
     for recipient in bounce['bouncedRecipients']:
-        # Create each bounce record. Add to a list for reference later.
-        bounces += [Bounce.objects.create(
+        # Only keep the fields this project has chosen to store
+        bounces += [Bounce(**project_fields(Bounce, dict(
             sns_topic=notification['TopicArn'],
             sns_messageid=notification['MessageId'],
             mail_timestamp=clean_time(mail['timestamp']),
@@ -174,25 +275,15 @@ def process_bounce(message, notification):
             reporting_mta=bounce.get('reportingMTA'),
             action=recipient.get('action'),
             status=recipient.get('status'),
-            diagnostic_code=recipient.get('diagnosticCode')
-        )]
-
-    # Send signals for each bounce.
-    for bounce in bounces:
-        signals.feedback.send(
-            sender=Bounce,
-            instance=bounce,
-            message=message,
-            notification=notification
-        )
-
-    logger.info('Logged %s Bounce(s)', str(len(bounces)))
-
-    return HttpResponse('Bounce Processed')
+            diagnostic_code=recipient.get('diagnosticCode'),
+            category=classify(
+                recipient.get('status'), recipient.get('diagnosticCode'))
+        )))]
+    return bounces
 
 
-def process_complaint(message, notification):
-    """Function to process a complaint notification"""
+def build_complaints(message, notification):
+    """Return an unsaved Complaint for each recipient of a complaint message"""
     mail = message['mail']
     complaint = message['complaint']
 
@@ -203,8 +294,8 @@ def process_complaint(message, notification):
 
     complaints = []
     for recipient in complaint['complainedRecipients']:
-        # Create each Complaint. Save in a list for reference later.
-        complaints += [Complaint.objects.create(
+        # Only keep the fields this project has chosen to store
+        complaints += [Complaint(**project_fields(Complaint, dict(
             sns_topic=notification['TopicArn'],
             sns_messageid=notification['MessageId'],
             mail_timestamp=clean_time(mail['timestamp']),
@@ -216,24 +307,12 @@ def process_complaint(message, notification):
             useragent=complaint.get('userAgent'),
             feedback_type=complaint.get('complaintFeedbackType'),
             arrival_date=arrival_date
-        )]
-
-    # Send signals for each complaint.
-    for complaint in complaints:
-        signals.feedback.send(
-            sender=Complaint,
-            instance=complaint,
-            message=message,
-            notification=notification
-        )
-
-    logger.info('Logged %s Complaint(s)', str(len(complaints)))
-
-    return HttpResponse('Complaint Processed')
+        )))]
+    return complaints
 
 
-def process_delivery(message, notification):
-    """Function to process a delivery notification"""
+def build_deliveries(message, notification):
+    """Return an unsaved Delivery for each recipient of a delivery message"""
     mail = message['mail']
     delivery = message['delivery']
 
@@ -244,8 +323,8 @@ def process_delivery(message, notification):
 
     deliveries = []
     for eachrecipient in delivery['recipients']:
-        # Create each delivery 
-        deliveries += [Delivery.objects.create(
+        # Only keep the fields this project has chosen to store
+        deliveries += [Delivery(**project_fields(Delivery, dict(
             sns_topic=notification['TopicArn'],
             sns_messageid=notification['MessageId'],
             mail_timestamp=clean_time(mail['timestamp']),
@@ -256,17 +335,442 @@ def process_delivery(message, notification):
             delivered_time=delivered_datetime,
             processing_time=int(delivery['processingTimeMillis']),
             smtp_response=delivery['smtpResponse']
-        )]
+        )))]
+    return deliveries
 
-    # Send signals for each delivery.
-    for eachdelivery in deliveries:
-        signals.feedback.send(
-            sender=Delivery,
-            instance=eachdelivery,
-            message=message,
-            notification=notification
-        )
 
+# The model and builder for each notificationType
+FEEDBACK_BUILDERS = {
+    'Bounce': (Bounce, build_bounces),
+    'Complaint': (Complaint, build_complaints),
+    'Delivery': (Delivery, build_deliveries),
+}
+
+
+def save_feedback(model, instances):
+    """
+    Insert new feedback records, each on the database the router picks
+
+    The records for each database are inserted in one transaction, along
+    with their outbox events if BOUNCY_OUTBOX is set.
+    """
+    by_database = {}
+    for instance in instances:
+        by_database.setdefault(
+            router.db_for_write(model, instance=instance), []).append(instance)
+
+    for alias, rows in by_database.items():
+        with transaction.atomic(using=alias):
+            for instance in rows:
+                instance.save(force_insert=True, using=alias)
+            if get_config().outbox:
+                enqueue_events(rows, alias)
+    record_writes([instance.address for instance in instances])
+    record_stats(instances)
+
+
+def process_bounce(message, notification):
+    """Function to process a bounce notification"""
+    metrics = get_metrics()
+    with metrics.timer('bouncy_stage_seconds', stage='db'), \
+            measure_db_latency():
+        bounces = build_bounces(message, notification)
+        # Create each bounce record.
+        save_feedback(Bounce, bounces)
+        record_soft_bounces(bounces)
+
+    # Send signals for each bounce.
+    with metrics.timer('bouncy_stage_seconds', stage='feedback_signals'):
+        for bounce in bounces:
+            signals.feedback.send(
+                sender=Bounce,
+                instance=bounce,
+                message=message,
+                notification=notification
+            )
+
+    metrics.observe('bouncy_recipients', len(bounces), type='Bounce')
+    logger.info('Logged %s Bounce(s)', str(len(bounces)))
+
+    return HttpResponse('Bounce Processed')
+
+
+def process_complaint(message, notification):
+    """Function to process a complaint notification"""
+    metrics = get_metrics()
+    with metrics.timer('bouncy_stage_seconds', stage='db'), \
+            measure_db_latency():
+        complaints = build_complaints(message, notification)
+        # Create each Complaint.
+        save_feedback(Complaint, complaints)
+
+    # Send signals for each complaint.
+    with metrics.timer('bouncy_stage_seconds', stage='feedback_signals'):
+        for complaint in complaints:
+            signals.feedback.send(
+                sender=Complaint,
+                instance=complaint,
+                message=message,
+                notification=notification
+            )
+
+    metrics.observe('bouncy_recipients', len(complaints), type='Complaint')
+    logger.info('Logged %s Complaint(s)', str(len(complaints)))
+
+    return HttpResponse('Complaint Processed')
+
+
+def process_delivery(message, notification):
+    """Function to process a delivery notification"""
+    metrics = get_metrics()
+    with metrics.timer('bouncy_stage_seconds', stage='db'), \
+            measure_db_latency():
+        deliveries = build_deliveries(message, notification)
+        # Create each delivery.
+        save_feedback(Delivery, deliveries)
+        record_latencies(deliveries)
+
+    # Send signals for each delivery.
+    with metrics.timer('bouncy_stage_seconds', stage='feedback_signals'):
+        for eachdelivery in deliveries:
+            signals.feedback.send(
+                sender=Delivery,
+                instance=eachdelivery,
+                message=message,
+                notification=notification
+            )
+
+    metrics.observe('bouncy_recipients', len(deliveries), type='Delivery')
     logger.info('Logged %s Deliveries(s)', str(len(deliveries)))
 
     return HttpResponse('Delivery Processed')
+
+
+def load_batch(request, config):
+    """
+    Return the list of notifications sent to the batch endpoint
+
+    The body may be a JSON array or, with an ndjson content type, one
+    notification per line, and may be gzip-encoded. Raises ValueError with
+    the reason if the body can't be used.
+    """
+    max_bytes = config.batch_max_bytes
+    body = request.body
+    if request.META.get('HTTP_CONTENT_ENCODING') == 'gzip':
+        try:
+            # Stop decompressing just past the limit, rather than letting a
+            # small body expand to fill memory
+            body = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(
+                body, max_bytes + 1)
+        except zlib.error:
+            raise ValueError('Not Valid Gzip')
+    if len(body) > max_bytes:
+        raise ValueError('Batch Too Large')
+
+    try:
+        text = body.decode('utf-8')
+        if 'ndjson' in request.META.get('CONTENT_TYPE', ''):
+            notifications = [
+                json.loads(line) for line in text.splitlines()
+                if line.strip()]
+        else:
+            notifications = json.loads(text)
+    except ValueError:
+        raise ValueError('Not Valid JSON')
+
+    if not isinstance(notifications, list):
+        raise ValueError('Batch Must Be A List')
+    if len(notifications) > config.batch_max_items:
+        raise ValueError('Too Many Notifications')
+    return notifications
+
+
+def check_batch_item(data, metrics, config):
+    """Return the reason a batched notification is rejected, or None"""
+    if not isinstance(data, dict):
+        return 'Not Valid JSON'
+
+    # Relayed notifications carry no topic header, so check the topic inside
+    # the signed notification instead
+    if config.topic_arns is not None and (
+            not isinstance(data.get('TopicArn'), six.string_types) or
+            data['TopicArn'] not in config.topic_arns):
+        return 'Bad Topic'
+
+    reason = check_notification(data, metrics, config)
+    if reason is None and data['Type'] != 'Notification':
+        return 'Only Notifications Accepted'
+    return reason
+
+
+def build_batch_item(data):
+    """
+    Build the unsaved feedback for a verified, batched notification
+
+    Returns the status, detail and (model, instances, message) to store, if
+    there is anything to store.
+    """
+    try:
+        message = json.loads(data['Message'])
+    except ValueError:
+        return 200, 'Message is not valid JSON', None
+
+    if not _VITAL_MESSAGE_KEYS.issubset(message):
+        return 200, 'Missing Vital Fields', None
+
+    if message['notificationType'] not in FEEDBACK_BUILDERS:
+        return 200, 'Unknown Notification Type', None
+
+    model, builder = FEEDBACK_BUILDERS[message['notificationType']]
+    try:
+        instances = builder(message, data)
+    except (KeyError, TypeError, ValueError):
+        # Ask the relay to send this notification again later, as SNS would
+        # if the single notification endpoint failed
+        logger.exception('Unable To Process Batched Notification')
+        return 500, 'Malformed Message', None
+
+    return 200, '{0} Processed'.format(message['notificationType']), (
+        model, instances, message)
+
+
+@csrf_exempt
+def batch_endpoint(request):
+    """
+    Endpoint for internal relays that forward many SNS notifications at once
+
+    Each notification is verified exactly as the SNS endpoint would verify it,
+    then the feedback from the whole batch is inserted in one transaction.
+    The response lists a status for every notification, in order.
+    """
+    config = get_config()
+    if request.method != 'POST' or not config.batch_secret:
+        raise Http404
+
+    metrics = get_metrics()
+    if not check_shared_secret(request, config.batch_secret):
+        metrics.increment('bouncy_rejected_total', reason='Bad Shared Secret')
+        return HttpResponseForbidden('Bad Shared Secret')
+
+    try:
+        with metrics.timer('bouncy_stage_seconds', stage='parse'):
+            notifications = load_batch(request, config)
+    except ValueError as error:
+        return bad_request(metrics, str(error))
+
+    archive = get_archive()
+    results = []
+    feedback = []
+    for data in notifications:
+        status = 400
+        try:
+            reason = check_batch_item(data, metrics, config)
+        except (ValueError, HTTPClientError):
+            # The signing certificate couldn't be fetched or read, so ask the
+            # relay to send this notification again later
+            logger.exception('Unable To Verify Batched Notification')
+            status, reason = 500, 'Unable To Verify Notification'
+        if reason is not None:
+            metrics.increment('bouncy_rejected_total', reason=reason)
+            results.append({
+                'MessageId': data.get('MessageId') if isinstance(
+                    data, dict) else None,
+                'status': status,
+                'detail': reason
+            })
+            continue
+
+        metrics.increment('bouncy_notifications_total', type=data['Type'])
+        if archive is not None:
+            archive.append(data)
+        signals.notification.send(
+            sender='bouncy_batch_endpoint', notification=data, request=request)
+
+        status, detail, item = build_batch_item(data)
+        results.append(
+            {'MessageId': data['MessageId'], 'status': status,
+             'detail': detail})
+        if item is not None:
+            feedback.append(item + (data,))
+
+    # Group the rows by the database the router sends them to, so each
+    # database gets one transaction however the models are sharded
+    by_database = {}
+    for model, instances, _, _ in feedback:
+        for instance in instances:
+            by_database.setdefault(
+                router.db_for_write(model, instance=instance), {}).setdefault(
+                    model, []).append(instance)
+
+    with metrics.timer('bouncy_stage_seconds', stage='db'), \
+            measure_db_latency():
+        for alias, rows in by_database.items():
+            with transaction.atomic(using=alias):
+                for model, instances in rows.items():
+                    bulk_insert(
+                        model, instances, using=alias,
+                        copy=config.batch_copy)
+                    # Bulk inserts leave the keys unset, but the outbox
+                    # events and signals carry each row's id
+                    fetch_pks(model, instances, alias)
+                    if config.outbox:
+                        enqueue_events(instances, alias)
+        record_writes([
+            instance.address for _, instances, _, _ in feedback
+            for instance in instances])
+        record_stats([
+            instance for _, instances, _, _ in feedback
+            for instance in instances])
+        record_soft_bounces([
+            instance for model, instances, _, _ in feedback
+            if model is Bounce for instance in instances])
+        record_latencies([
+            instance for model, instances, _, _ in feedback
+            if model is Delivery for instance in instances])
+
+    with metrics.timer('bouncy_stage_seconds', stage='feedback_signals'):
+        for model, instances, message, data in feedback:
+            metrics.increment(
+                'bouncy_messages_total', type=message['notificationType'])
+            metrics.observe(
+                'bouncy_recipients', len(instances),
+                type=message['notificationType'])
+            for instance in instances:
+                signals.feedback.send(
+                    sender=model,
+                    instance=instance,
+                    message=message,
+                    notification=data
+                )
+
+    logger.info('Processed Batch Of %s Notification(s)', len(results))
+    return JsonResponse({'results': results})
+
+
+@gzip_page
+def feed_endpoint(request):
+    """
+    Read-only change feed of stored feedback for internal consumers
+
+    Accepts ``cursor``, ``type``, ``topic``, ``limit`` and ``wait`` query
+    parameters and returns the records after the cursor along with the
+    cursor to send next time. With ``wait``, the request is held open until
+    new records arrive or that many seconds pass.
+    """
+    config = get_config()
+    if request.method != 'GET' or not config.feed_secret:
+        raise Http404
+
+    metrics = get_metrics()
+    if not check_shared_secret(request, config.feed_secret):
+        metrics.increment('bouncy_rejected_total', reason='Bad Shared Secret')
+        return HttpResponseForbidden('Bad Shared Secret')
+
+    try:
+        limit = min(int(request.GET.get('limit', 100)), config.feed_max_limit)
+        wait = min(float(request.GET.get('wait', 0)), config.feed_max_wait)
+        # NaN compares false with everything, so it would never time out
+        if math.isnan(wait) or math.isinf(wait):
+            raise ValueError
+    except ValueError:
+        return bad_request(metrics, 'Bad Limit Or Wait')
+
+    try:
+        records, cursor = wait_for_feed(
+            max(wait, 0), request.GET.get('cursor'),
+            request.GET.getlist('type'), request.GET.getlist('topic'),
+            max(limit, 1))
+    except ValueError as error:
+        return bad_request(metrics, str(error))
+
+    # The same query and cursor always return the same records, so a
+    # consumer that is up to date is told so without a body
+    etag = '"{0}"'.format(hashlib.sha1(
+        '{0} {1}'.format(request.GET.urlencode(), cursor).encode(
+            'utf-8')).hexdigest())
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({'records': records, 'cursor': cursor})
+    response['ETag'] = etag
+    return response
+
+
+def stats_endpoint(request):
+    """
+    Feedback counts over time for dashboards
+
+    Accepts ``resolution`` (hour, day or week), ``group_by`` (kind, type,
+    sender or topic) and ISO 8601 ``start`` and ``end`` query parameters.
+    The counts come from the pre-aggregated stats and are cached briefly.
+    """
+    config = get_config()
+    if request.method != 'GET' or not config.stats_secret:
+        raise Http404
+
+    metrics = get_metrics()
+    if not check_shared_secret(request, config.stats_secret):
+        metrics.increment('bouncy_rejected_total', reason='Bad Shared Secret')
+        return HttpResponseForbidden('Bad Shared Secret')
+
+    try:
+        start, end = [
+            clean_time(request.GET[name]) if request.GET.get(name) else None
+            for name in ('start', 'end')]
+    except (ValueError, OverflowError):
+        # The parser's message repeats the input, so it isn't passed on
+        return bad_request(metrics, 'Bad Time')
+    try:
+        result = cached_series(
+            request.GET.get('resolution', 'hour'), start, end,
+            request.GET.get('group_by', 'kind'))
+    except ValueError as error:
+        # series only raises fixed messages
+        return bad_request(metrics, str(error))
+    return JsonResponse(result)
+
+
+def latency_endpoint(request):
+    """
+    Delivery latency percentiles for dashboards
+
+    Accepts ISO 8601 ``start`` and ``end``, ``sender`` and ``topic`` query
+    parameters and returns the number of deliveries with the 50th, 95th and
+    99th percentile of their processing time in milliseconds.
+    """
+    config = get_config()
+    if request.method != 'GET' or not config.stats_secret:
+        raise Http404
+
+    metrics = get_metrics()
+    if not check_shared_secret(request, config.stats_secret):
+        metrics.increment('bouncy_rejected_total', reason='Bad Shared Secret')
+        return HttpResponseForbidden('Bad Shared Secret')
+
+    try:
+        start, end = [
+            clean_time(request.GET[name]) if request.GET.get(name) else None
+            for name in ('start', 'end')]
+    except (ValueError, OverflowError):
+        return bad_request(metrics, 'Bad Time')
+    return JsonResponse(latency_percentiles(
+        start, end, request.GET.get('sender'), request.GET.get('topic')))
+
+
+def prometheus_metrics(request):
+    """
+    View exposing the collected metrics in the Prometheus text format
+
+    Returns a 404 unless BOUNCY_METRICS_SECRET is set and the configured
+    metrics backend can be rendered.
+    """
+    config = get_config()
+    metrics = get_metrics()
+    output = metrics.render()
+    if request.method != 'GET' or not config.metrics_secret or output is None:
+        raise Http404
+
+    if not check_shared_secret(request, config.metrics_secret):
+        metrics.increment('bouncy_rejected_total', reason='Bad Shared Secret')
+        return HttpResponseForbidden('Bad Shared Secret')
+    return HttpResponse(output, content_type='text/plain; version=0.0.4')
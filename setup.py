@@ -13,7 +13,8 @@ setup(
     version='0.2.7',
     author='Nick Catalano',
     packages=[
-        'django_bouncy', 'django_bouncy.migrations', 'django_bouncy.tests'],
+        'django_bouncy', 'django_bouncy.migrations', 'django_bouncy.tests',
+        'django_bouncy.management', 'django_bouncy.management.commands'],
     url='https://github.com/ofa/django-bouncy',
     description=(
         "A way to handle bounce and abuse reports delivered by Amazon's Simple"
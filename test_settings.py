@@ -6,7 +6,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': './example.db',
-    }
+    },
+    # For tests that need a database other than the default
+    'other': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': './example_other.db',
+    },
 }
 
 INSTALLED_APPS = (